@@ -6,6 +6,9 @@ import plotly.graph_objects as go
 from itertools import cycle
 import seaborn as sns
 import GWLs_v01 as gwl
+import GWLs_store as gws
+import GWLs_resample as gwr
+import GWLs_signatures as gwsig
 
 # set variables for column names
 scode = 'SensorCode'
@@ -14,7 +17,8 @@ val = 'WL'
 
 # read in the files from session state
 # df_xy = st.session_state['df_xy']
-df_ts = st.session_state['df_ts']
+ts_store = gws.open_store(st.session_state['ts_handle'])
+df_ts = ts_store.df
 
 # set mapbox token
 px.set_mapbox_access_token('pk.eyJ1IjoiYWRhbW5iZW5uZXR0IiwiYSI6ImNsOGVldGwzODA5cWszcG1vZGJmejYyOXUifQ.7AjKZ8js-hrQR6b19M75Vg')
@@ -34,33 +38,27 @@ def main():
     col1, col2, col3, col4 = st.columns(4, gap='small')
     with col1:# Dropdown menu to select a SensorCode
         freq = st.selectbox('Select a Frequency', ['W', 'M', 'D'])
+    with col2:
+        norm = st.selectbox('Select a Normalisation', ['Min-Max', 'Robust (5-95%)'])
 
     
     ######################### PROCESSING ############################
     
-    # resample with given frequency from dropdown
-    df_ts_rs = gwl.resample(df_ts, scode, dtime, val, freq, 'median')
-    all_sensors = df_ts_rs[scode].unique()
-
-    # get signatures if not in session state
-    if 'df_signatures' not in st.session_state:
-        # get signatures
-        st.spinner(text='Getting Groundwater Signatures..', cache=False)
-        df_signatures = gwl.get_signatures(df=df_ts_rs, sensors=all_sensors, scode=scode, dtime=dtime, val=val)
-        st.session_state['df_signatures'] = df_signatures
-    else:
+    # use uploaded signatures, or those already computed at this frequency
+    if 'df_signatures' in st.session_state and st.session_state.get('sig_freq', freq) == freq:
         df_signatures = st.session_state['df_signatures']
-
-    # normalise if if the normalised signatures haven't been calculated yet
-    if 'df_signatures_norm' not in st.session_state:
-        st.spinner(text='Normalising Groundwater Signatures..', cache=False)
-        df_signatures_norm = df_signatures.copy()
-        for col in df_signatures_norm.columns:
-            df_signatures_norm[col] = (df_signatures[col].values-df_signatures.min(axis=1))/(df_signatures.max(axis=1)-df_signatures.min(axis=1))
-            # save to session state
-            st.session_state['df_signatures_norm'] = df_signatures_norm
     else:
-        df_signatures_norm = st.session_state['df_signatures_norm']
+        # get signatures in parallel, reusing results cached on disk for this dataset and frequency
+        sig_prog = st.progress(0, text='Getting Groundwater Signatures..')
+        df_signatures = gwsig.cached_signatures(ts_store, freq, val,
+                                                progress=lambda p: sig_prog.progress(p, text='Getting Groundwater Signatures..'))
+        sig_prog.empty()
+        st.session_state['df_signatures'] = df_signatures
+        st.session_state['sig_freq'] = freq
+
+    # normalise each signature across sensors
+    df_signatures_norm = gwr.normalise_matrix(df_signatures, axis=1, robust=(norm != 'Min-Max'))
+    st.session_state['df_signatures_norm'] = df_signatures_norm
     
 
     ######################## PLOTS #############################
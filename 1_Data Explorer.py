@@ -5,7 +5,11 @@ import plotly.express as px
 import plotly.graph_objects as go
 from itertools import cycle
 import seaborn as sns
-import GWLs_v01 as gwl
+import GWLs_store as gws
+import GWLs_resample as gwr
+import GWLs_spatial as gwsp
+import GWLs_downsample as gwds
+import time
 import folium
 from folium.plugins import Draw
 from streamlit_folium import st_folium
@@ -19,7 +23,8 @@ val = 'WL'
 
 # read in the files from session state
 df_xy = st.session_state['df_xy']
-df_ts = st.session_state['df_ts']
+ts_store = gws.open_store(st.session_state['ts_handle'])
+df_ts = ts_store.df
 
 # column filters from xy
 column_filter = [i.split('_')[1] for i in df_xy.columns if 'Info' in i]
@@ -39,7 +44,7 @@ def get_z(scode):
 # set the color palette for plotting
 palette = cycle(sns.color_palette(cc.glasbey, n_colors=50).as_hex())
 dict_color = {}
-for s in df_ts[scode].unique(): 
+for s in ts_store.sensors: 
     dict_color[s] = next(palette)
 
 # method call for dictionary of colors per sensor for consistency across plots
@@ -78,9 +83,19 @@ def main():
     with col4:
         cf = st.selectbox('Choose a Filter Column', column_filter)
     with col5:
-        slx = st.multiselect('Select filters on Column', df_xy.loc[df_xy[scode].isin(df_ts[scode].unique()), f'Info_{cf}'].unique(), df_xy.loc[df_xy[scode].isin(df_ts[scode].unique()), f'Info_{cf}'].unique())
+        slx = st.multiselect('Select filters on Column', df_xy.loc[df_xy[scode].isin(ts_store.sensors), f'Info_{cf}'].unique(), df_xy.loc[df_xy[scode].isin(ts_store.sensors), f'Info_{cf}'].unique())
     with col6:
         showdry = st.selectbox('Show Dry Sensors', ['Yes', 'No'])
+
+    # downsample traces to a point budget, the view window zooms in at full budget
+    col9, col10, col11 = st.columns([1, 1, 4], gap='small')
+    with col9:
+        ds_method = st.selectbox('Select Downsampling', ['MinMax', 'LTTB', 'None'])
+    with col10:
+        n_points = st.selectbox('Select Points per Trace', [2000, 5000, 10000])
+    with col11:
+        t_min, t_max = [t.to_pydatetime() for t in ts_store.extent]
+        x_range = st.slider('View Window', t_min, t_max, (t_min, t_max), format='YYYY-MM-DD')
     ######################## MAP (FOLIUM) ############################
     
     # set center of map 
@@ -103,19 +118,21 @@ def main():
         control = True
        ).add_to(m)
     
-    # add draw functionality which is used to select features inside rectangle
+    # add draw functionality which is used to select features inside a rectangle, polygon or circle
     Draw(export=False, 
          draw_options={'polyline':False, 
                        'circlemarker': False, 
-                       'polygon':False, 
-                       'circle':False, 
                        'marker':False}).add_to(m)
     
     # create a feature group to store markers
     fg = folium.FeatureGroup(name='Sensors')
 
+    # spatial index of the sensors with time-series, built once per dataset
+    xy_index = gwsp.get_index(df_xy, ts_store)
+
     # filter on those sensors with time-series and filtered column matching selection
-    df_xy_ = df_xy.loc[(df_xy[scode].isin(df_ts[scode].unique())) & (df_xy[f'Info_{cf}'].isin(slx))]
+    df_xy_ = df_xy.loc[df_xy.index.isin(xy_index.labels)]
+    df_xy_ = df_xy_.loc[df_xy_[f'Info_{cf}'].isin(slx)]
 
     # add all XY locs as markers (if in df_ts)
     for i in df_xy_.index:
@@ -146,18 +163,12 @@ def main():
     # if no drawing
     if output['last_active_drawing'] == None:
         # select arbitrary selection of points 
-        list_sensors = df_xy_.loc[df_xy_[scode].isin(df_ts[scode].unique()), scode][0:5]
+        list_sensors = df_xy_[scode][0:5]
         df_xy_filt = df_xy_.loc[df_xy_[scode].isin(list_sensors)]
     else:
-        # retrieve box coordinates
-        lat_x1 = output['last_active_drawing']['geometry']['coordinates'][0][0][1]
-        lon_y1 = output['last_active_drawing']['geometry']['coordinates'][0][0][0]
-        lat_x2 = output['last_active_drawing']['geometry']['coordinates'][0][2][1]
-        lon_y2 = output['last_active_drawing']['geometry']['coordinates'][0][2][0]
-
-        # filter df xy on these locations
-        df_xy_filt = df_xy_.loc[(df_xy_['Lat']>=lat_x1) & (df_xy_['Lon']>=lon_y1) & (df_xy_['Lat']<=lat_x2) & (df_xy_['Lon']<=lon_y2)]
-        df_xy_filt = df_xy_filt.loc[df_xy_filt[scode].isin(df_ts[scode].unique())]
+        # sensors inside the drawn rectangle, polygon or circle from the spatial index
+        selected = xy_index.select(output['last_active_drawing'])
+        df_xy_filt = df_xy_.loc[df_xy_.index.isin(selected)]
         # list of sensors
         list_sensors = df_xy_filt[scode].unique()
 
@@ -195,23 +206,23 @@ def main():
     ######################## TIME-SERIES #############################
 
     # Create time-series plot
+    t0 = time.perf_counter()
     fig1 = go.Figure()
 
-    df_ts_ = df_ts.loc[df_ts['SL']+1<df_ts['WL']].copy()
-    
+    if freq == 'Raw':
+        # slice the selected sensors from the store once and drop dry readings
+        df_sel = ts_store.get_many(list_sensors, [scode, dtime, val, 'SL'])
+        df_sel = df_sel.loc[df_sel['SL']+1<df_sel[val], [scode, dtime, val]]
+    else:
+        # each sensor's resample without dry readings is cached, so widget reruns don't resample again
+        list_rs = [gwr.cache.resample(ts_store, s, val, freq, 'median', min_head=1) for s in list_sensors if s in ts_store]
+        df_sel = pd.concat(list_rs, ignore_index=True) if len(list_rs) > 0 else pd.DataFrame(columns=[scode, dtime, val])
+    # scale each sensor after resampling
+    df_sel[val] = gwr.scale(df_sel, scode, val, mode)
+
     # iterate through sensors and add time-series
-    for s in list_sensors:
-        df = df_ts_.loc[df_ts_[scode]==s].copy() 
-        # resample based on selected dropdown
-        df = gwl.resample(df, scode, dtime, val, freq=freq, stat='median')
-        x = df[dtime]
-        # set y variable depending on the mode
-        if mode == 'Normalised':
-            y = gwl.normalise(df[val])
-        elif mode == 'Standardised':
-            y = gwl.standardise(df[val])
-        else:
-            y = df[val]
+    for s, df in df_sel.groupby(scode, observed=True, sort=False):
+        x, y = gwds.downsample(df[dtime], df[val], n_points, ds_method, x_range)
         # add WL to figure
         fig1.add_trace(go.Scattergl(
             x=x,
@@ -226,7 +237,7 @@ def main():
         if show_sensor_z == 'Yes':    
             # add sensorz to figure
             fig1.add_trace(go.Scattergl(
-                x=[df_ts[dtime].min(), df_ts[dtime].max()],
+                x=list(ts_store.extent),
                 y=[get_z(s), get_z(s)],
                 mode='lines',
                 line=dict(width=2, color=get_dict_color(s)),
@@ -251,5 +262,8 @@ def main():
         # add signature plot
     with col7:
         st.plotly_chart(fig1, use_container_width=True)
+        # serialising the figure again costs time, so the size is measured on request
+        show_size = st.checkbox('Measure Payload Size')
+        st.caption(gwds.payload(fig1, t0, show_size))
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,11 +1,14 @@
 # Import necessary libraries
 import streamlit as st
-import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from itertools import cycle
 import seaborn as sns
 import GWLs_v01 as gwl
+import GWLs_store as gws
+import GWLs_resample as gwr
+import GWLs_downsample as gwds
+import time
 
 # set variables
 scode = 'SensorCode'
@@ -14,7 +17,8 @@ val = 'WL'
 
 # read in the files from session state
 df_xy = st.session_state['df_xy']
-df_ts = st.session_state['df_ts']
+ts_store = gws.open_store(st.session_state['ts_handle'])
+df_ts = ts_store.df
 
 
 def main():
@@ -31,18 +35,29 @@ def main():
 
     col1, col2, col3, col4 = st.columns(4, gap='small')
     with col1:# Dropdown menu to select a SensorCode
-        sensor_code = st.selectbox('Select a SensorCode', df_ts.sort_values(by=scode)[scode].unique())
+        sensor_code = st.selectbox('Select a SensorCode', ts_store.sensors)
     with col2:# Dropdown menu to select a SensorCode
         freq = st.selectbox('Select a Frequency', ['Raw', 'M', 'W', 'D', 'H'])
     with col3:# Dropdown menu to select a SensorCode
         mode = st.selectbox('Select a Mode', ['Normalised', 'Standardised', 'Raw'])
     with col4:
         stat = st.selectbox('Select a Statistic', ['median', 'min', 'max', 'mean'])
+
+    # downsample traces to a point budget, the view window zooms in at full budget
+    col5, col6, col7 = st.columns([1, 1, 2], gap='small')
+    with col5:
+        ds_method = st.selectbox('Select Downsampling', ['MinMax', 'LTTB', 'None'])
+    with col6:
+        n_points = st.selectbox('Select Points per Trace', [2000, 5000, 10000])
+    with col7:
+        t_min, t_max = ts_store.dtime_extent(sensor_code)
+        x_range = st.slider('View Window', t_min.to_pydatetime(), t_max.to_pydatetime(),
+                            (t_min.to_pydatetime(), t_max.to_pydatetime()), format='YYYY-MM-DD')
     
     ######################### PROCESS DATA ############################
     
     # filter on sensor code
-    df_ts_s = df_ts.loc[df_ts[scode]==sensor_code].copy()
+    df_ts_s = ts_store.get(sensor_code).copy()
     
     # process value field based on dropdown
     if mode == 'Normalised':
@@ -56,7 +71,7 @@ def main():
     if freq == 'Raw':
         df_ts_rs = df_ts_s    
     else:
-        df_ts_rs = gwl.resample(df_ts_s, scode, dtime, val, freq, stat)
+        df_ts_rs = gwr.cache.resample(ts_store, sensor_code, val, freq, stat, mode)
         df_ts_rs.dropna(subset=val, inplace=True)
     
     
@@ -64,11 +79,11 @@ def main():
 
 
     # Create time-series plot
+    t0 = time.perf_counter()
     fig1 = go.Figure()
     
     # plot the original frequency
-    x = df_ts_s.loc[df_ts_s[scode]==sensor_code, dtime]
-    y = df_ts_s.loc[df_ts_s[scode]==sensor_code, val]
+    x, y = gwds.downsample(df_ts_s[dtime], df_ts_s[val], n_points, ds_method, x_range)
     
     # add to fig
     fig1.add_trace(go.Scattergl(
@@ -82,8 +97,7 @@ def main():
     )
 
     # plot the resampled sensor of interest
-    x = df_ts_rs.loc[df_ts_rs[scode]==sensor_code, dtime]
-    y = df_ts_rs.loc[df_ts_rs[scode]==sensor_code, val]
+    x, y = gwds.downsample(df_ts_rs[dtime], df_ts_rs[val], n_points, ds_method, x_range)
     
     # add to fig
     fig1.add_trace(go.Scattergl(
@@ -111,6 +125,9 @@ def main():
     
     
     st.plotly_chart(fig1, use_container_width=True)
+    # serialising the figure again costs time, so the size is measured on request
+    show_size = st.checkbox('Measure Payload Size')
+    st.caption(f'{gwds.payload(fig1, t0, show_size)}. Resample Cache: {gwr.cache.stats()}')
     def convert_df(df):
         return df.to_csv(index=True).encode('utf-8')
     
@@ -123,30 +140,9 @@ def main():
         else:
             if st.button('Resample All Data'):
                 n = len(df_ts[scode].unique())
-                rs_prog = st.progress(0, text=f'Resampling {n} sensors') 
-                list_df = []
-                for i, s in enumerate(df_ts[scode].unique()):
-                    # filter on sensor code
-                    df_ts_s_ = df_ts.loc[df_ts[scode]==s].copy()
-                    rs_prog.progress((i+1)/n, text=f'Resampling Sensor {i+1}/{n}')
-                    # process value field based on dropdown
-                    if mode == 'Normalised':
-                        df_ts_s_[val] = gwl.normalise(df_ts_s_[val])
-                    elif mode == 'Raw':
-                        pass
-                    elif mode == 'Standardised':
-                        df_ts_s_[val] = gwl.standardise(df_ts_s_[val])
-
-                    # resample
-                    df_ts_s_rs = gwl.resample(df_ts_s_, scode, dtime, val, freq, stat)
-
-                    # append to list
-                    list_df.append(df_ts_s_rs)
-                
-                # concat all 
-                df_ts_rs_all = pd.concat(list_df)
-
-
+                with st.spinner(text=f'Resampling {n} sensors'):
+                    # resample all sensors in a single grouped pass
+                    df_ts_rs_all = gwr.cache.resample(ts_store, None, val, freq, stat, mode)
 
                 csv = convert_df(df_ts_rs_all)
                 st.download_button(
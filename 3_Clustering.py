@@ -3,7 +3,8 @@ import pandas as pd
 import plotly.express as px
 import streamlit as st
 import datetime as dt
-import GWLs_v01 as gwl
+import GWLs_store as gws
+import GWLs_cluster as gwcl
 import plotly.graph_objects as go
 from itertools import cycle
 import seaborn as sns
@@ -14,7 +15,9 @@ import colorcet as cc
 px.set_mapbox_access_token('pk.eyJ1IjoiYWRhbW5iZW5uZXR0IiwiYSI6ImNsOGVldGwzODA5cWszcG1vZGJmejYyOXUifQ.7AjKZ8js-hrQR6b19M75Vg')
 
 # load time-series
-df_ts = st.session_state['df_ts']
+ts_store = gws.open_store(st.session_state['ts_handle'])
+df_ts = ts_store.df
+ts_min, ts_max = ts_store.extent
 df_xy = st.session_state['df_xy']
 
 # load variables
@@ -31,7 +34,7 @@ def main():
     st.markdown("<h1 style='text-align: left;'>Groundwater Level Clustering</h1>", unsafe_allow_html=True)
 
     # Create two columns for the figures
-    col1, col2, col3, col4, col5, col6 = st.columns(6, gap='small')
+    col1, col2, col3, col4, col5, col6, col7 = st.columns(7, gap='small')
 
 
     with col1:# Dropdown menu to select a SensorCode
@@ -40,17 +43,17 @@ def main():
         n_clusters = st.selectbox('Select N Clusters', [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15])
     with col3:
         start_date = st.date_input('Start Date for Clustering',
-                                   df_ts['DTime'].min(),
-                                   min_value=df_ts['DTime'].min(),
-                                   max_value=df_ts['DTime'].max(),
+                                   ts_min,
+                                   min_value=ts_min,
+                                   max_value=ts_max,
                                    format='YYYY-MM-DD',
                                    label_visibility='visible'
                                    )
     with col4:
         end_date = st.date_input('End Date for Clustering',
-                                  df_ts['DTime'].max(),
-                                  min_value=df_ts['DTime'].min(),
-                                  max_value=df_ts['DTime'].max(),
+                                  ts_max,
+                                  min_value=ts_min,
+                                  max_value=ts_max,
                                   format='YYYY-MM-DD',
                                   label_visibility='visible'
                                     )
@@ -58,6 +61,8 @@ def main():
         freq = st.selectbox('Select frequency', ['W', 'M', 'D', 'Y', 'H'])
     with col6:
         stat = st.selectbox('Select statistic', ['median', 'mean', 'min', 'max'])
+    with col7:
+        dtw_type = st.selectbox('Select DTW Type', ['Exact', 'LB_Keogh Approximate', 'Incremental'])
 
     # convert inputs to dtime
     start_dtime = dt.datetime(start_date.year, start_date.month, start_date.day)
@@ -72,8 +77,24 @@ def main():
         dict_color[i] = next(palette)
     
 
-    # plot the sensor of interest
-    fig1, df_groups = gwl.dtw_cluster(df_ts, scode, dtime, val, mode, n_clusters, start_dtime, end_dtime, freq, stat, dict_color=dict_color)
+    # cluster on the cached DTW linkage for this window, so changing N clusters only cuts the tree
+    # approximate DTW uses the LB_Keogh lower bound in place of the distance for the 25% most distant pairs
+    approx = 0.75 if dtw_type == 'LB_Keogh Approximate' else None
+    with st.spinner(text='Clustering Sensors..'):
+        if dtw_type == 'Incremental':
+            # reuse segment distances from earlier windows and warm-start from the last medoids
+            fig1, df_groups, info = gwcl.dtw_cluster_incremental(ts_store, val, mode, n_clusters, start_dtime, end_dtime, freq, stat,
+                                                                 dict_color=dict_color,
+                                                                 prev_medoids=st.session_state.get('cluster_medoids'))
+            st.session_state['cluster_medoids'] = info['Medoids']
+            caption = f"Incremental clustering: {info['SegmentsReused']}/{info['Segments']} segments reused in {info['Elapsed']:.2f}s"
+            if st.checkbox('Compare with exact DTW on this window'):
+                # the exact result is cached per window, so its time is measured once
+                exact = gwcl.get_result(ts_store, val, mode, start_dtime, end_dtime, freq, stat)
+                caption += f", exact DTW took {exact.seconds:.2f}s ({exact.seconds/info['Elapsed']:.1f}x)"
+            st.caption(caption)
+        else:
+            fig1, df_groups = gwcl.dtw_cluster(ts_store, val, mode, n_clusters, start_dtime, end_dtime, freq, stat, dict_color=dict_color, approx=approx)
     fig1.update_layout(margin={"r":50,"t":50,"l":0,"b":0})
     height = fig1.layout.height
     
@@ -128,5 +149,46 @@ def main():
                 use_container_width=True
                 )
 
+    ######################## MEMBERSHIP THROUGH TIME #############################
+
+    st.markdown("<h2 style='text-align: left;'>Cluster Membership Through Time</h2>", unsafe_allow_html=True)
+
+    col9, col10, col11 = st.columns(3, gap='small')
+    with col9:
+        window_bins = st.number_input(f'Window Length ({freq})', min_value=2, value=52)
+    with col10:
+        step_bins = st.number_input(f'Window Step ({freq})', min_value=1, value=4)
+    with col11:
+        run_rolling = st.button('Run Rolling Clustering Across Full Record', use_container_width=True)
+
+    # windows are built from whole steps, so snap the length and say so
+    window_used = gwcl.snap_window(int(window_bins), int(step_bins))
+    if window_used != window_bins:
+        st.caption(f'Window length snapped to {window_used}{freq}, a whole number of {step_bins}{freq} steps.')
+
+    rolling_key = (freq, stat, mode, n_clusters, window_used, step_bins)
+    if run_rolling:
+        rs_prog = st.progress(0, text='Clustering Rolling Windows..')
+        df_members, df_windows = gwcl.rolling_membership(ts_store, val, mode, n_clusters, freq, stat, window_used, int(step_bins),
+                                                         progress=lambda p: rs_prog.progress(p, text='Clustering Rolling Windows..'))
+        rs_prog.empty()
+        st.session_state['df_members'] = (rolling_key, df_members)
+
+    # show the last run for the current settings
+    if st.session_state.get('df_members', (None, None))[0] == rolling_key:
+        df_members = st.session_state['df_members'][1]
+        fig3 = gwcl.plot_membership(df_members, n_clusters, dict_color)
+        fig3.update_layout(title=f'Cluster Membership: Window = {window_used}{freq}, Step = {step_bins}{freq}, N Clusters = {n_clusters}',
+                           margin={"r":50,"t":50,"l":0,"b":0})
+        st.plotly_chart(fig3, use_container_width=True)
+        st.download_button(
+            "Export Cluster Membership Through Time",
+            convert_df(df_members),
+            f"df_members_{freq}_{stat}_{mode}_{n_clusters}_{window_used}_{step_bins}.csv",
+            "text/csv",
+            key='download-df-members',
+            use_container_width=True
+            )
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
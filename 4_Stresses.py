@@ -6,6 +6,12 @@ import plotly.graph_objects as go
 from itertools import cycle
 import seaborn as sns
 import GWLs_v01 as gwl
+import GWLs_store as gws
+import GWLs_resample as gwr
+import GWLs_decompose as gwd
+import GWLs_corr as gwc
+import GWLs_stresses as gwst
+import GWLs_align as gwal
 from plotly.subplots import make_subplots
 from scipy.stats import spearmanr, pearsonr 
 
@@ -18,8 +24,10 @@ s_val = 'Value'
 
 # Read in the files
 #df_xy = st.session_state['df_xy']
-df_ts = st.session_state['df_ts']
-df_stresses = st.session_state['df_stresses']
+ts_store = gws.open_store(st.session_state['ts_handle'])
+df_ts = ts_store.df
+df_stresses = gws.open_frame(st.session_state['stress_handle'])
+stress_cube = gwst.open_cube(st.session_state['stress_handle'])
 try:
     df_groups = st.session_state['df_groups'] 
 except:
@@ -48,7 +56,7 @@ def main():
         group_id = st.selectbox('Select a Cluster Group', groups)
     
     if group_id == 'All':
-        scodes = df_ts.sort_values(by=scode)[scode].unique()
+        scodes = ts_store.sensors
     else:
         scodes = df_groups.loc[df_groups['Group'].astype(str)==group_id].sort_values(by=scode)[scode].unique()
 
@@ -71,8 +79,7 @@ def main():
     ######################### Processing ############################
     
     # resample with given frequency from dropdown
-    df_ts_s = df_ts.loc[df_ts[scode]==sensor_code].copy()
-    df_ts_rs = gwl.resample(df_ts_s, scode, dtime, val, freq, 'median')
+    df_ts_rs = gwr.cache.resample(ts_store, sensor_code, val, freq, 'median')
     df_ts_rs[val] = df_ts_rs[val].interpolate()
     #df_ts_rs.dropna(subset=val, inplace=True)
 
@@ -82,35 +89,28 @@ def main():
     if component == 'Observed':
         df_ts_rs[val] = df_ts_rs[val]
     else:
-        if freq == 'W':
-            seasonal = 53
-        elif freq == 'M':
-            seasonal = 13
-        elif freq == 'D':
-            seasonal = 365
         ts = component.split('-')[0]
         method = component.split('-')[1] 
-        df_ts_rs = gwl.seasonal_decomposition(sensor_code, df_ts_rs, scode, dtime, val, seasonal, method)
+        # cached per sensor, frequency and method, shared with the Lag Times page
+        df_ts_rs = gwd.cache.decompose_sensor(ts_store, sensor_code, val, freq, method)
         df_ts_rs[val] = df_ts_rs[ts]
 
-    # resample with given frequency from dropdown
-    df_stress_s = df_stresses.loc[df_stresses[s_id]==stress_id].copy()
-    stress_unit = df_stress_s['Units'].unique()[0]
-    if stress_statistic == 'cumsum':
-        df_stresses_rs = gwl.resample(df_stresses.loc[df_stresses[s_id]==stress_id], s_id, dtime, s_val, freq, 'sum')
-        df_stresses_rs[s_val] = df_stresses_rs[s_val].cumsum()
-    elif stress_statistic == 'cumdep':
-        df_stresses_rs = gwl.resample(df_stresses.loc[df_stresses[s_id]==stress_id], s_id, dtime, s_val, freq, 'sum')
-        df_stresses_rs['Dep'] = df_stresses_rs[s_val]-df_stresses_rs[s_val].mean()
-        df_stresses_rs[s_val] = df_stresses_rs['Dep'].cumsum()
+    # look the resampled stress up in the precomputed cube, or resample it directly without one
+    if stress_cube is not None:
+        stress_unit = stress_cube.units[str(stress_id)]
+    else:
+        stress_unit = df_stresses.loc[df_stresses[s_id]==stress_id, 'Units'].unique()[0]
+    if stress_statistic in gwst.cube_stats:
+        df_stresses_rs = gwst.resample_stress(df_stresses, stress_id, freq, stress_statistic, stress_cube)
     else:
-        df_stresses_rs = gwl.resample(df_stresses.loc[df_stresses[s_id]==stress_id], s_id, dtime, s_val, freq, stress_statistic)
+        df_stress_s = df_stresses.loc[df_stresses[s_id]==stress_id]
+        df_stresses_rs = gwl.resample(df_stress_s, s_id, dtime, s_val, freq, stress_statistic)
     
     df_stresses_rs[s_val] = df_stresses_rs[s_val].interpolate()
     df_stresses_rs.dropna(subset=s_val, inplace=True)
 
     # merge the two datasets
-    df_ts_vs_stress = pd.merge(df_ts_rs, df_stresses_rs, on=dtime)
+    df_ts_vs_stress = gwal.join(df_ts_rs, df_stresses_rs, dtime, freq)
     #st.write(df_ts_vs_stress)
 
 
@@ -237,5 +237,42 @@ def main():
     with col10:
         st.plotly_chart(fig4, use_container_width=True)
 
+    ###################### ALL SENSORS VS ALL STRESSES ##############
+
+    st.markdown("<h2 style='text-align: left;'>Correlation of All Sensors vs All Stresses</h2>", unsafe_allow_html=True)
+
+    if stress_statistic not in gwc.stress_stats:
+        st.write(f'Select one of {gwc.stress_stats} as the Stress Statistic to correlate all sensors and stresses.')
+    elif st.button('Compute Correlation Matrix'):
+        with st.spinner(text='Correlating All Sensors and Stresses..'):
+            df_corr = gwc.cached_corr_matrices(ts_store, df_stresses, freq, stress_statistic, val, stress_handle=st.session_state['stress_handle'])
+        st.session_state['df_corr'] = (freq, stress_statistic, df_corr)
+
+    if 'df_corr' in st.session_state and st.session_state['df_corr'][:2] == (freq, stress_statistic):
+        df_corr = st.session_state['df_corr'][2]
+        col11, col12 = st.columns([2, 1], gap='large')
+        with col12:
+            r_type = st.selectbox('Select Correlation', ['Pearson R', 'Spearman R', 'Pearson R (Diff)', 'Spearman R (Diff)'])
+            st.dataframe(df_corr, use_container_width=True)
+
+            def convert_df(df):
+                return df.to_csv(index=False).encode('utf-8')
+
+            st.download_button(
+                "Export Correlation Matrix",
+                convert_df(df_corr),
+                f"df_corr_{freq}_{stress_statistic}.csv",
+                "text/csv",
+                key='download-corr',
+                use_container_width=True
+                )
+        with col11:
+            df_r = df_corr.pivot(index=scode, columns=s_id, values=r_type)
+            fig5 = px.imshow(df_r, aspect='auto', color_continuous_scale='RdBu', zmin=-1, zmax=1)
+            fig5.update_layout(title=f'{r_type}: All Sensors vs {stress_statistic.capitalize()} Stresses at Frequency = {freq}',
+                               height=max(500, 12*len(df_r)),
+                               font=dict(family='Arial', size=16))
+            st.plotly_chart(fig5, use_container_width=True)
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
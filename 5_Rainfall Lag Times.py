@@ -1,11 +1,16 @@
 # Import necessary libraries
 import streamlit as st
-import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from itertools import cycle
 import seaborn as sns
 import GWLs_v01 as gwl
+import GWLs_store as gws
+import GWLs_resample as gwr
+import GWLs_lags as gwlag
+import GWLs_decompose as gwd
+import GWLs_stresses as gwst
+import GWLs_align as gwal
 from plotly.subplots import make_subplots
 from scipy.stats import spearmanr, pearsonr 
 
@@ -17,8 +22,10 @@ s_id = 'StressID'
 s_val = 'Value'
 
 # Read in the files
-df_ts = st.session_state['df_ts']
-df_stresses = st.session_state['df_stresses']
+ts_store = gws.open_store(st.session_state['ts_handle'])
+df_ts = ts_store.df
+df_stresses = gws.open_frame(st.session_state['stress_handle'])
+stress_cube = gwst.open_cube(st.session_state['stress_handle'])
 
     
 def main():
@@ -30,7 +37,7 @@ def main():
     st.markdown("<h1 style='text-align: left;'>Rainfall vs Groundwater Levels: Lag-Times</h1>", unsafe_allow_html=True)
 
     ######################### Selections ##########################
-    scodes = df_ts[scode].unique()
+    scodes = ts_store.sensors
     components = ['Observed', 'Seasonal', 'Trend', 'Residual']
 
     col1, col2, col3, col4, col5, col6 = st.columns(6, gap='small')
@@ -47,51 +54,48 @@ def main():
         ts_c = st.selectbox('Select Time-Series Component', components)
     with col6: 
         freq = st.selectbox('Select a Frequency', ['W', 'D', 'M'])
+
+    col7, col8, _ = st.columns([1, 1, 4], gap='small')
+    with col7:
+        # pre-whitening removes the autocorrelation that makes the standard intervals overconfident
+        corr_method = st.selectbox('Select a Correlation Method', ['Standard', 'Pre-whitened'])
+    with col8:
+        n_boot = st.number_input('Bootstrap Replicates', min_value=100, max_value=10000, value=2000, step=100,
+                                 disabled=corr_method != 'Pre-whitened')
     
     ######################### Processing ############################
     
     # resample with given frequency from dropdown
-    df_ts_s = df_ts.loc[df_ts[scode]==sensor_code].copy()
-    df_ts_rs = gwl.resample(df_ts_s, scode, dtime, val, freq, 'median')
+    df_ts_rs = gwr.cache.resample(ts_store, sensor_code, val, freq, 'median')
     #df_ts_rs.dropna(subset=val, inplace=True)
 
     if ts_c == 'Observed':
         df_ts_rs[val] = df_ts_rs[val].interpolate()
     else:
-        if freq == 'W':
-            seasonal = 53
-        elif freq == 'D':
-            seasonal = 365
-        elif freq == 'M':
-            seasonal = 13
-        df_ts_rs = gwl.seasonal_decomposition(sensor_code, df_ts_rs, scode, dtime, val, seasonal, sd_type)
+        # cached per sensor, frequency and method, shared with the Stresses page
+        df_ts_rs = gwd.cache.decompose_sensor(ts_store, sensor_code, val, freq, sd_type)
         df_ts_rs[val] = df_ts_rs[ts_c]
 
     # resample with given frequency from dropdown
-    df_stress_s = df_stresses.loc[df_stresses[s_id]=="Rain"].copy()
-    stress_unit = df_stress_s['Units'].unique()[0]
-    df_stresses_rs = gwl.resample(df_stresses.loc[df_stresses[s_id]=="Rain"], s_id, dtime, s_val, freq, 'sum')
-    df_stresses_rs['Dep'] = df_stresses_rs[s_val]-df_stresses_rs[s_val].mean()
-    df_stresses_rs[s_val] = df_stresses_rs['Dep'].cumsum()
+    # cumulative departure of rainfall from the precomputed stress cube
+    if stress_cube is not None:
+        stress_unit = stress_cube.units['Rain']
+    else:
+        stress_unit = df_stresses.loc[df_stresses[s_id]=="Rain", 'Units'].unique()[0]
+    df_stresses_rs = gwst.resample_stress(df_stresses, "Rain", freq, 'cumdep', stress_cube)
 
     # get component of cumdep rainfall
     if stress_c == 'Observed':
         df_stresses_rs[s_val] = df_stresses_rs[s_val]
     else:
-        if freq == 'W':
-            seasonal = 53
-        elif freq == 'D':
-            seasonal = 365
-        elif freq == 'M':
-            seasonal = 13
-        df_stresses_rs = gwl.seasonal_decomposition("Rain", df_stresses_rs, 'StressID', dtime, s_val, seasonal, sd_type)
+        df_stresses_rs = gwd.cache.decompose(st.session_state['stress_handle'], "Rain", df_stresses_rs, 'StressID', dtime, s_val, freq, sd_type)
         df_stresses_rs[s_val] = df_stresses_rs[stress_c]
        
     # drop nans
     df_stresses_rs.dropna(subset=s_val, inplace=True)
 
     # merge the two datasets
-    df_ts_vs_stress = pd.merge(df_ts_rs, df_stresses_rs, on=dtime)
+    df_ts_vs_stress = gwal.join(df_ts_rs, df_stresses_rs, dtime, freq)
 
     # method to find optimal lags
     if freq == 'W':
@@ -103,7 +107,12 @@ def main():
     if freq == 'M':
         lag_range = 11
         lag_steps = 1
-    df_timelag, optimal_r, optimal_lag = gwl.time_lagged_xy(df_ts_vs_stress, s_val, val, lag_range, lag_steps, freq) 
+    if corr_method == 'Pre-whitened':
+        # AR residuals of both series with block bootstrap intervals, cached per series pair
+        with st.spinner('Bootstrapping lagged correlations...'):
+            df_timelag, optimal_r, optimal_lag = gwlag.cached_prewhitened_time_lag(df_ts_vs_stress, s_val, val, lag_range, lag_steps, freq, n_boot)
+    else:
+        df_timelag, optimal_r, optimal_lag = gwl.time_lagged_xy(df_ts_vs_stress, s_val, val, lag_range, lag_steps, freq) 
     df_timelag['PlusErrY'] = df_timelag['CI_U']-df_timelag['R']
     df_timelag['MinErrY'] = df_timelag['R']-df_timelag['CI_L']
     
@@ -208,7 +217,7 @@ def main():
 
     # lagged correlation 
     fig3 = px.scatter(df_timelag, x=f'Lag ({freq})', y='R', error_y_minus='MinErrY', error_y='PlusErrY')
-    fig3.update_layout(title=f'Rain vs {sensor_code}: Time-lagged Correlation',
+    fig3.update_layout(title=f'Rain vs {sensor_code}: Time-lagged Correlation ({corr_method})',
                        height=500,
                        font=dict(family='Arial', size=16),
                        margin=dict(l=80, r=80, b=80, t=100)
@@ -308,5 +317,47 @@ def main():
         st.write('**DataFrame of Time Lagged Correlation**')
         st.dataframe(df_timelag, use_container_width=True)
 
+    ######################## ALL SENSORS #############################
+
+    st.markdown("<h2 style='text-align: left;'>Rainfall Lag Times for All Sensors</h2>", unsafe_allow_html=True)
+
+    def convert_df(df):
+        return df.to_csv(index=False).encode('utf-8')
+
+    if st.button('Compute Lag Times for All Sensors'):
+        # every sensor and lag in one vectorised pass on the observed levels, cached on disk
+        with st.spinner(text='Computing Time-Lagged Correlations..'):
+            df_lags_all, df_lag_opt = gwlag.cached_time_lag(ts_store, df_stresses, "Rain", freq, lag_range, lag_steps, val, stress_handle=st.session_state['stress_handle'])
+        st.session_state['df_lag_opt'] = df_lag_opt
+        st.session_state['lag_freq'] = freq
+
+        col13, col14 = st.columns([2, 1], gap='large')
+        with col13:
+            df_r = df_lags_all.pivot(index=scode, columns=f'Lag ({freq})', values='R')
+            fig6 = px.imshow(df_r, aspect='auto', color_continuous_scale='RdBu', zmin=-1, zmax=1)
+            fig6.update_layout(title='Rain vs All Sensors: Time-lagged Correlation (Observed)',
+                               height=max(500, 12*len(df_r)),
+                               font=dict(family='Arial', size=16))
+            st.plotly_chart(fig6, use_container_width=True)
+        with col14:
+            st.write('**Optimal Lag and R per Sensor**')
+            st.dataframe(df_lag_opt, use_container_width=True)
+            st.download_button(
+                "Export Optimal Lags",
+                convert_df(df_lag_opt),
+                f"df_lag_opt_{freq}.csv",
+                "text/csv",
+                key='download-lag-opt',
+                use_container_width=True
+                )
+            st.download_button(
+                "Export All Lags",
+                convert_df(df_lags_all),
+                f"df_lags_all_{freq}.csv",
+                "text/csv",
+                key='download-lags-all',
+                use_container_width=True
+                )
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -3,6 +3,8 @@ import pandas as pd
 import streamlit as st
 import datetime as dt
 import GWLs_v01 as gwl
+import GWLs_store as gws
+import GWLs_decompose as gwd
 
 
 
@@ -14,12 +16,14 @@ def main():
     dtime = 'DTime'
 
     # load datasets
-    df_ts = st.session_state['df_ts']
+    ts_store = gws.open_store(st.session_state['ts_handle'])
+    df_ts = ts_store.df
+    ts_min, ts_max = ts_store.extent
     df_xy = st.session_state['df_xy']
     df_xy = df_xy.loc[df_xy[scode].isin(df_ts[scode].unique())]
     df_signatures = st.session_state['df_signatures']
     df_groups = st.session_state['df_groups']
-    df_sd_var_all = st.session_state['df_sd_var']
+    df_lag_opt = st.session_state.get('df_lag_opt')
 
 
     # Make landscape
@@ -29,24 +33,24 @@ def main():
     st.markdown("<h1 style='text-align: left;'>Export to Leapfrog CSV</h1>", unsafe_allow_html=True)
     st.write('')
     st.write('')
-    st.write('User must have uploaded files: df_xy, df_ts and run the following pages: Groundwater Signatures, Seasonal Decomposition and Clustering.')
+    st.write('User must have uploaded files: df_xy, df_ts and run the following pages: Groundwater Signatures and Clustering.')
 
     # Create two columns for the figures
-    col1, col2, col3, col4 = st.columns(4, gap='small')
+    col1, col2, col3, col4, col5 = st.columns(5, gap='small')
 
     with col1:
         start_date = st.date_input('Start Date for Statistics',
                                    dt.datetime(2020, 1, 1), 
-                                   min_value=df_ts['DTime'].min(),
-                                   max_value=df_ts['DTime'].max(),
+                                   min_value=ts_min,
+                                   max_value=ts_max,
                                    format='YYYY-MM-DD',
                                    label_visibility='visible'
                                    )
     with col2:
         end_date = st.date_input('End Date for Statistics',
                                   dt.datetime(2022, 1, 1), 
-                                  min_value=df_ts['DTime'].min(),
-                                  max_value=df_ts['DTime'].max(),
+                                  min_value=ts_min,
+                                  max_value=ts_max,
                                   format='YYYY-MM-DD',
                                   label_visibility='visible'
                                     )    
@@ -56,19 +60,21 @@ def main():
     with col4: 
         inc_sd = st.selectbox('Include Seasonal Decomposition Signatures?', ['Yes', 'No'])
 
+    with col5:
+        inc_lags = st.selectbox('Include Rainfall Lag Times?', ['Yes', 'No'] if df_lag_opt is not None else ['No'])
+
     # convert inputs to dtime
     start_dtime = dt.datetime(start_date.year, start_date.month, start_date.day)
     end_dtime = dt.datetime(end_date.year, end_date.month, end_date.day)
 
     # get summary statistics for various time-series
-    df_ts_stats = df_ts.loc[(df_ts[dtime]>=start_dtime) & (df_ts[dtime]<=end_dtime)][[scode, val]].dropna(subset=val).groupby(scode).describe()
+    df_ts_stats = df_ts.loc[(df_ts[dtime]>=start_dtime) & (df_ts[dtime]<=end_dtime)][[scode, val]].dropna(subset=val).groupby(scode, observed=True).describe()
     df_ts_stats.columns = [f'{val}_Count', f'{val}_Mean', f'{val}_Std', f'{val}_Min', f'{val}_25%', f'{val}_Median', f'{val}_75%', f'{val}_Max']
     
     # set index to allow join
     df_xy_gw = df_xy.loc[df_xy[scode].isin(df_ts[scode].unique())].set_index(scode).drop(columns='Unnamed: 0')
     df_groups = df_groups.set_index(scode)
     df_signatures_t = df_signatures.transpose().reset_index().rename(columns={'index': scode}).set_index(scode)
-    df_sd_var_all = df_sd_var_all.set_index(scode)
 
     list_dfs = [df_xy_gw, df_groups, df_ts_stats]
     
@@ -78,9 +84,22 @@ def main():
     else:
         pass
     if inc_sd == 'Yes':
+        # weekly MA decomposition of every sensor, cached on disk by dataset hash after the first run
+        progress_bar = st.progress(0, text='Decomposing Sensors..')
+        st.session_state['df_sd_var'] = gwd.cached_sd_var(ts_store, val, 'W', 'MA', progress=progress_bar.progress)
+        progress_bar.empty()
+        df_sd_var_all = st.session_state['df_sd_var'].set_index(scode)
         list_dfs.append(df_sd_var_all)
     else:
         pass
+    if inc_lags == 'Yes':
+        # optimal lags from the Rainfall Lag Times or Lag Map page, not recomputed here
+        lag_freq = st.session_state['lag_freq']
+        df_lag_lf = df_lag_opt.set_index(scode)[['OptimalLag', 'OptimalR']]
+        df_lag_lf.columns = [f'RainLag_{lag_freq}', f'RainLagR_{lag_freq}']
+        list_dfs.append(df_lag_lf)
+    else:
+        pass
     # merge for export to leapfrog
     df_lf = pd.concat(list_dfs, axis=1)
 
@@ -1,9 +1,16 @@
 import streamlit as st
 import pandas as pd
+import os
 import plotly.graph_objects as go
 import plotly.express as px
 from itertools import cycle
 import seaborn as sns
+import GWLs_store as gws
+import GWLs_ingest as gwi
+import GWLs_resample as gwr
+import GWLs_decompose as gwd
+import GWLs_signatures as gwsig
+import GWLs_stresses as gwst
 
 ######################## SETUP #########################
 
@@ -26,21 +33,103 @@ with col1:
 ######################## UPLOADS #########################
 
 # time-series upload 
-ts_upload = st.file_uploader("Upload Time Series Data. Fields required ['DTime', 'SensorCode', 'WL', 'SL']. Accepts CSV or Parquet Files.", 
+ts_upload = st.file_uploader("Upload Time Series Data. Fields required ['DTime', 'SensorCode', 'WL', 'SL']. Accepts CSV, Parquet or Arrow/Feather Files.", 
                          #label_visibility = "hidden",
                          accept_multiple_files=False)
+ts_stream = st.checkbox('Stream CSV to disk (for files larger than memory) and load selected sensors and dates')
+ts_append = False
+df_ts = None
+# content hash of the upload, keys the spill and marks files already appended
+ts_key = gwi.file_hash(ts_upload) if ts_upload is not None else None
+if 'ts_handle' in st.session_state:
+    ts_append = st.checkbox('Append to the current time-series (new logger download), updating only the affected sensors')
 
 if ts_upload is not None:
-    try:
-        df_ts = pd.read_csv(ts_upload, parse_dates=['DTime'], dayfirst=True)
-    except:
-        df_ts = pd.read_parquet(ts_upload)
-        df_ts['DTime'] = pd.to_datetime(df_ts['DTime'])
+    if ts_stream:
+        # spill the upload to a sensor-partitioned dataset once per file
+        spill_key = ts_key
+        if st.session_state.get('ts_spill', {}).get('Key') != spill_key:
+            with st.spinner(text='Streaming time-series to disk..'):
+                ts_spill = gwi.spill_ts(ts_upload, os.path.join(gwi.spill_dir, spill_key))
+            ts_spill['Key'] = spill_key
+            st.session_state['ts_spill'] = ts_spill
+        ts_spill = st.session_state['ts_spill']
+        st.write(f"Streamed {ts_spill['Rows']} rows for {len(ts_spill['Sensors'])} sensors, dropped {ts_spill['Dropped']} invalid rows.")
+
+        if ts_spill['Rows'] == 0:
+            # nothing to choose from, the date range would be empty
+            st.write('No valid rows to load, check the DTime, SensorCode and WL fields.')
+        else:
+            # choose what to load into memory
+            spill_sensors = st.multiselect('Sensors to Load', ts_spill['Sensors'], ts_spill['Sensors'])
+            spill_dates = st.date_input('Date Range to Load',
+                                        (ts_spill['DTimeMin'], ts_spill['DTimeMax']),
+                                        min_value=ts_spill['DTimeMin'],
+                                        max_value=ts_spill['DTimeMax'],
+                                        format='YYYY-MM-DD')
+            if st.button('Load Selection') and len(spill_dates) == 2:
+                df_ts = gwi.load_spill(ts_spill['Root'], spill_sensors,
+                                       pd.Timestamp(spill_dates[0]),
+                                       pd.Timestamp(spill_dates[1])+pd.Timedelta(days=1)-pd.Timedelta(1))
+    elif st.session_state.get('ts_key') != ts_key and st.session_state.get('ts_append_key') != ts_key:
+        # detect the format up front and read only the required fields with a compact schema
+        df_ts = gwi.read_ts(ts_upload)
+
+# a file already published or appended is not read or built again on a rerun
+ts_loaded = ts_upload is not None and not ts_stream and st.session_state.get('ts_key') == ts_key
+# a file already appended is a delta, never a full dataset
+ts_appended = ts_upload is not None and st.session_state.get('ts_append_key') == ts_key
+
+if ts_upload is not None and ts_append and (df_ts is not None or ts_appended):
+    # merge the delta once per file, only sensors with new or changed readings are marked dirty
+    if not ts_appended:
+        old_store = gws.open_store(st.session_state['ts_handle'])
+        with st.spinner(text='Appending time-series..'):
+            ts_store, ts_dirty = gws.append(old_store, df_ts)
+            if len(ts_dirty) > 0:
+                # carry cached results forward, recomputing only the dirty sensors and bins
+                gwr.cache.carry(old_store.fingerprint, ts_store, ts_dirty)
+                gwd.cache.carry(old_store.fingerprint, ts_store, ts_dirty)
+                gwsig.update_signatures(old_store.fingerprint, ts_store, ts_dirty)
+                st.session_state['ts_handle'] = gws.publish(ts_store)
+                st.session_state.pop('df_signatures', None)
+                st.session_state.pop('ts_key', None)
+        st.session_state['ts_append_key'] = ts_key
+        st.session_state['ts_dirty'] = ts_dirty
+        st.session_state['ts_dropped'] = int(df_ts['SensorCode'].isna().sum())
+    ts_dirty = st.session_state['ts_dirty']
+    st.write(f'Appended readings for {len(ts_dirty)} sensors with new or changed data.')
+    if st.session_state['ts_dropped'] > 0:
+        st.write(f"Dropped {st.session_state['ts_dropped']} rows with no SensorCode.")
+    st.write(pd.DataFrame({'SensorCode': list(ts_dirty.keys()), 'DirtyFrom': list(ts_dirty.values())}))
+    df_ts = gws.open_store(st.session_state['ts_handle']).df
+    st.write(df_ts.head())
+
+elif ts_upload is not None and ts_appended:
+    st.write('This file was appended to the current time-series. Remove it from the uploader and upload a full file to replace the dataset.')
+
+elif ts_upload is not None and df_ts is not None:
+    # sort and partition by sensor once so pages can slice sensors directly
+    ts_store = gws.SensorStore(df_ts, 'SensorCode', 'DTime')
+    df_ts = ts_store.df
+    if ts_store.dropped > 0:
+        st.write(f'Dropped {ts_store.dropped} rows with no SensorCode.')
 
     st.write(df_ts.head())
     st.write(df_ts.dtypes)
-    # add the dfs to session state for use in other pages
-    st.session_state['df_ts'] = df_ts
+    # publish to the shared memory-mapped backend, session state only holds the handle
+    st.session_state['ts_handle'] = gws.publish(ts_store)
+    # a streamed selection isn't the whole file, so only a full read is keyed on the file
+    st.session_state['ts_key'] = None if ts_stream else ts_key
+    st.session_state['ts_dropped'] = ts_store.dropped
+
+elif ts_loaded and 'ts_handle' in st.session_state:
+    # the published dataset is this file, show it from the shared store
+    df_ts = gws.open_store(st.session_state['ts_handle']).df
+    if st.session_state.get('ts_dropped', 0) > 0:
+        st.write(f"Dropped {st.session_state['ts_dropped']} rows with no SensorCode.")
+    st.write(df_ts.head())
+    st.write(df_ts.dtypes)
 
 # xy upload
 xy_upload = st.file_uploader("Upload Lat-Lon Data.  Fields required ['SensorCode', 'Lat', 'Lon'].  Accepts CSV files.",
@@ -59,7 +148,7 @@ sig_upload = st.file_uploader("Upload GW Signature Data.  If unavailable, export
 if sig_upload is not None:
     df_signatures = pd.read_csv(sig_upload, index_col=0)
     st.write(df_signatures.head())
-    st.write(df_ts.dtypes)
+    st.write(df_signatures.dtypes)
     if 'df_signatures' not in st.session_state:
         st.session_state['df_signatures'] = df_signatures
 
@@ -68,8 +157,12 @@ stress_upload = st.file_uploader("Upload Stress Data.  Fields required ['StressI
                                 accept_multiple_files=False)
 
 if stress_upload is not None:
-    df_stresses = pd.read_csv(stress_upload, parse_dates=['DTime'], dayfirst=True)
+    df_stresses = gwi.read_stresses(stress_upload)
     st.write(df_stresses.head())
-    st.write(df_ts.dtypes)
-    if 'df_stresses' not in st.session_state:
-        st.session_state['df_stresses'] = df_stresses
+    st.write(df_stresses.dtypes)
+    if 'stress_handle' not in st.session_state:
+        stress_handle = gws.publish_frame(df_stresses)
+        # resample every stress at every frequency and statistic once so pages only look them up
+        with st.spinner(text='Precomputing stress statistics..'):
+            gwst.publish_cube(df_stresses, stress_handle)
+        st.session_state['stress_handle'] = stress_handle
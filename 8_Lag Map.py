@@ -0,0 +1,84 @@
+# Import necessary libraries
+import streamlit as st
+import plotly.express as px
+import GWLs_store as gws
+import GWLs_lags as gwlag
+
+# set variables
+scode = 'SensorCode'
+dtime = 'DTime'
+val = 'WL'
+
+# set mapbox token
+px.set_mapbox_access_token('pk.eyJ1IjoiYWRhbW5iZW5uZXR0IiwiYSI6ImNsOGVldGwzODA5cWszcG1vZGJmejYyOXUifQ.7AjKZ8js-hrQR6b19M75Vg')
+
+
+def main():
+
+    # Make landscape
+    st.set_page_config(layout="wide")
+
+    # load datasets
+    df_xy = st.session_state['df_xy']
+    ts_store = gws.open_store(st.session_state['ts_handle'])
+    df_stresses = gws.open_frame(st.session_state['stress_handle'])
+
+    # App title
+    st.markdown("<h1 style='text-align: left;'>Rainfall Lag Time Map</h1>", unsafe_allow_html=True)
+    st.write('')
+    st.write('User must have uploaded files: df_xy, df_ts and df_stresses with a Rain stress.')
+
+    col1, col2, col3, col4 = st.columns(4, gap='small')
+    with col1:
+        freq = st.selectbox('Select a Frequency', ['W', 'D', 'M'])
+    with col2:
+        lag_range = st.number_input('Maximum Lag', min_value=1, value=gwlag.lag_defaults[freq][0])
+    with col3:
+        min_r = st.number_input('Minimum Optimal R', min_value=-1.0, max_value=1.0, value=0.0, step=0.05)
+    with col4:
+        color_by = st.selectbox('Colour By', ['OptimalLag', 'OptimalR'])
+
+    # cached on disk by dataset hashes, so revisits and the export page reuse the result
+    with st.spinner(text='Computing Lag Times for All Sensors..'):
+        df_lags_all, df_lag_opt = gwlag.cached_time_lag(ts_store, df_stresses, "Rain", freq, lag_range, 1, val, stress_handle=st.session_state['stress_handle'])
+    st.session_state['df_lag_opt'] = df_lag_opt
+    st.session_state['lag_freq'] = freq
+
+    # join to sensor locations
+    df_map = df_xy[[scode, 'Lat', 'Lon']].merge(df_lag_opt, on=scode, how='inner')
+    df_map = df_map.loc[df_map['OptimalR']>=min_r].dropna(subset=['OptimalLag'])
+
+    fig1 = px.scatter_mapbox(df_map,
+                             lat='Lat',
+                             lon='Lon',
+                             color=color_by,
+                             color_continuous_scale='Viridis' if color_by == 'OptimalLag' else 'RdBu',
+                             hover_data=[scode, 'OptimalLag', 'OptimalR', 'N'],
+                             zoom=14,
+                             height=800
+                             )
+    fig1.update_traces(marker=dict(size=18))
+    fig1.update_layout(title=f'Optimal Rainfall Lag ({freq}) for N Sensors = {len(df_map)}',
+                       mapbox_style="satellite",
+                       font=dict(family='Arial', size=12),
+                       margin={"r":50,"t":50,"l":0,"b":0}
+                       )
+
+    col5, col6 = st.columns([2, 1], gap='large')
+    col5.plotly_chart(fig1, use_container_width=True)
+    col6.dataframe(df_map, use_container_width=True)
+
+    def convert_df(df):
+        return df.to_csv(index=False).encode('utf-8')
+
+    col6.download_button(
+        "Export Lag Map Table",
+        convert_df(df_map),
+        f"df_lag_map_{freq}.csv",
+        "text/csv",
+        key='download-lag-map',
+        use_container_width=True
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# Time alignment of resampled series on integer period indexes
+import numpy as np
+import pandas as pd
+
+
+def periods(times, freq):
+    """Integer period ordinals of resampled bin labels, so bins of the same frequency compare as integers."""
+    return pd.DatetimeIndex(times).to_period(freq).asi8
+
+
+def keys(times, freq=None):
+    """Sorted-join keys: exact times as int64 nanoseconds, or period ordinals when freq is given."""
+    if freq is not None:
+        return periods(times, freq)
+    return np.asarray(times, dtype='datetime64[ns]').view('int64')
+
+
+def take(s, idx):
+    """Values of a column at positions, keeping categoricals categorical."""
+    values = s.values
+    return values.take(idx) if isinstance(s.dtype, pd.CategoricalDtype) else values[idx]
+
+
+def join(df_left, df_right, dtime, freq=None, suffixes=('_x', '_y')):
+    """
+    Inner join of two resampled series on their time bins, as
+    pd.merge(df_left, df_right, on=dtime) gives. Both time columns are
+    sorted, so bins are matched by binary search on integer keys rather than
+    by hashing datetimes, and the result keeps the left series' order. With
+    freq, bins match on their period, so labels from different conventions
+    (e.g. month start and month end) still align.
+    """
+    kl, kr = keys(df_left[dtime], freq), keys(df_right[dtime], freq)
+    if not (np.all(kl[1:] > kl[:-1]) and np.all(kr[1:] > kr[:-1])):
+        # unsorted or repeated bins need the general join
+        return pd.merge(df_left, df_right, on=dtime, suffixes=suffixes)
+    pos = np.clip(np.searchsorted(kr, kl), 0, max(len(kr)-1, 0))
+    hit = (kr[pos] == kl) if len(kr) > 0 else np.zeros(len(kl), dtype=bool)
+    il, ir = np.flatnonzero(hit), pos[hit]
+
+    overlap = (set(df_left.columns) & set(df_right.columns)) - {dtime}
+    data = {}
+    for c in df_left.columns:
+        data[f'{c}{suffixes[0]}' if c in overlap else c] = take(df_left[c], il)
+    for c in df_right.columns:
+        if c != dtime:
+            data[f'{c}{suffixes[1]}' if c in overlap else c] = take(df_right[c], ir)
+    return pd.DataFrame(data)
+
+
+def join_asof(df_left, df_right, dtime, tolerance=None, direction='backward', suffixes=('_x', '_y')):
+    """
+    For each left row, the right row nearest in time in the given direction
+    ('backward', 'forward' or 'nearest'), within tolerance (a Timedelta) if
+    given, as pd.merge_asof does. Suited to irregular stress logs against
+    regular sensor bins. Unmatched left rows get NaN.
+    """
+    df_right = df_right if df_right[dtime].is_monotonic_increasing else df_right.sort_values(by=dtime, kind='stable')
+    tl = df_left[dtime].values.astype('datetime64[ns]').view('int64')
+    tr = df_right[dtime].values.astype('datetime64[ns]').view('int64')
+
+    back = np.searchsorted(tr, tl, side='right')-1
+    fwd = np.searchsorted(tr, tl, side='left')
+    if direction == 'backward':
+        pos = back
+    elif direction == 'forward':
+        pos = fwd
+    else:
+        # the closer of the previous and next right rows, ties go backward
+        d_back = np.where(back >= 0, tl-tr[np.clip(back, 0, None)], np.iinfo('int64').max)
+        d_fwd = np.where(fwd < len(tr), tr[np.clip(fwd, None, len(tr)-1)]-tl, np.iinfo('int64').max)
+        pos = np.where(d_fwd < d_back, fwd, back)
+    valid = (pos >= 0) & (pos < len(tr))
+    pos = np.clip(pos, 0, max(len(tr)-1, 0))
+    if tolerance is not None and len(tr) > 0:
+        valid &= np.abs(tr[pos]-tl) <= pd.Timedelta(tolerance).value
+
+    overlap = (set(df_left.columns) & set(df_right.columns)) - {dtime}
+    data = {}
+    for c in df_left.columns:
+        data[f'{c}{suffixes[0]}' if c in overlap else c] = df_left[c].values
+    for c in df_right.columns:
+        if c != dtime:
+            data[f'{c}{suffixes[1]}' if c in overlap else c] = pd.Series(df_right[c].values[pos] if len(tr) > 0 else np.full(len(tl), np.nan)).where(valid).values
+    return pd.DataFrame(data, index=df_left.index)
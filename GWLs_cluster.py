@@ -0,0 +1,471 @@
+# Dynamic time warping clustering of resampled sensor time-series
+import os
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+from scipy.cluster.hierarchy import linkage, fcluster
+from scipy.spatial.distance import squareform
+from scipy.optimize import linear_sum_assignment
+import GWLs_resample as gwr
+
+
+def series_matrix(store, val, start_dtime, end_dtime, freq, stat, mode, min_coverage=0.5):
+    """
+    Resample every sensor and pivot to a sensors x time matrix over the window.
+    Sensors observed in fewer than min_coverage of the bins are dropped, gaps
+    in the rest are interpolated, then each row is scaled per mode.
+    """
+    df_rs = gwr.cache.resample(store, None, val, freq, stat)
+    df_rs = df_rs.loc[(df_rs[store.dtime]>=start_dtime) & (df_rs[store.dtime]<=end_dtime)]
+    df_m = df_rs.pivot(index=store.scode, columns=store.dtime, values=val)
+    df_m = df_m.loc[df_m.notna().mean(axis=1)>=min_coverage]
+    df_m = df_m.interpolate(axis=1, limit_direction='both')
+    if mode == 'Normalised':
+        df_m = gwr.normalise_matrix(df_m, axis=1)
+    elif mode == 'Standardised':
+        df_m = df_m.sub(df_m.mean(axis=1), axis=0).div(df_m.std(axis=1).replace(0, 1), axis=0)
+    return df_m
+
+
+def envelope(X, window):
+    """Upper and lower Sakoe-Chiba envelopes of each row of X for LB_Keogh."""
+    Xp = np.pad(X, ((0, 0), (window, window)), mode='edge')
+    view = np.lib.stride_tricks.sliding_window_view(Xp, 2*window+1, axis=1)
+    return view.max(axis=2), view.min(axis=2)
+
+
+def lb_keogh(X, window):
+    """Symmetric LB_Keogh lower bound of the banded DTW distance between all rows of X."""
+    U, L = envelope(X, window)
+    n = len(X)
+    lb = np.zeros((n, n))
+    for i in range(n):
+        above = np.clip(X[i]-U, 0, None)
+        below = np.clip(L-X[i], 0, None)
+        lb[i] = np.sqrt((above**2+below**2).sum(axis=1))
+    return np.maximum(lb, lb.T)
+
+
+def dtw_pairs(A, B, window):
+    """
+    Banded DTW distance between rows of A and the matching rows of B, all pairs
+    at once. The cost matrix is held as diagonals offset -window..window so each
+    pair needs only 2*window+1 cells per row.
+    """
+    P, T = A.shape
+    w = window
+    # padded band, column k+1 holds offset k-w, the outer columns stay inf
+    prev = np.full((P, 2*w+3), np.inf)
+    prev[:, w+1] = 0
+    cur = np.empty_like(prev)
+    offsets = np.arange(-w, w+1)
+    for i in range(1, T+1):
+        cur.fill(np.inf)
+        j = i+offsets
+        valid = (j>=1) & (j<=T)
+        k = np.nonzero(valid)[0]
+        cost = (A[:, [i-1]]-B[:, j[valid]-1])**2
+        # diagonal and vertical moves come from the previous row
+        base = np.minimum(prev[:, k+1], prev[:, k+2])
+        # horizontal moves along the row are a min-plus prefix scan:
+        # cur[k] = S[k] + min over m<=k of (base[m] - S[m-1]), S the running cost
+        S = np.cumsum(cost, axis=1)
+        cur[:, k+1] = S+np.minimum.accumulate(base-(S-cost), axis=1)
+        prev, cur = cur, prev
+    return np.sqrt(prev[:, w+1])
+
+
+def dtw_block(X, pairs, window, batch=256):
+    # small batches keep the band arrays in cache
+    return np.concatenate([dtw_pairs(X[pairs[i:i+batch, 0]], X[pairs[i:i+batch, 1]], window)
+                           for i in range(0, len(pairs), batch)])
+
+
+def dtw_matrix(X, window, approx=None, n_jobs=None):
+    """
+    Pairwise banded DTW distances between the rows of X, spread over a process
+    pool. Exact unless approx is set to a quantile (e.g. 0.75): pairs whose
+    LB_Keogh bound is above that quantile then take the bound in place of their
+    DTW distance. The bound is never larger than the true distance, so those
+    distant pairs are underestimated and the result is an approximation.
+    """
+    n = len(X)
+    iu = np.triu_indices(n, 1)
+    pairs = np.column_stack(iu)
+    D = np.zeros((n, n))
+    if len(pairs) == 0:
+        return D
+
+    if approx is not None:
+        lb = lb_keogh(X, window)[iu]
+        keep = lb <= np.quantile(lb, approx)
+        D[iu[0][~keep], iu[1][~keep]] = lb[~keep]
+        pairs = pairs[keep]
+
+    # a few large blocks per worker, each block is one vectorised DP over its pairs
+    n_jobs = n_jobs or os.cpu_count() or 1
+    n_blocks = min(len(pairs), 2*n_jobs) if n_jobs > 1 else 1
+    blocks = [b for b in np.array_split(pairs, n_blocks) if len(b) > 0]
+    if n_jobs == 1 or len(blocks) == 1:
+        dists = [dtw_block(X, b, window) for b in blocks]
+    else:
+        with ProcessPoolExecutor(n_jobs) as ex:
+            dists = list(ex.map(dtw_block, [X]*len(blocks), blocks, [window]*len(blocks)))
+    if len(blocks) > 0:
+        pairs_done = np.concatenate(blocks)
+        D[pairs_done[:, 0], pairs_done[:, 1]] = np.concatenate(dists)
+    return D+D.T
+
+
+class ClusterResult:
+    """Resampled matrix, DTW distances and linkage for one clustering window."""
+
+    def __init__(self, df_m, D, window, seconds=None):
+        self.df_m = df_m
+        self.D = D
+        self.window = window
+        # time to build the matrix and its DTW distances, for comparing with other paths
+        self.seconds = seconds
+        self.Z = linkage(squareform(D, checks=False), method='average') if len(D) > 1 else None
+
+    def labels(self, n_clusters):
+        """Cut the cached tree into n_clusters groups, numbered from 1."""
+        if self.Z is None:
+            return np.ones(len(self.df_m), dtype=int)
+        return fcluster(self.Z, n_clusters, criterion='maxclust')
+
+
+# cached results shared by all sessions, keyed on dataset, window and options
+_results = OrderedDict()
+_results_lock = threading.Lock()
+max_results = 16
+
+
+def get_result(store, val, mode, start_dtime, end_dtime, freq, stat, band=0.1, approx=None, n_jobs=None):
+    """Return the cached ClusterResult for a window, computing the DTW matrix only on a miss."""
+    key = (store.fingerprint, val, mode, start_dtime, end_dtime, freq, stat, band, approx)
+    with _results_lock:
+        if key in _results:
+            _results.move_to_end(key)
+            return _results[key]
+    t0 = time.perf_counter()
+    df_m = series_matrix(store, val, start_dtime, end_dtime, freq, stat, mode)
+    window = max(1, int(round(band*df_m.shape[1])))
+    D = dtw_matrix(df_m.to_numpy(dtype='float64'), window, approx, n_jobs)
+    result = ClusterResult(df_m, D, window, time.perf_counter()-t0)
+    with _results_lock:
+        _results[key] = result
+        while len(_results) > max_results:
+            _results.popitem(last=False)
+    return result
+
+
+def plot_clusters(df_m, labels, dict_color):
+    """One panel per cluster with its member sensors' resampled series."""
+    groups = np.unique(labels)
+    fig = make_subplots(rows=len(groups), cols=1, shared_xaxes=True,
+                        subplot_titles=[f'Group {g}: N Sensors = {(labels==g).sum()}' for g in groups])
+    for r, g in enumerate(groups):
+        color = dict_color[(g-1) % len(dict_color)]
+        for s, y in df_m.loc[labels==g].iterrows():
+            fig.add_trace(go.Scattergl(
+                x=df_m.columns,
+                y=y.values,
+                mode='lines',
+                line=dict(width=1, color=color),
+                opacity=0.6,
+                name=f'{s}',
+                showlegend=False,
+                ),
+                row=r+1, col=1
+            )
+    fig.update_layout(height=max(400, 250*len(groups)),
+                      font=dict(family='Arial', size=12))
+    return fig
+
+
+def dtw_cluster(store, val, mode, n_clusters, start_dtime, end_dtime, freq, stat, dict_color, band=0.1, approx=None):
+    """
+    Drop-in replacement for gwl.dtw_cluster on a SensorStore. Returns the
+    cluster figure and a frame of [SensorCode, Group].
+    """
+    result = get_result(store, val, mode, start_dtime, end_dtime, freq, stat, band, approx)
+    labels = result.labels(n_clusters)
+    df_groups = pd.DataFrame({store.scode: result.df_m.index, 'Group': labels})
+    fig = plot_clusters(result.df_m, labels, dict_color)
+    return fig, df_groups
+
+
+######################## INCREMENTAL #########################
+
+# full-record matrices and per-segment squared DTW distances, shared by all sessions
+_full = OrderedDict()
+_segments = OrderedDict()
+max_full = 4
+# the segment cache holds at least this many, and at least twice the segments of the current window
+max_segments = 128
+
+
+def full_matrix(store, val, freq, stat, mode):
+    """
+    Sensors x time matrix over the whole record, gaps interpolated and scaled
+    over the full record, with the observed mask and the seconds it took to build.
+    """
+    key = (store.fingerprint, val, freq, stat, mode)
+    with _results_lock:
+        if key in _full:
+            _full.move_to_end(key)
+            return _full[key], True
+    t0 = time.perf_counter()
+    df_rs = gwr.cache.resample(store, None, val, freq, stat)
+    df_obs = df_rs.pivot(index=store.scode, columns=store.dtime, values=val)
+    df_m = df_obs.interpolate(axis=1, limit_direction='both')
+    if mode == 'Normalised':
+        df_m = gwr.normalise_matrix(df_m, axis=1)
+    elif mode == 'Standardised':
+        df_m = df_m.sub(df_m.mean(axis=1), axis=0).div(df_m.std(axis=1).replace(0, 1), axis=0)
+    full = (df_m, df_obs.notna().to_numpy(), time.perf_counter()-t0)
+    with _results_lock:
+        _full[key] = full
+        while len(_full) > max_full:
+            _full.popitem(last=False)
+    return full, False
+
+
+def segment_block(X, start, stop, band):
+    """Squared banded DTW distances between all rows of X over bins [start, stop)."""
+    window = max(1, int(round(band*(stop-start))))
+    return (dtw_matrix(X[:, start:stop], window, n_jobs=1)**2).astype('float32')
+
+
+def segments_d2(base, spans, X, band, n_jobs=None):
+    """
+    Squared DTW matrices of each (start, stop) span, cached by base+span.
+    Spans not in the cache are computed together over one process pool.
+    The cache is sized to keep every span of this window, so a nudged
+    window finds them again. Returns the matrices and the number reused.
+    """
+    keys = [base+span for span in spans]
+    with _results_lock:
+        found = {k: _segments[k] for k in keys if k in _segments}
+        for k in found:
+            _segments.move_to_end(k)
+    todo = [(k, span) for k, span in zip(keys, spans) if k not in found]
+
+    n_jobs = n_jobs or os.cpu_count() or 1
+    if len(todo) > 1 and n_jobs > 1:
+        with ProcessPoolExecutor(min(n_jobs, len(todo))) as ex:
+            new = list(ex.map(segment_block, [X]*len(todo), [s for _, (s, _) in todo], [e for _, (_, e) in todo],
+                              [band]*len(todo)))
+    else:
+        new = [segment_block(X, start, stop, band) for _, (start, stop) in todo]
+
+    capacity = max(max_segments, 2*len(spans))
+    with _results_lock:
+        for (k, _), d2 in zip(todo, new):
+            _segments[k] = d2
+            found[k] = d2
+        while len(_segments) > capacity:
+            _segments.popitem(last=False)
+    return [found[k] for k in keys], len(spans)-len(todo)
+
+
+def kmedoids(D, n_clusters, init=None, max_iter=50):
+    """
+    Alternating k-medoids on a distance matrix. init is a list of row indices
+    used as starting medoids (e.g. the previous window's), topped up with the
+    points farthest from the current medoids. Returns labels from 1 and medoids.
+    """
+    n = len(D)
+    n_clusters = min(n_clusters, n)
+    medoids = [m for m in (init or []) if m < n][:n_clusters]
+    if len(medoids) == 0:
+        medoids = [int(np.argmin(D.sum(axis=1)))]
+    while len(medoids) < n_clusters:
+        medoids.append(int(np.argmax(D[:, medoids].min(axis=1))))
+    medoids = np.array(medoids)
+    for it in range(max_iter):
+        labels = np.argmin(D[:, medoids], axis=1)
+        new = medoids.copy()
+        for c in range(n_clusters):
+            members = np.nonzero(labels==c)[0]
+            if len(members) > 0:
+                new[c] = members[np.argmin(D[np.ix_(members, members)].sum(axis=1))]
+        if (new == medoids).all():
+            break
+        medoids = new
+    labels = np.argmin(D[:, medoids], axis=1)
+    return labels+1, medoids, it+1
+
+
+def dtw_cluster_incremental(store, val, mode, n_clusters, start_dtime, end_dtime, freq, stat, dict_color,
+                            band=0.1, seg_len=26, prev_medoids=None, min_coverage=0.5, n_jobs=None):
+    """
+    Clustering for a sliding date window that reuses work from earlier windows.
+
+    The record is cut into fixed segments of seg_len bins and the distance is
+    the root of the summed squared banded DTW of each segment in the window, so
+    warping cannot cross segment boundaries. When the window moves only the
+    segments at its edges are new; whole segments are reused from the cache.
+    Series are scaled over the full record so segments don't depend on the
+    window. Groups come from k-medoids warm-started from prev_medoids (sensor
+    codes from the previous window).
+
+    Returns the figure, the groups frame and an info dict with the medoids,
+    the segments reused and the elapsed time.
+    """
+    t0 = time.perf_counter()
+    (df_full, observed, _), _ = full_matrix(store, val, freq, stat, mode)
+    X = df_full.to_numpy(dtype='float64')
+    bins = df_full.columns
+    a = int(bins.searchsorted(pd.Timestamp(start_dtime), side='left'))
+    b = int(bins.searchsorted(pd.Timestamp(end_dtime), side='right'))
+    base = (store.fingerprint, val, freq, stat, mode, band, seg_len)
+
+    # whole segments inside the window plus partial segments at each edge
+    spans = []
+    s0 = -(-a//seg_len)*seg_len
+    s1 = (b//seg_len)*seg_len
+    if s0 >= s1:
+        spans.append((a, b))
+    else:
+        if a < s0:
+            spans.append((a, s0))
+        spans += [(s, s+seg_len) for s in range(s0, s1, seg_len)]
+        if s1 < b:
+            spans.append((s1, b))
+
+    segs, n_reused = segments_d2(base, spans, X, band, n_jobs)
+    D2 = np.zeros((len(X), len(X)))
+    for d2 in segs:
+        D2 += d2
+
+    # drop sensors without enough observations in the window
+    keep = observed[:, a:b].mean(axis=1) >= min_coverage if b > a else np.zeros(len(X), dtype=bool)
+    sensors = df_full.index[keep]
+    D = np.sqrt(D2[np.ix_(keep, keep)])
+
+    # warm start from the previous medoids that are still in the window
+    pos = {s: i for i, s in enumerate(sensors)}
+    init = [pos[m] for m in (prev_medoids or []) if m in pos]
+    labels, medoids, n_iter = kmedoids(D, n_clusters, init) if len(D) > 0 else (np.array([], dtype=int), np.array([], dtype=int), 0)
+
+    df_groups = pd.DataFrame({store.scode: sensors, 'Group': labels})
+    fig = plot_clusters(df_full.loc[keep, bins[a:b]], labels, dict_color)
+    info = {'Medoids': list(sensors[medoids]),
+            'Segments': len(spans),
+            'SegmentsReused': n_reused,
+            'Iterations': n_iter,
+            'Elapsed': time.perf_counter()-t0}
+    return fig, df_groups, info
+
+
+######################## ROLLING WINDOWS #########################
+
+def snap_window(window_bins, step_bins):
+    """The window length nearest to window_bins that is a whole number of steps, at least one step."""
+    return max(1, int(round(window_bins/step_bins)))*step_bins
+
+
+def align_labels(prev, cur, n_clusters):
+    """Relabel cur so its groups best match prev on the sensors both windows share (Hungarian matching)."""
+    both = (prev > 0) & (cur > 0)
+    if not both.any():
+        return cur
+    C = np.zeros((n_clusters, n_clusters))
+    np.add.at(C, (prev[both]-1, cur[both]-1), 1)
+    rows, cols = linear_sum_assignment(-C)
+    mapping = np.zeros(n_clusters+1, dtype=int)
+    mapping[cols+1] = rows+1
+    return np.where(cur > 0, mapping[cur], 0)
+
+
+def rolling_membership(store, val, mode, n_clusters, freq, stat, window_bins, step_bins,
+                       band=0.1, min_coverage=0.5, n_jobs=None, progress=None):
+    """
+    Cluster every window of window_bins bins, stepping by step_bins, over the
+    whole record. The record is cut into segments of step_bins and each
+    segment's squared banded DTW matrix is computed once across a process pool;
+    a window's distance is the root of the running sum of its segments. Each
+    window is clustered by average linkage and its labels are aligned to the
+    previous window's.
+
+    window_bins must be a whole number of steps, see snap_window.
+
+    Returns a sensors x window-start table of groups (NaN where a sensor lacks
+    data in the window) and a frame of window start and end times.
+    """
+    if window_bins < step_bins or window_bins % step_bins != 0:
+        raise ValueError(f'Window of {window_bins} bins is not a whole number of {step_bins}-bin steps')
+    (df_full, observed, _), _ = full_matrix(store, val, freq, stat, mode)
+    X = df_full.to_numpy(dtype='float64')
+    bins = df_full.columns
+    n_segs_win = window_bins//step_bins
+    starts = list(range(0, len(bins)-step_bins+1, step_bins))
+
+    # squared DTW of every segment, in parallel
+    n_jobs = n_jobs or os.cpu_count() or 1
+    args = [(X, s, s+step_bins, band) for s in starts]
+    segs = []
+    with ProcessPoolExecutor(n_jobs) as ex:
+        for i, d2 in enumerate(ex.map(segment_block, *zip(*args), chunksize=max(1, len(args)//(4*n_jobs)))):
+            segs.append(d2)
+            if progress is not None:
+                progress(0.8*(i+1)/len(args))
+
+    # slide the window along the segments with a running sum
+    members = {}
+    list_windows = []
+    prev = None
+    D2 = np.zeros((len(X), len(X)))
+    n_windows = len(segs)-n_segs_win+1
+    for i in range(len(segs)):
+        D2 += segs[i]
+        if i >= n_segs_win:
+            D2 -= segs[i-n_segs_win]
+        if i < n_segs_win-1:
+            continue
+        a, b = starts[i-n_segs_win+1], starts[i]+step_bins
+        keep = observed[:, a:b].mean(axis=1) >= min_coverage
+        labels = np.zeros(len(X), dtype=int)
+        if keep.sum() > 1:
+            Z = linkage(squareform(np.sqrt(np.clip(D2[np.ix_(keep, keep)], 0, None)), checks=False), method='average')
+            labels[keep] = fcluster(Z, n_clusters, criterion='maxclust')
+        elif keep.sum() == 1:
+            labels[keep] = 1
+        if prev is not None:
+            labels = align_labels(prev, labels, n_clusters)
+        prev = labels
+        members[bins[a]] = labels
+        list_windows.append({'Start': bins[a], 'End': bins[b-1]})
+        if progress is not None:
+            progress(0.8+0.2*len(list_windows)/n_windows)
+
+    df_members = pd.DataFrame(members, index=df_full.index).replace(0, np.nan)
+    return df_members, pd.DataFrame(list_windows)
+
+
+def plot_membership(df_members, n_clusters, dict_color):
+    """Heatmap of group membership with sensors as rows and window starts as columns."""
+    # discrete colorscale with one band per group
+    colorscale = []
+    for g in range(n_clusters):
+        color = dict_color[g % len(dict_color)]
+        colorscale += [[g/n_clusters, color], [(g+1)/n_clusters, color]]
+    fig = go.Figure(go.Heatmap(
+        z=df_members.values,
+        x=df_members.columns,
+        y=[str(s) for s in df_members.index],
+        zmin=0.5,
+        zmax=n_clusters+0.5,
+        colorscale=colorscale,
+        colorbar=dict(title='Group'),
+        ))
+    fig.update_layout(height=max(400, 12*len(df_members)),
+                      font=dict(family='Arial', size=12))
+    return fig
@@ -0,0 +1,104 @@
+# Correlation of every sensor against every stress on a common time index
+import os
+import numpy as np
+import pandas as pd
+from scipy.stats import rankdata
+import GWLs_resample as gwr
+import GWLs_store as gws
+import GWLs_lags as gwlag
+
+# stress statistics available for the matrices, cumulative ones are built from the resampled sum
+stress_stats = ['mean', 'min', 'max', 'sum', 'median', 'cumsum', 'cumdep']
+
+
+def masked_corr(X, Y):
+    """
+    Pearson R between every row of X and every row of Y, each pair using only
+    the time steps where both are observed (NaNs are gaps). Returns R and the
+    number of pairs N, each (rows of X, rows of Y).
+    """
+    MX, MY = np.isfinite(X), np.isfinite(Y)
+    # centre on the overall means so the sums don't cancel catastrophically
+    with np.errstate(invalid='ignore'):
+        Xc = np.where(MX, X-np.nanmean(np.where(MX, X, np.nan), axis=1, keepdims=True), 0)
+        Yc = np.where(MY, Y-np.nanmean(np.where(MY, Y, np.nan), axis=1, keepdims=True), 0)
+    MX, MY = MX.astype('float64'), MY.astype('float64')
+
+    n = np.rint(MX @ MY.T)
+    Sx, Sy = Xc @ MY.T, MX @ Yc.T
+    Sxx, Syy = (Xc**2) @ MY.T, MX @ (Yc**2).T
+    Sxy = Xc @ Yc.T
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cov = n*Sxy-Sx*Sy
+        var = (n*Sxx-Sx**2)*(n*Syy-Sy**2)
+        R = np.where((n > 2) & (var > 0), cov/np.sqrt(np.clip(var, 0, None)), np.nan)
+    return np.clip(R, -1, 1), n.astype(int)
+
+
+def masked_spearman(X, Y):
+    """
+    Spearman R between every row of X and every row of Y, ranking each pair
+    over the time steps where both are observed, as scipy does on the merged
+    pair. Loops over the rows of Y (stresses) and is vectorised over X.
+    """
+    R = np.full((len(X), len(Y)), np.nan)
+    for j, y in enumerate(Y):
+        M = np.isfinite(X) & np.isfinite(y)[None, :]
+        with np.errstate(invalid='ignore'):
+            rx = rankdata(np.where(M, X, np.nan), axis=1, nan_policy='omit')
+            ry = rankdata(np.where(M, y[None, :], np.nan), axis=1, nan_policy='omit')
+        # both ranks share the pair mask, so row-wise Pearson on them is Spearman
+        rx, ry = rx-np.nanmean(rx, axis=1, keepdims=True), ry-np.nanmean(ry, axis=1, keepdims=True)
+        den = np.sqrt(np.nansum(rx**2, axis=1)*np.nansum(ry**2, axis=1))
+        R[:, j] = np.where((M.sum(axis=1) > 2) & (den > 0), np.nansum(rx*ry, axis=1)/np.where(den > 0, den, 1), np.nan)
+    return R
+
+
+def stress_matrix(df_stresses, freq, stat, s_id='StressID', dtime='DTime', s_val='Value'):
+    """Every stress resampled with stat as rows on its time bins, interior gaps interpolated."""
+    agg = 'sum' if stat in ['cumsum', 'cumdep'] else stat
+    df_rs = gwr.resample_all(df_stresses[[s_id, dtime, s_val]], s_id, dtime, s_val, freq, agg)
+    grp = df_rs.groupby(s_id, observed=True, sort=False)[s_val]
+    if stat == 'cumsum':
+        df_rs[s_val] = grp.cumsum()
+    elif stat == 'cumdep':
+        df_rs[s_val] = (df_rs[s_val]-grp.transform('mean')).groupby(df_rs[s_id], observed=True, sort=False).cumsum()
+    df_m = df_rs.pivot(index=s_id, columns=dtime, values=s_val)
+    return df_m.interpolate(axis=1, limit_area='inside')
+
+
+def corr_matrices(store, df_stresses, freq, stat, val='WL', s_id='StressID'):
+    """
+    Pearson and Spearman R of every sensor against every stress, on levels and
+    on first differences. Sensors are aligned on the stress time bins and
+    each pair uses the bins where both are observed.
+
+    Returns a long frame of [SensorCode, StressID, Pearson R, Spearman R,
+    Pearson R (Diff), Spearman R (Diff), N].
+    """
+    df_s = stress_matrix(df_stresses, freq, stat, s_id)
+    # pairs only use bins where both are observed, so the stress bins are a sufficient common index
+    df_m = gwlag.sensor_matrix(store, val, freq, df_s.columns)
+
+    X, Y = df_m.to_numpy(dtype='float64'), df_s.to_numpy(dtype='float64')
+    dX, dY = np.diff(X, axis=1), np.diff(Y, axis=1)
+    R_p, N = masked_corr(X, Y)
+    R_s = masked_spearman(X, Y)
+    R_pd, _ = masked_corr(dX, dY)
+    R_sd = masked_spearman(dX, dY)
+
+    n_m, n_s = len(df_m), len(df_s)
+    return pd.DataFrame({store.scode: np.repeat(df_m.index.values, n_s),
+                         s_id: np.tile(df_s.index.values, n_m),
+                         'Pearson R': R_p.ravel(),
+                         'Spearman R': R_s.ravel(),
+                         'Pearson R (Diff)': R_pd.ravel(),
+                         'Spearman R (Diff)': R_sd.ravel(),
+                         'N': N.ravel()})
+
+
+def cached_corr_matrices(store, df_stresses, freq, stat, val='WL', stress_handle=None):
+    """corr_matrices cached on disk by time-series and stress hashes (the stress handle if given), frequency and statistic."""
+    stress_hash = stress_handle or gws.fingerprint(df_stresses)
+    path = os.path.join(gws.cache_dir, f'corr_{store.fingerprint}_{stress_hash}_{val}_{freq}_{stat}.pkl')
+    return gws.cached(path, lambda: corr_matrices(store, df_stresses, freq, stat, val))
@@ -0,0 +1,83 @@
+# Cached seasonal decomposition shared by the Stresses and Lag Times pages
+import os
+import numpy as np
+import pandas as pd
+import GWLs_v01 as gwl
+import GWLs_resample as gwr
+import GWLs_store as gws
+
+# seasonal period per frequency
+periods = {'W': 53, 'M': 13, 'D': 365}
+
+
+class DecompositionCache(gwr.FrameCache):
+    """
+    LRU cache of gwl.seasonal_decomposition results (the resampled frame with
+    its Trend, Seasonal and Residual columns) keyed on
+    (dataset hash, series id, val, freq, period, method).
+    """
+
+    def decompose(self, data_hash, series_id, df_rs, id_col, dtime, val, freq, method, period=None):
+        """Decompose a resampled series, reusing a cached result for the same data and settings."""
+        if period is None:
+            period = periods[freq]
+        key = (data_hash, series_id, val, freq, period, method)
+        df_sd = self.get(key)
+        if df_sd is None:
+            df_sd = gwl.seasonal_decomposition(series_id, df_rs, id_col, dtime, val, period, method)
+            self.put(key, df_sd)
+        # callers modify their frame in place, so hand out a copy
+        return df_sd.copy()
+
+    def decompose_sensor(self, store, sensor, val, freq, method, period=None):
+        """Decompose a sensor's median-resampled, gap-interpolated levels from a SensorStore."""
+        # the resample is cached too, so building the input on a hit is cheap
+        df_rs = gwr.cache.resample(store, sensor, val, freq, 'median')
+        df_rs[val] = df_rs[val].interpolate()
+        return self.decompose(store.fingerprint, sensor, df_rs, store.scode, store.dtime, val, freq, method, period)
+
+
+# process-wide cache shared by all pages and sessions, series are small so a modest budget holds many
+cache = DecompositionCache(max_bytes=128*2**20)
+
+
+def variance_fractions(df_sd):
+    """Share of the summed Trend, Seasonal and Residual variances held by each component."""
+    var = df_sd[['Trend', 'Seasonal', 'Residual']].var()
+    total = var.sum()
+    return var/total if total > 0 else var*np.nan
+
+
+def sd_var_chunk(df_rs, scode, dtime, val, period, method):
+    """Variance fractions for each sensor in a block of the resampled frame, NaN where decomposition fails."""
+    rows = {}
+    for s, df_s in df_rs.groupby(scode, observed=True, sort=False):
+        df_s = df_s.copy()
+        df_s[val] = df_s[val].interpolate()
+        df_s = df_s.dropna(subset=val)
+        try:
+            rows[s] = variance_fractions(gwl.seasonal_decomposition(s, df_s, scode, dtime, val, period, method))
+        except ValueError:
+            # too short for two seasonal cycles
+            rows[s] = pd.Series(np.nan, index=['Trend', 'Seasonal', 'Residual'])
+    return pd.DataFrame.from_dict(rows, orient='index')
+
+
+def get_sd_var(store, val='WL', freq='W', method='MA', n_jobs=None, progress=None):
+    """
+    Seasonal decomposition of every sensor over a process pool, returning
+    [SensorCode, Trend_Var, Seasonal_Var, Residual_Var] variance fractions.
+    """
+    period = periods[freq]
+    df_rs = gwr.cache.resample(store, None, val, freq, 'median')
+
+    results = gwr.map_sensor_blocks(sd_var_chunk, df_rs, store.scode, (store.scode, store.dtime, val, period, method), n_jobs, progress)
+    df_sd_var = pd.concat(results)
+    df_sd_var.columns = [f'{c}_Var' for c in df_sd_var.columns]
+    return df_sd_var.rename_axis(store.scode).reset_index()
+
+
+def cached_sd_var(store, val='WL', freq='W', method='MA', n_jobs=None, progress=None):
+    """get_sd_var cached on disk by dataset hash, frequency and method."""
+    path = os.path.join(gws.cache_dir, f'sd_var_{store.fingerprint}_{val}_{freq}_{method}.pkl')
+    return gws.cached(path, lambda: get_sd_var(store, val, freq, method, n_jobs, progress))
@@ -0,0 +1,98 @@
+# Downsampling of time-series traces to a point budget before they are sent to Plotly
+import time
+import numpy as np
+import pandas as pd
+
+
+def as_float(x):
+    """Numeric x positions, datetimes as nanoseconds."""
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        x = x.astype('datetime64[ns]').astype('int64')
+    return x.astype('float64')
+
+
+def minmax(x, y, n_out):
+    """
+    Indices of the minimum and maximum of y in each of n_out/2 buckets of
+    equal count, in time order, so every peak and trough survives.
+    """
+    n = len(y)
+    if n <= n_out:
+        return np.arange(n)
+    size = int(np.ceil(n/max(1, n_out//2)))
+    n_buckets = int(np.ceil(n/size))
+    # pad the last bucket so buckets are rows of one matrix
+    Y = np.full(n_buckets*size, np.nan)
+    Y[:n] = y
+    Y = Y.reshape(n_buckets, size)
+    start = np.arange(n_buckets)*size
+    return np.unique(np.concatenate([start+np.nanargmin(Y, axis=1), start+np.nanargmax(Y, axis=1)]))
+
+
+def lttb(x, y, n_out):
+    """Indices chosen by Largest-Triangle-Three-Buckets, keeping the first and last point."""
+    n = len(y)
+    if n <= n_out or n_out < 3:
+        return np.arange(n)
+    x = as_float(x)
+    y = np.asarray(y, dtype='float64')
+    edges = np.linspace(1, n-1, n_out-1).astype(int)
+    idx = np.empty(n_out, dtype=int)
+    idx[0], idx[-1] = 0, n-1
+    a = 0
+    for i in range(n_out-2):
+        lo, hi = edges[i], edges[i+1]
+        # average of the next bucket, or the last point for the final bucket
+        nlo, nhi = (edges[i+1], edges[i+2]) if i+2 < len(edges) else (n-1, n)
+        cx, cy = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        area = np.abs((x[a]-cx)*(y[lo:hi]-y[a])-(x[a]-x[lo:hi])*(cy-y[a]))
+        a = lo+int(np.argmax(area))
+        idx[i+1] = a
+    return idx
+
+
+def downsample(x, y, n_out=2000, method='MinMax', x_range=None):
+    """
+    Reduce a trace to about n_out points with 'MinMax' or 'LTTB' ('None'
+    keeps every point). With x_range=(start, end) only that window is kept
+    first, so zooming in brings back full resolution. The observed points are
+    reduced, then the first NaN of any gap between two kept points is put
+    back, so the line still breaks at logger outages.
+    """
+    x = pd.Series(np.asarray(x))
+    y = pd.Series(np.asarray(y, dtype='float64'))
+    if x_range is not None:
+        keep = ((x >= x_range[0]) & (x <= x_range[1])).values
+        x, y = x[keep].reset_index(drop=True), y[keep].reset_index(drop=True)
+    if method not in ['LTTB', 'MinMax']:
+        return x, y
+
+    valid = np.isfinite(y.values)
+    obs = np.flatnonzero(valid)
+    reduce = lttb if method == 'LTTB' else minmax
+    idx = obs[reduce(x.values[obs], y.values[obs], n_out)]
+
+    # a separator wherever NaNs lie between consecutive kept points
+    gaps = np.flatnonzero(~valid)
+    if len(gaps) > 0 and len(idx) > 1:
+        nxt = np.searchsorted(gaps, idx[:-1])
+        crosses = nxt < len(gaps)
+        crosses[crosses] = gaps[nxt[crosses]] < idx[1:][crosses]
+        idx = np.sort(np.concatenate([idx, gaps[nxt[crosses]]]))
+    return x.iloc[idx].reset_index(drop=True), y.iloc[idx].reset_index(drop=True)
+
+
+def payload(fig, t0, size=False):
+    """
+    Points and server-side build time of a figure started at perf_counter() t0,
+    for a page caption. Browser render time can't be seen from the server. With
+    size=True the figure is also serialised to JSON to report the payload size,
+    after the build time is taken.
+    """
+    build = time.perf_counter()-t0
+    n_points = sum(len(t.x) for t in fig.data if t.x is not None)
+    caption = f'Points Sent: {n_points}, Server-side Build: {1000*build:.0f} ms'
+    if size:
+        caption += f', Payload: {len(fig.to_json())/1024:.0f} KB'
+    return caption
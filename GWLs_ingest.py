@@ -0,0 +1,178 @@
+# Readers for the uploaded time-series and stress files
+import os
+import shutil
+import hashlib
+import tempfile
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# fields required in the time-series upload
+ts_fields = ['DTime', 'SensorCode', 'WL', 'SL']
+
+# date formats tried before falling back to pandas' dayfirst parser
+dtime_formats = ['%d/%m/%Y %H:%M', '%d/%m/%Y %H:%M:%S', '%d/%m/%Y',
+                 '%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d', '%Y-%m-%dT%H:%M:%S',
+                 '%d-%m-%Y %H:%M', '%d-%m-%Y %H:%M:%S', '%d-%m-%Y']
+
+# local folder for time-series spilled to disk by the streaming ingest
+spill_dir = os.path.join(tempfile.gettempdir(), 'vwp_spill')
+
+
+def detect_format(upload):
+    """Return 'parquet', 'arrow' or 'csv' from the file magic bytes, falling back to the extension."""
+    head = upload.read(8)
+    upload.seek(0)
+    if head[:4] == b'PAR1':
+        return 'parquet'
+    elif head[:6] == b'ARROW1':
+        return 'arrow'
+    ext = os.path.splitext(getattr(upload, 'name', ''))[1].lower()
+    if ext in ['.parquet', '.pq']:
+        return 'parquet'
+    elif ext in ['.arrow', '.feather', '.ipc']:
+        return 'arrow'
+    return 'csv'
+
+
+def file_hash(upload, chunksize=1 << 20):
+    """Short content hash of an uploaded file, read in chunks and rewound."""
+    h = hashlib.sha1()
+    upload.seek(0)
+    for block in iter(lambda: upload.read(chunksize), b''):
+        h.update(block)
+    upload.seek(0)
+    return h.hexdigest()[:16]
+
+
+def find_dtime_format(values, n=1000):
+    """Return the first known date format that parses a sample of values, else None."""
+    sample = pd.Series(values).dropna().astype(str).head(n)
+    for fmt in dtime_formats:
+        try:
+            pd.to_datetime(sample, format=fmt)
+            return fmt
+        except (ValueError, TypeError):
+            continue
+    return None
+
+
+def parse_dtime(s, fmt=None, errors='raise'):
+    """Parse a column of date strings, parsing each distinct value only once."""
+    if pd.api.types.is_datetime64_any_dtype(s):
+        return s
+    s = s.astype('category')
+    cats = s.cat.categories
+    if fmt is None:
+        fmt = find_dtime_format(cats)
+    parsed = None
+    if fmt is not None:
+        # the format was found on a sample, so check it holds for every distinct value
+        try:
+            parsed = pd.to_datetime(cats, format=fmt)
+        except (ValueError, TypeError):
+            parsed = None
+    if parsed is None:
+        # mixed or unknown formats, parsed value by value as the original upload did
+        parsed = pd.to_datetime(cats, dayfirst=True, format='mixed', errors=errors)
+    return pd.Series(parsed.take(s.cat.codes.values), index=s.index, name=s.name).where(s.notna())
+
+
+def as_category(s):
+    """Categorical sensor codes, keeping numeric codes numeric so they still match df_xy."""
+    s = s.astype('category')
+    try:
+        s = s.cat.rename_categories(pd.to_numeric(s.cat.categories))
+    except (ValueError, TypeError):
+        pass
+    return s
+
+
+def typed(df):
+    """Downcast a time-series frame to the compact schema used in session state."""
+    df['DTime'] = parse_dtime(df['DTime'])
+    df['SensorCode'] = as_category(df['SensorCode'])
+    df['WL'] = df['WL'].astype('float32')
+    df['SL'] = df['SL'].astype('float32')
+    return df
+
+
+def read_ts(upload):
+    """Read a time-series upload, projecting to the required fields with a compact schema."""
+    fmt = detect_format(upload)
+    if fmt == 'parquet':
+        df = pd.read_parquet(upload, columns=ts_fields)
+    elif fmt == 'arrow':
+        df = pd.read_feather(upload, columns=ts_fields)
+    else:
+        # dates and codes repeat heavily so read them as categories and parse the distinct values
+        df = pd.read_csv(upload, usecols=ts_fields,
+                         dtype={'DTime': 'category', 'SensorCode': 'category', 'WL': 'float32', 'SL': 'float32'})
+    return typed(df[ts_fields])
+
+
+def read_stresses(upload):
+    """Read a stress upload with the same fast date parsing as the time-series."""
+    df = pd.read_csv(upload, dtype={'DTime': 'category'})
+    df['DTime'] = parse_dtime(df['DTime'])
+    return df
+
+
+def spill_ts(upload, root, chunksize=1_000_000):
+    """
+    Stream a time-series CSV to disk in chunks, writing a parquet dataset
+    partitioned by SensorCode under root. Rows with missing sensor codes,
+    dates or levels are dropped. Returns a summary of what was written.
+    """
+    summary = {'Root': root, 'Rows': 0, 'Dropped': 0, 'Sensors': set(), 'DTimeMin': None, 'DTimeMax': None}
+    # start from an empty root so no part files are left from an earlier spill
+    shutil.rmtree(root, ignore_errors=True)
+    fmt = None
+    reader = pd.read_csv(upload, usecols=lambda c: c in ts_fields, chunksize=chunksize,
+                         dtype={'DTime': 'category', 'SensorCode': str, 'WL': 'float32', 'SL': 'float32'})
+    for i, chunk in enumerate(reader):
+        # validate fields on the first chunk
+        missing = [c for c in ts_fields if c not in chunk.columns]
+        if len(missing) > 0:
+            raise ValueError(f'Time-series upload is missing required fields {missing}')
+
+        # parse dates with the format found on the first chunk, unparseable dates are dropped
+        if fmt is None:
+            fmt = find_dtime_format(chunk['DTime'].cat.categories)
+        chunk['DTime'] = parse_dtime(chunk['DTime'], fmt, errors='coerce')
+        n = len(chunk)
+        chunk = chunk.dropna(subset=['DTime', 'SensorCode', 'WL'])
+        summary['Dropped'] += n-len(chunk)
+        if len(chunk) == 0:
+            continue
+
+        # append this chunk to each sensor's partition
+        table = pa.Table.from_pandas(chunk[ts_fields], preserve_index=False)
+        pq.write_to_dataset(table, root, partition_cols=['SensorCode'],
+                            basename_template=f'part-{i}-{{i}}.parquet')
+        summary['Rows'] += len(chunk)
+        summary['Sensors'].update(chunk['SensorCode'].unique())
+        t0, t1 = chunk['DTime'].min(), chunk['DTime'].max()
+        summary['DTimeMin'] = t0 if summary['DTimeMin'] is None else min(t0, summary['DTimeMin'])
+        summary['DTimeMax'] = t1 if summary['DTimeMax'] is None else max(t1, summary['DTimeMax'])
+
+    summary['Sensors'] = sorted(summary['Sensors'])
+    return summary
+
+
+def load_spill(root, sensors=None, start=None, end=None):
+    """Load selected sensors and a date range from a spilled dataset with the compact schema."""
+    partitioning = ds.partitioning(pa.schema([('SensorCode', pa.string())]), flavor='hive')
+    dataset = ds.dataset(root, format='parquet', partitioning=partitioning)
+    filt = None
+    if sensors is not None:
+        filt = ds.field('SensorCode').isin([str(s) for s in sensors])
+    if start is not None:
+        f = ds.field('DTime') >= pd.Timestamp(start)
+        filt = f if filt is None else filt & f
+    if end is not None:
+        f = ds.field('DTime') <= pd.Timestamp(end)
+        filt = f if filt is None else filt & f
+    df = dataset.to_table(columns=ts_fields, filter=filt).to_pandas()
+    return typed(df)
@@ -0,0 +1,259 @@
+# Batch time-lagged correlation of every sensor against a stress
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import GWLs_resample as gwr
+import GWLs_store as gws
+
+# default lag search per frequency, (lag_range, lag_steps) as on the Lag Times page
+lag_defaults = {'W': (48, 1), 'D': (182, 1), 'M': (11, 1)}
+# highest AR order tried when pre-whitening
+max_ar_order = 12
+
+
+def xcorr(a, B, n_fft):
+    """c[:, L] = sum_t a[t]*B[:, t-L] for every row of B, via FFT."""
+    return np.fft.irfft(np.fft.rfft(a, n_fft)[None, :]*np.conj(np.fft.rfft(B, n_fft, axis=1)), n_fft, axis=1)
+
+
+def lagged_corr(x, Y, lags):
+    """
+    Pearson R between x[t] and Y[:, t-L] for every row of Y and every lag L,
+    using only the pairs where both are observed (NaNs are gaps).
+
+    All six sums that Pearson needs at every lag are FFT cross-correlations of
+    the masked series, so the cost is one FFT pass per sum rather than one
+    correlation per lag. Returns R and the number of pairs N, each (rows, lags).
+    """
+    x = np.asarray(x, dtype='float64')
+    Y = np.atleast_2d(np.asarray(Y, dtype='float64'))
+    T = len(x)
+    n_fft = 1 << int(np.ceil(np.log2(2*T)))
+
+    # centre on the overall means so the sums don't cancel catastrophically
+    mx = np.isfinite(x)
+    MY = np.isfinite(Y)
+    xc = np.where(mx, x-np.nanmean(x), 0)
+    Yc = np.where(MY, Y-np.nanmean(Y, axis=1, keepdims=True), 0)
+    mx = mx.astype('float64')
+    MY = MY.astype('float64')
+
+    lags = np.asarray(lags)
+    n = xcorr(mx, MY, n_fft)[:, lags]
+    Sx = xcorr(xc, MY, n_fft)[:, lags]
+    Sxx = xcorr(xc**2, MY, n_fft)[:, lags]
+    Sy = xcorr(mx, Yc, n_fft)[:, lags]
+    Syy = xcorr(mx, Yc**2, n_fft)[:, lags]
+    Sxy = xcorr(xc, Yc, n_fft)[:, lags]
+
+    n = np.rint(n)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cov = n*Sxy-Sx*Sy
+        var = (n*Sxx-Sx**2)*(n*Syy-Sy**2)
+        R = np.where((n > 2) & (var > 0), cov/np.sqrt(np.clip(var, 0, None)), np.nan)
+    return np.clip(R, -1, 1), n.astype(int)
+
+
+def fisher_ci(R, N, z=1.96):
+    """Confidence interval of R from the Fisher transform with N pairs."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        zr = np.arctanh(np.clip(R, -0.999999, 0.999999))
+        se = 1/np.sqrt(np.where(N > 3, N-3, np.nan))
+    return np.tanh(zr-z*se), np.tanh(zr+z*se)
+
+
+def cumdep(df_stress_rs, s_val):
+    """Cumulative departure from the mean of a resampled stress."""
+    return (df_stress_rs[s_val]-df_stress_rs[s_val].mean()).cumsum()
+
+
+def stress_series(df_stresses, stress_id, freq, s_id='StressID', dtime='DTime', s_val='Value'):
+    """Resampled cumulative departure of one stress, indexed by time bin."""
+    df_s = df_stresses.loc[df_stresses[s_id]==stress_id, [s_id, dtime, s_val]]
+    df_s_rs = gwr.resample_all(df_s, s_id, dtime, s_val, freq, 'sum')
+    return pd.Series(cumdep(df_s_rs, s_val).values, index=df_s_rs[dtime]).dropna()
+
+
+def sensor_matrix(store, val, freq, index):
+    """Median-resampled sensors as rows on the given time bins, interior gaps interpolated."""
+    df_rs = gwr.cache.resample(store, None, val, freq, 'median')
+    df_m = df_rs.pivot(index=store.scode, columns=store.dtime, values=val)
+    df_m = df_m.interpolate(axis=1, limit_area='inside')
+    return df_m.reindex(columns=index)
+
+
+def batch_time_lag(store, df_stresses, stress_id, freq, lag_range=None, lag_steps=None, val='WL'):
+    """
+    Lagged correlation of every sensor against the cumulative departure of a
+    stress, as gwl.time_lagged_xy does for one sensor, in one vectorised pass.
+
+    Returns a long frame of [SensorCode, Lag (freq), R, CI_L, CI_U, N] and a
+    frame of each sensor's optimal lag and R.
+    """
+    if lag_range is None:
+        lag_range, lag_steps = lag_defaults[freq]
+    lags = np.arange(0, lag_range+1, lag_steps)
+
+    x = stress_series(df_stresses, stress_id, freq)
+    df_m = sensor_matrix(store, val, freq, x.index)
+    R, N = lagged_corr(x.values, df_m.to_numpy(), lags)
+    CI_L, CI_U = fisher_ci(R, N)
+
+    lag_col = f'Lag ({freq})'
+    df_lags = pd.DataFrame({store.scode: np.repeat(df_m.index.values, len(lags)),
+                            lag_col: np.tile(lags, len(df_m)),
+                            'R': R.ravel(),
+                            'CI_L': CI_L.ravel(),
+                            'CI_U': CI_U.ravel(),
+                            'N': N.ravel()})
+
+    # optimal lag is the lag of maximum R
+    has_r = np.isfinite(R).any(axis=1)
+    best = np.argmax(np.where(np.isfinite(R), R, -np.inf), axis=1)
+    rows = np.arange(len(R))
+    df_opt = pd.DataFrame({store.scode: df_m.index.values,
+                           'OptimalLag': np.where(has_r, lags[best], np.nan),
+                           'OptimalR': np.where(has_r, R[rows, best], np.nan),
+                           'N': N[rows, best]})
+    return df_lags, df_opt
+
+
+def cached_time_lag(store, df_stresses, stress_id, freq, lag_range=None, lag_steps=None, val='WL', stress_handle=None):
+    """
+    batch_time_lag cached on disk by time-series and stress hashes, stress,
+    frequency and lags. stress_handle is the published stress frame's handle,
+    which is already its hash, so pages don't rehash the stresses every rerun.
+    """
+    if lag_range is None:
+        lag_range, lag_steps = lag_defaults[freq]
+    stress_hash = stress_handle or gws.fingerprint(df_stresses)
+    path = os.path.join(gws.cache_dir, f'lags_{store.fingerprint}_{stress_hash}_{stress_id}_{val}_{freq}_{lag_range}_{lag_steps}.pkl')
+    return gws.cached(path, lambda: batch_time_lag(store, df_stresses, stress_id, freq, lag_range, lag_steps, val))
+
+
+def ar_fit(x, max_order=max_ar_order):
+    """AR coefficients of a series by least squares, with the order from 1 to max_order chosen by AIC."""
+    x = np.asarray(x, dtype='float64')
+    x = x[np.isfinite(x)]-np.nanmean(x)
+    m = min(max_order, len(x)//4)
+    best, best_aic = np.zeros(0), np.inf
+    for p in range(1, m+1):
+        # design of the p previous values, fitted on the same rows for every order
+        X = np.column_stack([x[m-k:len(x)-k] for k in range(1, p+1)])
+        y = x[m:]
+        coefs = np.linalg.lstsq(X, y, rcond=None)[0]
+        rss = np.sum((y-X@coefs)**2)
+        aic = len(y)*np.log(rss/len(y))+2*p if rss > 0 else -np.inf
+        if aic < best_aic:
+            best, best_aic = coefs, aic
+    return best
+
+
+def ar_filter(x, coefs):
+    """Residuals x[t] - sum_k coefs[k]*x[t-k-1] of the demeaned series, NaN for the first len(coefs) steps."""
+    x = np.asarray(x, dtype='float64')
+    x = x-np.nanmean(x)
+    e = x.copy()
+    for k, a in enumerate(coefs):
+        e[k+1:] -= a*x[:len(x)-k-1]
+    e[:len(coefs)] = np.nan
+    return e
+
+
+def prewhiten(x, y, max_order=max_ar_order):
+    """
+    Box-Jenkins pre-whitening: fit an AR model to the stress x and pass both
+    series through the same filter, so their cross-correlation is not
+    inflated by the autocorrelation of the input.
+    """
+    coefs = ar_fit(x, max_order)
+    return ar_filter(x, coefs), ar_filter(y, coefs)
+
+
+def pair_corr(A, B):
+    """Pearson R along the last axis of paired arrays."""
+    A = A-A.mean(axis=-1, keepdims=True)
+    B = B-B.mean(axis=-1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.sum(A*B, axis=-1)/np.sqrt(np.sum(A**2, axis=-1)*np.sum(B**2, axis=-1))
+
+
+def block_bootstrap_corr(a, b, n_boot, block, rng):
+    """
+    Moving-block bootstrap replicates of Pearson R between paired series a
+    and b. Every replicate joins ceil(n/block) random blocks, cut to n pairs.
+    R only needs five sums, and each block sum is a difference of prefix
+    sums, so a replicate costs one gather per block instead of one per pair.
+    """
+    n = len(a)
+    a, b = a-a.mean(), b-b.mean()
+    C = np.vstack([np.zeros(5), np.cumsum(np.column_stack([a, b, a*a, b*b, a*b]), axis=0)])
+    k = -(-n//block)
+    last = n-(k-1)*block
+    starts = rng.integers(0, n-block+1, size=(n_boot, k))
+    # sums of every full block once, then gathered per replicate
+    D = (C[block:]-C[:-block]).T.copy()
+    S = np.stack([d[starts[:, :-1]].sum(axis=1) for d in D], axis=1)
+    S += C[starts[:, -1]+last]-C[starts[:, -1]]
+    Sa, Sb, Saa, Sbb, Sab = S.T
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (n*Sab-Sa*Sb)/np.sqrt((n*Saa-Sa**2)*(n*Sbb-Sb**2))
+
+
+def bootstrap_lags(x, y, lags, seeds, n_boot, block, alpha):
+    """
+    R of x[t] against y[t-L] for each lag L with a moving-block bootstrap
+    percentile interval. Returns rows of [R, CI_L, CI_U, N].
+    """
+    out = np.full((len(lags), 4), np.nan)
+    for i, (L, seed) in enumerate(zip(lags, seeds)):
+        a, b = x[L:], y[:len(y)-L]
+        ok = np.isfinite(a) & np.isfinite(b)
+        a, b = a[ok], b[ok]
+        out[i, 3] = len(a)
+        if len(a) <= 3:
+            continue
+        reps = block_bootstrap_corr(a, b, n_boot, min(block, len(a)), np.random.default_rng(seed))
+        out[i, 0] = pair_corr(a, b)
+        out[i, 1:3] = np.nanpercentile(reps, [100*alpha/2, 100*(1-alpha/2)])
+    return out
+
+
+def prewhitened_time_lag(df, x_col, y_col, lag_range, lag_steps, freq, n_boot=2000, block=None,
+                         alpha=0.05, max_order=max_ar_order, n_jobs=None, seed=0):
+    """
+    Lagged correlation of y_col against x_col as gwl.time_lagged_xy gives,
+    but on pre-whitened series with block bootstrap confidence intervals.
+    Lags are shared over a process pool. Each lag has its own seed, so the
+    result doesn't depend on n_jobs.
+
+    Returns df_timelag [Lag (freq), R, CI_L, CI_U, N], optimal_r and optimal_lag.
+    """
+    x, y = prewhiten(df[x_col].to_numpy(dtype='float64'), df[y_col].to_numpy(dtype='float64'), max_order)
+    lags = np.arange(0, lag_range+1, lag_steps)
+    # block length of order n^(1/3) for the residual dependence left after whitening
+    block = block or max(2, int(np.ceil(np.isfinite(x).sum()**(1/3))))
+    seeds = np.random.SeedSequence(seed).spawn(len(lags))
+
+    n_jobs = n_jobs or os.cpu_count() or 1
+    if n_jobs == 1:
+        out = bootstrap_lags(x, y, lags, seeds, n_boot, block, alpha)
+    else:
+        chunks = [c for c in np.array_split(np.arange(len(lags)), n_jobs) if len(c) > 0]
+        with ProcessPoolExecutor(n_jobs) as ex:
+            futures = [ex.submit(bootstrap_lags, x, y, lags[c], [seeds[i] for i in c], n_boot, block, alpha) for c in chunks]
+            out = np.vstack([f.result() for f in futures])
+
+    df_timelag = pd.DataFrame({f'Lag ({freq})': lags, 'R': out[:, 0], 'CI_L': out[:, 1], 'CI_U': out[:, 2],
+                               'N': out[:, 3].astype(int)})
+    if not np.isfinite(out[:, 0]).any():
+        return df_timelag, np.nan, 0
+    best = int(np.nanargmax(out[:, 0]))
+    return df_timelag, out[best, 0], int(lags[best])
+
+
+def cached_prewhitened_time_lag(df, x_col, y_col, lag_range, lag_steps, freq, n_boot=2000, n_jobs=None):
+    """prewhitened_time_lag cached on disk by the hash of the two series, lags and replicates."""
+    path = os.path.join(gws.cache_dir, f'pw_lags_{gws.fingerprint(df[[x_col, y_col]])}_{freq}_{lag_range}_{lag_steps}_{n_boot}.pkl')
+    return gws.cached(path, lambda: prewhitened_time_lag(df, x_col, y_col, lag_range, lag_steps, freq, n_boot, n_jobs=n_jobs))
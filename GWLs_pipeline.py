@@ -0,0 +1,166 @@
+# Headless batch pipeline: runs the app's analysis stages without Streamlit
+#
+#   python GWLs_pipeline.py df_ts.csv df_xy.csv --stresses df_stresses.csv --out results
+#
+import argparse
+import os
+import time
+import pandas as pd
+import GWLs_store as gws
+import GWLs_ingest as gwi
+import GWLs_resample as gwr
+import GWLs_signatures as gwsig
+import GWLs_cluster as gwcl
+import GWLs_lags as gwlag
+import GWLs_corr as gwc
+import GWLs_decompose as gwd
+
+# set variables
+scode = 'SensorCode'
+dtime = 'DTime'
+val = 'WL'
+
+# stages that only need the loaded data, run one after another
+stages = ['resample', 'signatures', 'clusters', 'corr', 'lags', 'sd_var']
+# stages that also need the stresses file
+stress_stages = ['corr', 'lags']
+
+
+def run_resample(ts_store, args):
+    return gwr.cache.resample(ts_store, None, val, args.freq, args.stat, args.mode)
+
+
+def run_signatures(ts_store, args):
+    return gwsig.cached_signatures(ts_store, args.freq, val, n_jobs=args.jobs)
+
+
+def run_clusters(ts_store, args):
+    start_dtime, end_dtime = args.start or ts_store.df[dtime].min(), args.end or ts_store.df[dtime].max()
+    result = gwcl.get_result(ts_store, val, args.mode, pd.Timestamp(start_dtime), pd.Timestamp(end_dtime),
+                             args.freq, args.stat, n_jobs=args.jobs)
+    return pd.DataFrame({scode: result.df_m.index, 'Group': result.labels(args.n_clusters)})
+
+
+def run_corr(ts_store, args, df_stresses):
+    return gwc.cached_corr_matrices(ts_store, df_stresses, args.freq, args.stress_stat, val)
+
+
+def run_lags(ts_store, args, df_stresses):
+    return gwlag.cached_time_lag(ts_store, df_stresses, 'Rain', args.freq, val=val)
+
+
+def run_sd_var(ts_store, args):
+    return gwd.cached_sd_var(ts_store, val, 'W', 'MA', n_jobs=args.jobs)
+
+
+def leapfrog_table(df_xy, df_ts, start_dtime=None, end_dtime=None, df_groups=None, df_signatures=None,
+                   df_sd_var=None, df_lag_opt=None, lag_freq=None):
+    """Join locations, groups, summary statistics and any available results one row per sensor, as the Leapfrog Export page does."""
+    df_ts = df_ts.loc[(df_ts[dtime]>=(start_dtime or df_ts[dtime].min())) & (df_ts[dtime]<=(end_dtime or df_ts[dtime].max()))]
+    df_ts_stats = df_ts[[scode, val]].dropna(subset=val).groupby(scode, observed=True).describe()
+    df_ts_stats.columns = [f'{val}_Count', f'{val}_Mean', f'{val}_Std', f'{val}_Min', f'{val}_25%', f'{val}_Median', f'{val}_75%', f'{val}_Max']
+
+    df_xy_gw = df_xy.loc[df_xy[scode].isin(df_ts[scode].unique())].set_index(scode).drop(columns='Unnamed: 0', errors='ignore')
+    list_dfs = [df_xy_gw]
+    if df_groups is not None:
+        list_dfs.append(df_groups.set_index(scode))
+    list_dfs.append(df_ts_stats)
+    if df_signatures is not None:
+        list_dfs.append(df_signatures.transpose().rename_axis(scode))
+    if df_sd_var is not None:
+        list_dfs.append(df_sd_var.set_index(scode))
+    if df_lag_opt is not None:
+        df_lag_lf = df_lag_opt.set_index(scode)[['OptimalLag', 'OptimalR']]
+        df_lag_lf.columns = [f'RainLag_{lag_freq}', f'RainLagR_{lag_freq}']
+        list_dfs.append(df_lag_lf)
+    return pd.concat(list_dfs, axis=1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the groundwater level analysis without the app.')
+    parser.add_argument('ts', help="time-series file with ['DTime', 'SensorCode', 'WL', 'SL'] (CSV, Parquet or Arrow)")
+    parser.add_argument('xy', help="sensor locations CSV with ['SensorCode', 'Lat', 'Lon']")
+    parser.add_argument('--stresses', help="stress CSV with ['StressID', 'DTime', 'Value', 'Units'], needed for corr and lags")
+    parser.add_argument('--out', default='output', help='output folder')
+    parser.add_argument('--stages', nargs='+', choices=stages, default=stages)
+    parser.add_argument('--freq', default='W', choices=['W', 'D', 'M'])
+    parser.add_argument('--mode', default='Raw', choices=['Raw', 'Normalised', 'Standardised'], help='resample and clustering datatype')
+    parser.add_argument('--stat', default='median', choices=['median', 'mean', 'min', 'max'], help='resample and clustering statistic')
+    parser.add_argument('--stress-stat', default='mean', choices=gwc.stress_stats, help='stress statistic for corr')
+    parser.add_argument('--n-clusters', type=int, default=5)
+    parser.add_argument('--start', help='start date for clustering and statistics, YYYY-MM-DD')
+    parser.add_argument('--end', help='end date for clustering and statistics, YYYY-MM-DD')
+    parser.add_argument('--jobs', type=int, default=None, help='worker processes per stage')
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.out, exist_ok=True)
+    timings = {}
+
+    ######################## LOAD #########################
+
+    t0 = time.perf_counter()
+    with open(args.ts, 'rb') as f:
+        ts_store = gws.SensorStore(gwi.read_ts(f), scode, dtime)
+    df_xy = pd.read_csv(args.xy)
+    df_stresses = gwi.read_stresses(args.stresses) if args.stresses else None
+    timings['load'] = time.perf_counter()-t0
+
+    ######################## STAGES #########################
+
+    def timed(name, func, *a):
+        t = time.perf_counter()
+        result = func(*a)
+        timings[name] = time.perf_counter()-t
+        return result
+
+    jobs = {'resample': (run_resample, ts_store, args),
+            'signatures': (run_signatures, ts_store, args),
+            'clusters': (run_clusters, ts_store, args),
+            'corr': (run_corr, ts_store, args, df_stresses),
+            'lags': (run_lags, ts_store, args, df_stresses),
+            'sd_var': (run_sd_var, ts_store, args)}
+    skipped = [s for s in args.stages if s in stress_stages and df_stresses is None]
+    if len(skipped) > 0:
+        print(f"No stresses file given, skipping {', '.join(skipped)}")
+    todo = [s for s in args.stages if s not in skipped]
+
+    # each stage spreads its own work over a process pool of --jobs workers, so
+    # running stages one at a time keeps the machine at one pool's worth of workers
+    t0 = time.perf_counter()
+    results = {s: timed(s, *jobs[s]) for s in todo}
+    timings['stages (total)'] = time.perf_counter()-t0
+
+    ######################## EXPORTS #########################
+
+    t0 = time.perf_counter()
+    df_lag_opt = None
+    if 'resample' in results:
+        results['resample'].to_csv(os.path.join(args.out, f'df_ts_rs_{args.freq}_{args.stat}_{args.mode}.csv'), index=False)
+    if 'signatures' in results:
+        results['signatures'].to_csv(os.path.join(args.out, 'GWL_Signatures.csv'), index=True)
+    if 'clusters' in results:
+        results['clusters'].to_csv(os.path.join(args.out, f'df_groups_{args.freq}_{args.stat}_{args.mode}.csv'), index=False)
+    if 'corr' in results:
+        results['corr'].to_csv(os.path.join(args.out, f'df_corr_{args.freq}_{args.stress_stat}.csv'), index=False)
+    if 'lags' in results:
+        df_lags_all, df_lag_opt = results['lags']
+        df_lag_opt.to_csv(os.path.join(args.out, f'df_lag_opt_{args.freq}.csv'), index=False)
+        df_lags_all.to_csv(os.path.join(args.out, f'df_lags_all_{args.freq}.csv'), index=False)
+    if 'sd_var' in results:
+        results['sd_var'].to_csv(os.path.join(args.out, 'df_sd_var.csv'), index=False)
+
+    df_lf = leapfrog_table(df_xy, ts_store.df,
+                           pd.Timestamp(args.start) if args.start else None,
+                           pd.Timestamp(args.end) if args.end else None,
+                           results.get('clusters'), results.get('signatures'), results.get('sd_var'),
+                           df_lag_opt, args.freq)
+    df_lf.to_csv(os.path.join(args.out, 'GWLs_LeapfrogExport.csv'), index=True)
+    timings['export'] = time.perf_counter()-t0
+
+    df_timings = pd.Series(timings, name='Seconds').round(2).rename_axis('Stage').reset_index()
+    df_timings.to_csv(os.path.join(args.out, 'pipeline_timings.csv'), index=False)
+    print(df_timings.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
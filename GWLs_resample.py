@@ -0,0 +1,247 @@
+# Grouped resampling engine for all sensors in a time-series table
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import threading
+import warnings
+import numpy as np
+import pandas as pd
+
+
+def scale(df, scode, val, mode):
+    """Normalise or standardise val per sensor using grouped transforms."""
+    if mode == 'Normalised':
+        grp = df.groupby(scode, observed=True, sort=False)[val]
+        vmin = grp.transform('min')
+        vmax = grp.transform('max')
+        return (df[val]-vmin)/(vmax-vmin)
+    elif mode == 'Standardised':
+        grp = df.groupby(scode, observed=True, sort=False)[val]
+        return (df[val]-grp.transform('mean'))/grp.transform('std')
+    else:
+        return df[val]
+
+
+def normalise_matrix(df, axis=1, robust=False, q=(5, 95)):
+    """
+    Min-max scale a matrix along axis (1 scales each row across columns) with
+    the extrema computed once and broadcast. Constant rows scale to 0 rather
+    than inf/NaN. With robust=True the q percentiles replace min and max and
+    the result is clipped to [0, 1].
+    """
+    x = df.to_numpy(dtype='float64')
+    with warnings.catch_warnings():
+        # all-NaN rows stay NaN
+        warnings.simplefilter('ignore', RuntimeWarning)
+        if robust:
+            lo, hi = np.nanpercentile(x, q, axis=axis, keepdims=True)
+        else:
+            lo = np.nanmin(x, axis=axis, keepdims=True)
+            hi = np.nanmax(x, axis=axis, keepdims=True)
+    span = hi-lo
+    x = (x-lo)/np.where(span > 0, span, 1)
+    if robust:
+        x = np.clip(x, 0, 1)
+    return pd.DataFrame(x, index=df.index, columns=df.columns)
+
+
+def fill_bins(df_rs, scode, dtime, val, freq, stat=None):
+    """
+    Reindex a grouped resample so every sensor has all bins between its first
+    and last, as gwl.resample does. The added bins are NaN, or 0 when stat is
+    sum or count.
+    """
+    if len(df_rs) == 0:
+        return df_rs
+    bounds = df_rs.groupby(scode, observed=True, sort=False)[dtime].agg(['min', 'max'])
+    list_bins = [pd.date_range(t0, t1, freq=freq) for t0, t1 in zip(bounds['min'], bounds['max'])]
+    n_bins = [len(b) for b in list_bins]
+    index = pd.MultiIndex.from_arrays([np.repeat(bounds.index.values, n_bins),
+                                       np.concatenate([b.values for b in list_bins])],
+                                      names=[scode, dtime])
+    df_rs = df_rs.set_index([scode, dtime]).reindex(index).reset_index()
+    if stat in ['sum', 'count']:
+        # empty bins sum and count to zero in a time resample
+        df_rs[val] = df_rs[val].fillna(0)
+    return df_rs
+
+
+def resample_all(df, scode, dtime, val, freq, stat, mode='Raw'):
+    """
+    Resample every sensor in df in one grouped pass.
+
+    Returns the same long frame as looping gwl.resample over each sensor and
+    concatenating: columns [scode, dtime, val], sensors in order of first
+    appearance, empty bins within each sensor's record kept as NaN (or 0 for
+    sum and count, as a time resample gives).
+    """
+    # scale per sensor before binning
+    df_ = df[[scode, dtime]].copy()
+    df_[val] = scale(df, scode, val, mode)
+
+    # single groupby keyed on sensor and time bin
+    df_rs = (df_.groupby([scode, pd.Grouper(key=dtime, freq=freq)], observed=True)[val]
+                .agg(stat)
+                .reset_index())
+    df_rs = fill_bins(df_rs, scode, dtime, val, freq, stat)
+
+    # restore the sensor order of the original table, as a list since a
+    # Categorical would bring back its sorted category order
+    order = list(pd.unique(df[scode]))
+    df_rs['_order'] = pd.Categorical(df_rs[scode], categories=order).codes
+    df_rs = df_rs.sort_values(['_order', dtime], kind='stable').drop(columns='_order')
+    df_rs[scode] = df_rs[scode].astype(df[scode].dtype)
+    return df_rs.reset_index(drop=True)
+
+
+def map_sensor_blocks(func, df_rs, scode, args=(), n_jobs=None, progress=None):
+    """
+    Run func(block, *args) over a process pool, where each block is a
+    contiguous run of whole sensors from a resampled frame. Returns the
+    results in block order. progress, if given, is called with the fraction
+    of blocks done.
+    """
+    # sensors are contiguous in the resampled frame so blocks are row slices
+    codes, sensors = pd.factorize(df_rs[scode])
+    n_jobs = n_jobs or os.cpu_count() or 1
+    n_chunks = max(1, min(len(sensors), n_jobs*4))
+    chunks = [c for c in np.array_split(np.arange(len(sensors)), n_chunks) if len(c) > 0]
+    bounds = np.searchsorted(codes, [c[0] for c in chunks] + [len(sensors)])
+
+    results = {}
+    with ProcessPoolExecutor(n_jobs) as ex:
+        futures = {ex.submit(func, df_rs.iloc[bounds[i]:bounds[i+1]], *args): i for i in range(len(chunks))}
+        for n, fut in enumerate(as_completed(futures)):
+            results[futures[fut]] = fut.result()
+            if progress is not None:
+                progress((n+1)/len(chunks))
+    return [results[i] for i in range(len(chunks))]
+
+
+def patch_resample(df_rs, store, dirty, val, freq, stat, mode='Raw'):
+    """
+    Update an all-sensor resample of an older version of store after an
+    append. Clean sensors are kept as they are. Dirty sensors keep their bins
+    before the one holding their first change and resample only from there,
+    or are resampled in full when scaled, since scaling uses the whole record.
+    """
+    scode, dtime = store.scode, store.dtime
+    offset = pd.tseries.frequencies.to_offset(freq)
+    parts = dict(tuple(df_rs.groupby(scode, observed=True, sort=False)))
+    for s, t in dirty.items():
+        df_s = store.get(s, [scode, dtime, val])
+        if mode != 'Raw':
+            parts[s] = resample_all(df_s, scode, dtime, val, freq, stat, mode)
+            continue
+        # label of the first dirty bin, and raw rows from a margin before it so that bin is complete
+        cutoff = pd.Series([0], index=[t]).resample(freq).sum().index[0]
+        df_new = resample_all(df_s.loc[df_s[dtime] > cutoff-2*offset], scode, dtime, val, freq, stat)
+        df_old = parts.get(s, df_new.iloc[0:0])
+        df_s_rs = pd.concat([df_old.loc[df_old[dtime] < cutoff], df_new.loc[df_new[dtime] >= cutoff]])
+        parts[s] = fill_bins(df_s_rs, scode, dtime, val, freq, stat)
+    df_rs = pd.concat([parts[s] for s in store.sensors if s in parts], ignore_index=True)
+    df_rs[scode] = df_rs[scode].astype(store.df[scode].dtype)
+    return df_rs
+
+
+class FrameCache:
+    """Memory-bounded, thread-safe LRU cache of frames."""
+
+    def __init__(self, max_bytes=512*2**20):
+        self.max_bytes = max_bytes
+        self.n_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        # streamlit sessions run in threads of one process
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, key):
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return self._items[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, df):
+        size = int(df.memory_usage(index=True).sum())
+        with self._lock:
+            if key in self._items:
+                self.n_bytes -= int(self._items.pop(key).memory_usage(index=True).sum())
+            self._items[key] = df
+            self.n_bytes += size
+            # evict least recently used until under budget, always keeping the newest
+            while self.n_bytes > self.max_bytes and len(self._items) > 1:
+                _, old = self._items.popitem(last=False)
+                self.n_bytes -= int(old.memory_usage(index=True).sum())
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.n_bytes = 0
+
+    def stats(self):
+        return {'Hits': self.hits, 'Misses': self.misses, 'Entries': len(self._items), 'MB': round(self.n_bytes/2**20, 1)}
+
+    def carry(self, old_fingerprint, store, dirty):
+        """
+        After an append, re-key the entries of clean sensors from the old
+        dataset under the new one. Keys must start (dataset hash, series id, ...).
+        """
+        with self._lock:
+            old = [(k, v) for k, v in self._items.items() if k[0] == old_fingerprint]
+        for key, df in old:
+            if key[1] is not None and key[1] not in dirty:
+                self.put((store.fingerprint,)+key[1:], df)
+        return old
+
+
+class ResampleCache(FrameCache):
+    """
+    LRU cache of resampled frames keyed on (dataset fingerprint, sensor, val,
+    freq, stat, mode, min_head). Sensor None means all sensors.
+    """
+
+    def resample(self, store, sensor, val, freq, stat, mode='Raw', min_head=None):
+        """
+        Resample one sensor (or all sensors if None) from a SensorStore, reusing
+        cached results. With min_head, readings less than min_head above the
+        sensor level (SL) are dropped first, as dry sensors read near their level.
+        """
+        cols = [store.scode, store.dtime, val]+([] if min_head is None else ['SL'])
+        if freq == 'Raw':
+            df = store.df[cols] if sensor is None else store.get(sensor, cols)
+            if min_head is not None:
+                df = df.loc[df['SL']+min_head<df[val]]
+            df = df[[store.scode, store.dtime, val]].copy()
+            df[val] = scale(df, store.scode, val, mode)
+            return df
+        key = (store.fingerprint, sensor, val, freq, stat, mode, min_head)
+        df_rs = self.get(key)
+        if df_rs is None:
+            df = store.df if sensor is None else store.get(sensor, cols)
+            if min_head is not None:
+                df = df.loc[df['SL']+min_head<df[val]]
+            df_rs = resample_all(df, store.scode, store.dtime, val, freq, stat, mode)
+            self.put(key, df_rs)
+        # callers modify their frame in place, so hand out a copy
+        return df_rs.copy()
+
+    def carry(self, old_fingerprint, store, dirty):
+        """As FrameCache.carry, also patching all-sensor entries with only the dirty sensors and bins resampled."""
+        old = super().carry(old_fingerprint, store, dirty)
+        for key, df_rs in old:
+            _, sensor, val, freq, stat, mode, min_head = key
+            # patching doesn't drop dry readings, those entries are recomputed on their next use
+            if sensor is None and min_head is None:
+                self.put((store.fingerprint,)+key[1:], patch_resample(df_rs, store, dirty, val, freq, stat, mode))
+        return old
+
+
+# process-wide cache shared by all pages and sessions
+cache = ResampleCache()
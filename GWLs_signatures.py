@@ -0,0 +1,52 @@
+# Parallel and disk-cached groundwater signatures
+import os
+import pandas as pd
+import GWLs_v01 as gwl
+import GWLs_resample as gwr
+import GWLs_store as gws
+
+
+def signatures_chunk(df, scode, dtime, val):
+    return gwl.get_signatures(df=df, sensors=list(pd.unique(df[scode])), scode=scode, dtime=dtime, val=val)
+
+
+def get_signatures(df_rs, scode, dtime, val, n_jobs=None, progress=None):
+    """
+    Compute gwl.get_signatures over a process pool, splitting the resampled
+    frame into contiguous blocks of sensors. Returns the same frame as one
+    serial call (signatures as rows, sensors as columns).
+    """
+    results = gwr.map_sensor_blocks(signatures_chunk, df_rs, scode, (scode, dtime, val), n_jobs, progress)
+    return pd.concat(results, axis=1)
+
+
+def cached_signatures(store, freq, val='WL', n_jobs=None, progress=None):
+    """Signatures for every sensor in a SensorStore, cached on disk by dataset hash and frequency."""
+    def compute():
+        df_rs = gwr.cache.resample(store, None, val, freq, 'median')
+        return get_signatures(df_rs, store.scode, store.dtime, val, n_jobs, progress)
+    path = os.path.join(gws.cache_dir, f'signatures_{store.fingerprint}_{val}_{freq}.pkl')
+    return gws.cached(path, compute)
+
+
+def update_signatures(old_fingerprint, store, dirty, n_jobs=None):
+    """
+    After an append, carry every disk-cached signature table of the old
+    dataset to the new one, recomputing only the dirty sensors' columns.
+    """
+    prefix = f'signatures_{old_fingerprint}_'
+    if not os.path.isdir(gws.cache_dir):
+        return
+    for name in os.listdir(gws.cache_dir):
+        if not (name.startswith(prefix) and name.endswith('.pkl')):
+            continue
+        val, freq = name[len(prefix):-len('.pkl')].split('_')
+        df_old = pd.read_pickle(os.path.join(gws.cache_dir, name))
+
+        def compute():
+            sensors = [s for s in store.sensors if s in dirty]
+            df_rs = pd.concat([gwr.cache.resample(store, s, val, freq, 'median') for s in sensors])
+            df_dirty = get_signatures(df_rs, store.scode, store.dtime, val, n_jobs)
+            df_signatures = pd.concat([df_old.drop(columns=sensors, errors='ignore'), df_dirty], axis=1)
+            return df_signatures[[s for s in store.sensors if s in df_signatures.columns]]
+        gws.cached(os.path.join(gws.cache_dir, f'signatures_{store.fingerprint}_{val}_{freq}.pkl'), compute)
@@ -0,0 +1,95 @@
+# Spatial index over sensor locations for map selections
+from collections import OrderedDict
+import threading
+import numpy as np
+from scipy.spatial import cKDTree
+import GWLs_store as gws
+
+# mean earth radius in metres, for the local projection used by radius queries
+earth_radius = 6371008.8
+
+
+class SensorIndex:
+    """
+    Lat/Lon index of the sensors that have time-series data. Rows are sorted
+    by latitude so boxes are a binary search plus a longitude mask, polygons
+    are tested only inside their bounding box, and radius queries use a
+    KD-tree on a local equirectangular projection in metres. Queries return
+    the df_xy index labels of the selected rows.
+    """
+
+    def __init__(self, df_xy, sensors, scode='SensorCode'):
+        df = df_xy.loc[df_xy[scode].isin(sensors)].sort_values(by='Lat', kind='stable')
+        self.labels = df.index.values
+        self.lat = df['Lat'].to_numpy(dtype='float64')
+        self.lon = df['Lon'].to_numpy(dtype='float64')
+        self.lat0 = np.radians(self.lat.mean()) if len(df) > 0 else 0.0
+        self.tree = cKDTree(self.project(self.lat, self.lon)) if len(df) > 0 else None
+
+    def __len__(self):
+        return len(self.labels)
+
+    def project(self, lat, lon):
+        lat, lon = np.radians(lat), np.radians(lon)
+        return np.column_stack([earth_radius*lon*np.cos(self.lat0), earth_radius*lat])
+
+    def box_rows(self, lat1, lon1, lat2, lon2):
+        lat1, lat2 = min(lat1, lat2), max(lat1, lat2)
+        lon1, lon2 = min(lon1, lon2), max(lon1, lon2)
+        lo, hi = np.searchsorted(self.lat, lat1, side='left'), np.searchsorted(self.lat, lat2, side='right')
+        rows = np.arange(lo, hi)
+        return rows[(self.lon[rows] >= lon1) & (self.lon[rows] <= lon2)]
+
+    def box(self, lat1, lon1, lat2, lon2):
+        """Sensors inside a Lat/Lon rectangle."""
+        return self.labels[self.box_rows(lat1, lon1, lat2, lon2)]
+
+    def polygon(self, coords):
+        """Sensors inside a polygon given as GeoJSON [lon, lat] vertices, by ray casting within its bounding box."""
+        poly = np.asarray(coords, dtype='float64')
+        rows = self.box_rows(poly[:, 1].min(), poly[:, 0].min(), poly[:, 1].max(), poly[:, 0].max())
+        x, y = self.lon[rows][:, None], self.lat[rows][:, None]
+        x1, y1 = poly[:, 0][None, :], poly[:, 1][None, :]
+        x2, y2 = np.roll(poly[:, 0], -1)[None, :], np.roll(poly[:, 1], -1)[None, :]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            crosses = ((y1 > y) != (y2 > y)) & (x < (x2-x1)*(y-y1)/(y2-y1)+x1)
+        inside = crosses.sum(axis=1) % 2 == 1
+        return self.labels[rows[inside]]
+
+    def circle(self, lat, lon, radius):
+        """Sensors within radius metres of a point."""
+        if self.tree is None:
+            return self.labels[:0]
+        rows = self.tree.query_ball_point(self.project(np.array([lat]), np.array([lon]))[0], radius)
+        return self.labels[np.sort(np.asarray(rows, dtype=int))]
+
+    def select(self, drawing):
+        """Sensors inside a Folium Draw feature: a rectangle or polygon, or a circle (a point with a radius)."""
+        geometry = drawing['geometry']
+        if geometry['type'] == 'Polygon':
+            return self.polygon(geometry['coordinates'][0])
+        elif geometry['type'] == 'Point' and 'radius' in drawing.get('properties', {}):
+            lon, lat = geometry['coordinates']
+            return self.circle(lat, lon, drawing['properties']['radius'])
+        return self.labels[:0]
+
+
+# indexes shared by all sessions, keyed on the locations and the time-series dataset
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+max_indexes = 8
+
+
+def get_index(df_xy, store):
+    """Return the SensorIndex of df_xy restricted to the sensors with data in store, building it once."""
+    key = (gws.fingerprint(df_xy[[store.scode, 'Lat', 'Lon']]), store.fingerprint)
+    with _indexes_lock:
+        if key in _indexes:
+            _indexes.move_to_end(key)
+            return _indexes[key]
+    index = SensorIndex(df_xy, store.sensors, store.scode)
+    with _indexes_lock:
+        _indexes[key] = index
+        while len(_indexes) > max_indexes:
+            _indexes.popitem(last=False)
+    return index
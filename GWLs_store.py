@@ -0,0 +1,265 @@
+# Sensor-partitioned storage of the time-series table
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import threading
+import numpy as np
+import pandas as pd
+
+# shared on-disk folder of memory-mapped datasets, one subfolder per dataset hash
+store_dir = os.path.join(tempfile.gettempdir(), 'vwp_store')
+# local folder for derived results keyed by dataset hash
+cache_dir = os.path.join(tempfile.gettempdir(), 'vwp_cache')
+
+
+class SensorStore:
+    """
+    Time-series table sorted by sensor then time, with an offsets index so
+    each sensor's rows are a contiguous block that can be sliced in O(1).
+    """
+
+    def __init__(self, df, scode='SensorCode', dtime='DTime'):
+        self.scode = scode
+        self.dtime = dtime
+
+        # rows without a sensor code can't be placed in a block
+        null = df[scode].isna()
+        self.dropped = int(null.sum())
+        if self.dropped > 0:
+            df = df.loc[~null]
+
+        # categorical sensor codes, sorted by code then time
+        codes = df[scode].astype('category')
+        codes = codes.cat.set_categories(sorted(codes.cat.categories))
+        df = df.assign(**{scode: codes})
+        order = np.lexsort((df[dtime].values, codes.cat.codes.values))
+        self.df = df.iloc[order].reset_index(drop=True)
+
+        # offsets into the sorted table, one block per sensor
+        counts = np.bincount(self.df[scode].cat.codes.values, minlength=len(codes.cat.categories))
+        self.offsets = np.concatenate([[0], np.cumsum(counts)])
+        self.sensors = list(codes.cat.categories[counts > 0])
+        self.index = {s: i for i, s in enumerate(codes.cat.categories)}
+        self.fingerprint = fingerprint(self.df)
+        self.extent = self.dtime_extent()
+
+    @classmethod
+    def load(cls, root):
+        """Open a store saved with save() as memory-mapped columns."""
+        store = cls.__new__(cls)
+        with open(os.path.join(root, 'store.json')) as f:
+            meta = json.load(f)
+        store.scode = meta['scode']
+        store.dtime = meta['dtime']
+        store.fingerprint = meta['fingerprint']
+        store.dropped = 0
+        store.df = load_frame(root)
+        store.offsets = np.load(os.path.join(root, 'offsets.npy'))
+        cats = store.df[store.scode].cat.categories
+        counts = np.diff(store.offsets)
+        store.sensors = list(cats[counts > 0])
+        store.index = {s: i for i, s in enumerate(cats)}
+        store.extent = store.dtime_extent()
+        return store
+
+    def save(self, root):
+        """Write the sorted table and offsets so other sessions can memory-map them."""
+        save_frame(self.df, root)
+        np.save(os.path.join(root, 'offsets.npy'), self.offsets)
+        with open(os.path.join(root, 'store.json'), 'w') as f:
+            json.dump({'scode': self.scode, 'dtime': self.dtime, 'fingerprint': self.fingerprint}, f)
+
+    def __len__(self):
+        return len(self.df)
+
+    def __contains__(self, sensor):
+        return sensor in self.index
+
+    def bounds(self, sensor):
+        i = self.index[sensor]
+        return self.offsets[i], self.offsets[i+1]
+
+    def dtime_extent(self, sensor=None):
+        """First and last time of one sensor, or of all sensors if None, read from the ends of the sorted blocks."""
+        t = self.df[self.dtime].values
+        if sensor is not None:
+            start, stop = self.bounds(sensor)
+            return pd.Timestamp(t[start]), pd.Timestamp(t[stop-1])
+        counts = np.diff(self.offsets)
+        starts, stops = self.offsets[:-1][counts > 0], self.offsets[1:][counts > 0]
+        if len(starts) == 0:
+            return None, None
+        return pd.Timestamp(t[starts].min()), pd.Timestamp(t[stops-1].max())
+
+    def get(self, sensor, columns=None):
+        """Return the rows of one sensor as a slice of the sorted table."""
+        start, stop = self.bounds(sensor)
+        columns = self.df.columns if columns is None else columns
+        data = {}
+        for c in columns:
+            if c == self.scode:
+                # single category so grouping on the slice only sees this sensor
+                data[c] = pd.Categorical.from_codes(np.zeros(stop-start, dtype='int8'), [sensor])
+            else:
+                data[c] = self.df[c].values[start:stop]
+        return pd.DataFrame(data, index=pd.RangeIndex(start, stop), copy=False)
+
+    def get_many(self, sensors, columns=None):
+        """Return the rows of several sensors stacked in the given order."""
+        sensors = [s for s in sensors if s in self.index]
+        columns = self.df.columns if columns is None else columns
+        rows = np.concatenate([np.arange(*self.bounds(s)) for s in sensors]) if len(sensors) > 0 else np.zeros(0, dtype=int)
+        # take the rows of each selected column, never copying whole columns, the
+        # sorted table has a RangeIndex so the row positions are its labels
+        return pd.DataFrame({c: self.df[c].values[rows] for c in columns}, index=rows)
+
+
+def append(store, df_new):
+    """
+    Merge new readings into a store, de-duplicated on (sensor, time) with the
+    new reading kept. Returns the merged store and the dirty sensors as
+    {sensor: earliest new or changed time}, so only those sensors and the time
+    bins from that point on need recomputing. An empty dict means nothing changed.
+    """
+    scode, dtime = store.scode, store.dtime
+    df_new = df_new[store.df.columns].drop_duplicates([scode, dtime], keep='last')
+    cols = [c for c in store.df.columns if c not in [scode, dtime]]
+
+    # compare each sensor's new rows with its existing block
+    dirty = {}
+    for s, df_s in df_new.groupby(scode, observed=True, sort=False):
+        if s in store:
+            # raw logger exports can repeat a time, compare against the reading the merge keeps
+            old = store.get(s, [dtime]+cols).drop_duplicates(dtime, keep='last').set_index(dtime).reindex(df_s[dtime])
+            new = df_s.set_index(dtime)[cols]
+            same = (old.values == new.values) | (pd.isna(old.values) & pd.isna(new.values))
+            changed = new.index[~same.all(axis=1)]
+        else:
+            changed = df_s[dtime]
+        if len(changed) > 0:
+            dirty[s] = changed.min()
+    if len(dirty) == 0:
+        return store, dirty
+
+    # union the sensor categories so the concat stays categorical
+    cats = store.df[scode].cat.categories.union(df_new[scode].astype('category').cat.categories)
+    df = pd.concat([store.df.assign(**{scode: store.df[scode].cat.set_categories(cats)}),
+                    df_new.assign(**{scode: df_new[scode].astype('category').cat.set_categories(cats)})],
+                   ignore_index=True)
+    df = df.drop_duplicates([scode, dtime], keep='last')
+    return SensorStore(df, scode, dtime), dirty
+
+
+def cached(path, func):
+    """Return the pickled result at path, or compute it with func() and pickle it there."""
+    if os.path.exists(path):
+        return pd.read_pickle(path)
+    result = func()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # sessions are threads of one process, so each write gets its own temporary file
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    os.close(fd)
+    try:
+        pd.to_pickle(result, tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+    return result
+
+
+def fingerprint(df):
+    """Short content hash of a frame, used to key caches of derived results."""
+    h = pd.util.hash_pandas_object(df, index=False).values
+    return hashlib.sha1(h.tobytes()).hexdigest()[:16]
+
+
+def save_frame(df, root):
+    """Save a frame as one .npy file per column, categorical and text columns as codes plus a json list of categories."""
+    os.makedirs(root, exist_ok=True)
+    meta = []
+    for i, c in enumerate(df.columns):
+        col = df[c]
+        is_object = col.dtype == object
+        if is_object:
+            col = col.astype('category')
+        if isinstance(col.dtype, pd.CategoricalDtype):
+            np.save(os.path.join(root, f'{i}.npy'), col.cat.codes.values)
+            cats = col.cat.categories
+            meta.append({'name': c, 'categories': cats.tolist(), 'object': bool(is_object)})
+        else:
+            np.save(os.path.join(root, f'{i}.npy'), col.values)
+            meta.append({'name': c})
+    with open(os.path.join(root, 'frame.json'), 'w') as f:
+        json.dump(meta, f)
+
+
+def load_frame(root):
+    """Load a frame saved with save_frame, memory-mapping each column copy-on-write."""
+    with open(os.path.join(root, 'frame.json')) as f:
+        meta = json.load(f)
+    data = {}
+    for i, m in enumerate(meta):
+        values = np.load(os.path.join(root, f'{i}.npy'), mmap_mode='c')
+        if m.get('object'):
+            # text columns are rebuilt once per process so dtypes match the upload
+            values = pd.Categorical.from_codes(values, m['categories']).astype(object)
+        elif 'categories' in m:
+            values = pd.Categorical.from_codes(values, m['categories'])
+        data[m['name']] = values
+    return pd.DataFrame(data, copy=False)
+
+
+# stores opened in this process, shared by every session
+_open_stores = {}
+_open_lock = threading.Lock()
+
+
+def publish(store):
+    """Save a store to the shared folder once per dataset and return its handle."""
+    handle = store.fingerprint
+    root = os.path.join(store_dir, handle)
+    if not os.path.exists(os.path.join(root, 'store.json')):
+        # write to a temporary folder then rename so readers never see a partial dataset
+        os.makedirs(store_dir, exist_ok=True)
+        tmp = tempfile.mkdtemp(dir=store_dir)
+        store.save(tmp)
+        try:
+            os.replace(tmp, root)
+        except OSError:
+            # another session published the same dataset first
+            shutil.rmtree(tmp, ignore_errors=True)
+    return handle
+
+
+def open_store(handle):
+    """Return the memory-mapped store for a handle, opening it once per process."""
+    with _open_lock:
+        if handle not in _open_stores:
+            _open_stores[handle] = SensorStore.load(os.path.join(store_dir, handle))
+        return _open_stores[handle]
+
+
+def publish_frame(df):
+    """Save any frame to the shared folder once per content hash and return its handle."""
+    handle = fingerprint(df)
+    root = os.path.join(store_dir, handle)
+    if not os.path.exists(os.path.join(root, 'frame.json')):
+        os.makedirs(store_dir, exist_ok=True)
+        tmp = tempfile.mkdtemp(dir=store_dir)
+        save_frame(df, tmp)
+        try:
+            os.replace(tmp, root)
+        except OSError:
+            shutil.rmtree(tmp, ignore_errors=True)
+    return handle
+
+
+def open_frame(handle):
+    """Return the memory-mapped frame for a handle, opening it once per process."""
+    with _open_lock:
+        if handle not in _open_stores:
+            _open_stores[handle] = load_frame(os.path.join(store_dir, handle))
+        return _open_stores[handle]
@@ -0,0 +1,146 @@
+# Precomputed cube of every stress resampled at every frequency and statistic
+import os
+import json
+import shutil
+import tempfile
+import threading
+import numpy as np
+import pandas as pd
+import GWLs_resample as gwr
+import GWLs_store as gws
+
+# frequencies and statistics offered on the Stresses and Lag Times pages
+cube_freqs = ['M', 'W', 'D']
+cube_stats = ['mean', 'min', 'max', 'sum', 'median', 'cumsum', 'cumdep']
+
+
+def resample_stats(df_stresses, freq, s_id='StressID', dtime='DTime', s_val='Value'):
+    """Long frame of every stress on its own bins with one column per statistic, cumulative ones built from the sum."""
+    df_rs = None
+    for stat in ['mean', 'min', 'max', 'sum', 'median']:
+        df_stat = gwr.resample_all(df_stresses[[s_id, dtime, s_val]], s_id, dtime, s_val, freq, stat)
+        if df_rs is None:
+            df_rs = df_stat.rename(columns={s_val: stat})
+        else:
+            df_rs[stat] = df_stat[s_val].values
+    grp = df_rs.groupby(s_id, observed=True, sort=False)['sum']
+    df_rs['cumsum'] = grp.cumsum()
+    df_rs['cumdep'] = (df_rs['sum']-grp.transform('mean')).groupby(df_rs[s_id], observed=True, sort=False).cumsum()
+    return df_rs
+
+
+class StressCube:
+    """
+    Every stress at every frequency and statistic as one contiguous
+    (stress, statistic, time bin) array per frequency on a shared bin index,
+    with each stress's first and last bin so a lookup returns exactly the
+    bins a per-stress resample would.
+    """
+
+    def __init__(self, df_stresses, freqs=cube_freqs, s_id='StressID', dtime='DTime', s_val='Value'):
+        self.s_id, self.dtime, self.s_val = s_id, dtime, s_val
+        # stresses are keyed by their id as text so a saved cube looks up the same way
+        self.stresses = [str(s) for s in pd.unique(df_stresses[s_id])]
+        self.index = {s: i for i, s in enumerate(self.stresses)}
+        if 'Units' in df_stresses.columns:
+            df_units = df_stresses.drop_duplicates(s_id)
+            self.units = dict(zip(df_units[s_id].astype(str), df_units['Units'].astype(str)))
+        else:
+            self.units = {s: '' for s in self.stresses}
+        self.times, self.values, self.spans = {}, {}, {}
+        for freq in freqs:
+            df_rs = resample_stats(df_stresses, freq, s_id, dtime, s_val)
+            times = np.sort(df_rs[dtime].unique())
+            rows = df_rs[s_id].astype(str).map(self.index).to_numpy()
+            cols = np.searchsorted(times, df_rs[dtime].values)
+            values = np.full((len(self.stresses), len(cube_stats), len(times)), np.nan)
+            for k, stat in enumerate(cube_stats):
+                values[rows, k, cols] = df_rs[stat].to_numpy(dtype='float64')
+            spans = np.zeros((len(self.stresses), 2), dtype='int64')
+            first = pd.Series(cols).groupby(rows).agg(['min', 'max'])
+            spans[first.index.values] = np.column_stack([first['min'].values, first['max'].values+1])
+            self.times[freq], self.values[freq], self.spans[freq] = times, values, spans
+
+    def __contains__(self, freq):
+        return freq in self.values
+
+    def series(self, stress_id, freq, stat):
+        """Resampled stress as a frame of [StressID, DTime, Value] read from the cube."""
+        i, k = self.index[str(stress_id)], cube_stats.index(stat)
+        start, stop = self.spans[freq][i]
+        return pd.DataFrame({self.s_id: stress_id,
+                             self.dtime: self.times[freq][start:stop],
+                             self.s_val: self.values[freq][i, k, start:stop]})
+
+    def save(self, root):
+        """Write one memory-mappable array per frequency."""
+        os.makedirs(root, exist_ok=True)
+        for freq in self.values:
+            np.save(os.path.join(root, f'values_{freq}.npy'), self.values[freq])
+            np.save(os.path.join(root, f'times_{freq}.npy'), self.times[freq])
+            np.save(os.path.join(root, f'spans_{freq}.npy'), self.spans[freq])
+        with open(os.path.join(root, 'cube.json'), 'w') as f:
+            json.dump({'s_id': self.s_id, 'dtime': self.dtime, 's_val': self.s_val,
+                       'stresses': self.stresses, 'freqs': list(self.values),
+                       'units': [self.units[s] for s in self.stresses]}, f)
+
+    @classmethod
+    def load(cls, root):
+        """Open a cube saved with save() as memory-mapped arrays."""
+        cube = cls.__new__(cls)
+        with open(os.path.join(root, 'cube.json')) as f:
+            meta = json.load(f)
+        cube.s_id, cube.dtime, cube.s_val = meta['s_id'], meta['dtime'], meta['s_val']
+        cube.stresses = meta['stresses']
+        cube.index = {s: i for i, s in enumerate(cube.stresses)}
+        cube.units = dict(zip(cube.stresses, meta['units']))
+        cube.times, cube.values, cube.spans = {}, {}, {}
+        for freq in meta['freqs']:
+            cube.values[freq] = np.load(os.path.join(root, f'values_{freq}.npy'), mmap_mode='r')
+            cube.times[freq] = np.load(os.path.join(root, f'times_{freq}.npy'))
+            cube.spans[freq] = np.load(os.path.join(root, f'spans_{freq}.npy'))
+        return cube
+
+
+def resample_stress(df_stresses, stress_id, freq, stat, cube=None, s_id='StressID', dtime='DTime', s_val='Value'):
+    """Look a stress up in the cube, or resample it directly for a frequency the cube doesn't hold."""
+    if cube is not None and freq in cube:
+        return cube.series(stress_id, freq, stat)
+    # only the requested statistic, the cumulative ones built from the sum as in the cube
+    df_s = df_stresses.loc[df_stresses[s_id]==stress_id, [s_id, dtime, s_val]]
+    df_rs = gwr.resample_all(df_s, s_id, dtime, s_val, freq, 'sum' if stat in ['cumsum', 'cumdep'] else stat)
+    if stat == 'cumsum':
+        df_rs[s_val] = df_rs[s_val].cumsum()
+    elif stat == 'cumdep':
+        df_rs[s_val] = (df_rs[s_val]-df_rs[s_val].mean()).cumsum()
+    return df_rs
+
+
+# cubes opened in this process, shared by every session
+_open_cubes = {}
+_open_lock = threading.Lock()
+
+
+def publish_cube(df_stresses, handle):
+    """Build and save the cube for a published stress frame once per handle."""
+    root = os.path.join(gws.store_dir, f'{handle}_cube')
+    if not os.path.exists(os.path.join(root, 'cube.json')):
+        os.makedirs(gws.store_dir, exist_ok=True)
+        tmp = tempfile.mkdtemp(dir=gws.store_dir)
+        StressCube(df_stresses).save(tmp)
+        try:
+            os.replace(tmp, root)
+        except OSError:
+            shutil.rmtree(tmp, ignore_errors=True)
+    return handle
+
+
+def open_cube(handle):
+    """Return the memory-mapped cube for a stress handle, or None if it was never built."""
+    root = os.path.join(gws.store_dir, f'{handle}_cube')
+    with _open_lock:
+        if handle not in _open_cubes:
+            if not os.path.exists(os.path.join(root, 'cube.json')):
+                return None
+            _open_cubes[handle] = StressCube.load(root)
+        return _open_cubes[handle]
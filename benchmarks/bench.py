@@ -0,0 +1,249 @@
+# Timing and memory benchmarks of the analysis hot paths on synthetic VWP networks
+#
+#   python benchmarks/bench.py --tiers 10 100 1000 --out benchmarks/results/baseline.json
+#   python benchmarks/bench.py --compare benchmarks/results/baseline.json
+#
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import GWLs_v01 as gwl
+import GWLs_store as gws
+import GWLs_resample as gwr
+import GWLs_signatures as gwsig
+import GWLs_cluster as gwcl
+import GWLs_decompose as gwd
+import GWLs_lags as gwlag
+import synthetic
+
+# set variables
+scode = 'SensorCode'
+dtime = 'DTime'
+val = 'WL'
+s_val = 'Value'
+
+# largest tier each case runs at by default, the per-sensor gwl loops and DTW are quadratic or slow
+limits = {'gwl.dtw_cluster': 100, 'gwl.time_lagged_xy': 100, 'gwl.seasonal_decomposition': 100}
+
+
+class Network:
+    """One synthetic tier with the frames and derived inputs the cases share."""
+
+    def __init__(self, n_sensors, args):
+        self.df_ts, self.df_xy, self.df_stresses = synthetic.make_network(
+            n_sensors, args.days, args.interval, args.gap_frac, args.gaps, seed=args.seed)
+        self.store = gws.SensorStore(self.df_ts, scode, dtime)
+        self.sensors = self.store.sensors
+        self.freq = args.freq
+        self.df_rs = gwr.resample_all(self.store.df[[scode, dtime, val]], scode, dtime, val, args.freq, 'median')
+
+    def sensor_frames(self):
+        """Each sensor's resampled, interpolated levels, as the pages pass to gwl."""
+        frames = {}
+        for s, df_s in self.df_rs.groupby(scode, observed=True, sort=False):
+            df_s = df_s.copy()
+            df_s[val] = df_s[val].interpolate()
+            frames[s] = df_s.dropna(subset=val)
+        return frames
+
+    def lag_frames(self):
+        """Each sensor joined to the rainfall cumulative departure, as on the Lag Times page."""
+        x = gwlag.stress_series(self.df_stresses, 'Rain', self.freq)
+        df_rain = pd.DataFrame({dtime: x.index, s_val: x.values})
+        return {s: pd.merge(df_s, df_rain, on=dtime) for s, df_s in self.sensor_frames().items()}
+
+
+######################### Cases ##########################
+# each case takes the network and returns a zero-argument callable that runs the work once
+
+def case_gwl_resample(net, args):
+    df_ts = net.df_ts
+    return lambda: gwl.resample(df_ts, scode, dtime, val, net.freq, 'median')
+
+
+def case_gwl_get_signatures(net, args):
+    df_rs = net.df_rs
+    return lambda: gwl.get_signatures(df=df_rs, sensors=net.sensors, scode=scode, dtime=dtime, val=val)
+
+
+def case_gwl_dtw_cluster(net, args):
+    df_ts = net.df_ts
+    start, end = df_ts[dtime].min(), df_ts[dtime].max()
+    dict_color = {i: '#000000' for i in range(args.n_clusters)}
+    return lambda: gwl.dtw_cluster(df_ts, scode, dtime, val, 'Raw', args.n_clusters, start, end, net.freq, 'median',
+                                   dict_color=dict_color)
+
+
+def case_gwl_seasonal_decomposition(net, args):
+    frames = net.sensor_frames()
+    period = gwd.periods[net.freq]
+
+    def run():
+        for s, df_s in frames.items():
+            try:
+                gwl.seasonal_decomposition(s, df_s, scode, dtime, val, period, 'MA')
+            except ValueError:
+                # too short for two seasonal cycles
+                pass
+    return run
+
+
+def case_gwl_time_lagged_xy(net, args):
+    frames = net.lag_frames()
+    lag_range, lag_steps = gwlag.lag_defaults[net.freq]
+
+    def run():
+        for df_s in frames.values():
+            gwl.time_lagged_xy(df_s, s_val, val, lag_range, lag_steps, net.freq)
+    return run
+
+
+def case_resample_all(net, args):
+    df = net.store.df[[scode, dtime, val]]
+    return lambda: gwr.resample_all(df, scode, dtime, val, net.freq, 'median')
+
+
+def case_signatures(net, args):
+    return lambda: gwsig.get_signatures(net.df_rs, scode, dtime, val, n_jobs=args.jobs)
+
+
+def case_dtw_matrix(net, args):
+    df_m = gwcl.series_matrix(net.store, val, net.df_ts[dtime].min(), net.df_ts[dtime].max(), net.freq, 'median', 'Raw')
+    X = df_m.to_numpy(dtype='float64')
+    window = max(1, int(round(0.1*X.shape[1])))
+    return lambda: gwcl.dtw_matrix(X, window, n_jobs=args.jobs)
+
+
+def case_sd_var(net, args):
+    return lambda: gwd.get_sd_var(net.store, val, net.freq, 'MA', n_jobs=args.jobs)
+
+
+def case_batch_time_lag(net, args):
+    return lambda: gwlag.batch_time_lag(net.store, net.df_stresses, 'Rain', net.freq, val=val)
+
+
+cases = {'gwl.resample': case_gwl_resample,
+         'gwl.get_signatures': case_gwl_get_signatures,
+         'gwl.dtw_cluster': case_gwl_dtw_cluster,
+         'gwl.seasonal_decomposition': case_gwl_seasonal_decomposition,
+         'gwl.time_lagged_xy': case_gwl_time_lagged_xy,
+         'gwr.resample_all': case_resample_all,
+         'gwsig.get_signatures': case_signatures,
+         'gwcl.dtw_matrix': case_dtw_matrix,
+         'gwd.get_sd_var': case_sd_var,
+         'gwlag.batch_time_lag': case_batch_time_lag}
+
+
+def clear_caches():
+    # every repeat measures the cold path
+    gwr.cache.clear()
+    gwd.cache.clear()
+
+
+def measure(run, repeats):
+    """Wall times over repeats, then the traced peak of one more run in MB (worker processes aren't traced)."""
+    times = []
+    for _ in range(repeats):
+        clear_caches()
+        t = time.perf_counter()
+        run()
+        times.append(time.perf_counter()-t)
+    clear_caches()
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'min_s': min(times), 'median_s': float(np.median(times)), 'times_s': times, 'peak_mb': peak/2**20}
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = ''
+    return {'commit': commit, 'python': platform.python_version(), 'platform': platform.platform(),
+            'cpus': os.cpu_count(), 'numpy': np.__version__, 'pandas': pd.__version__}
+
+
+def compare(results, baseline, threshold):
+    """Print each case's median time against the baseline and return the cases slower by more than threshold."""
+    base = {(r['case'], r['sensors']): r for r in baseline['results'] if 'median_s' in r}
+    slower = []
+    print(f"{'case':<28}{'sensors':>8}{'base s':>10}{'now s':>10}{'ratio':>8}")
+    for r in results:
+        b = base.get((r['case'], r['sensors']))
+        if b is None or 'median_s' not in r:
+            continue
+        ratio = r['median_s']/b['median_s'] if b['median_s'] > 0 else np.nan
+        flag = ' *' if ratio > threshold else ''
+        print(f"{r['case']:<28}{r['sensors']:>8}{b['median_s']:>10.3f}{r['median_s']:>10.3f}{ratio:>8.2f}{flag}")
+        if ratio > threshold:
+            slower.append(r)
+    return slower
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the analysis hot paths on synthetic VWP networks.')
+    parser.add_argument('--tiers', nargs='+', type=int, default=[10, 100, 1000], help='sensor counts')
+    parser.add_argument('--cases', nargs='+', choices=list(cases), default=list(cases))
+    parser.add_argument('--days', type=int, default=3*365, help='record length in days')
+    parser.add_argument('--interval', default='6h', help='logging interval')
+    parser.add_argument('--gap-frac', type=float, default=0.05, help='fraction of each record lost to outages')
+    parser.add_argument('--gaps', type=int, default=3, help='outages per sensor')
+    parser.add_argument('--freq', default='W', choices=['W', 'D', 'M'])
+    parser.add_argument('--n-clusters', type=int, default=5)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--jobs', type=int, default=1, help='worker processes for the parallel engines')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--full', action='store_true', help='run every case at every tier, ignoring the limits')
+    parser.add_argument('--out', default=None, help='results JSON, default benchmarks/results/<time>.json')
+    parser.add_argument('--compare', default=None, help='baseline JSON to compare median times against')
+    parser.add_argument('--threshold', type=float, default=1.2, help='ratio to the baseline reported as a regression')
+    args = parser.parse_args(argv)
+
+    results = []
+    for n in args.tiers:
+        t0 = time.perf_counter()
+        net = Network(n, args)
+        print(f'{n} sensors: {len(net.df_ts)} rows generated in {time.perf_counter()-t0:.1f}s')
+        for name in args.cases:
+            row = {'case': name, 'sensors': n, 'rows': len(net.df_ts)}
+            if not args.full and n > limits.get(name, n):
+                row['skipped'] = f'above the {limits[name]} sensor limit, use --full'
+            else:
+                try:
+                    row.update(measure(cases[name](net, args), args.repeats))
+                    print(f"  {name:<28}{row['median_s']:>9.3f}s {row['peak_mb']:>9.1f}MB")
+                except Exception as e:
+                    row['error'] = f'{type(e).__name__}: {e}'
+                    print(f"  {name:<28} {row['error']}")
+            results.append(row)
+
+    out = args.out or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results',
+                                   time.strftime('%Y%m%d-%H%M%S')+'.json')
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    params = {k: v for k, v in vars(args).items() if k not in ['out', 'compare']}
+    with open(out, 'w') as f:
+        json.dump({'environment': environment(), 'params': params, 'results': results}, f, indent=2)
+    print(f'Results written to {out}')
+
+    if args.compare:
+        with open(args.compare) as f:
+            slower = compare(results, json.load(f), args.threshold)
+        if slower:
+            print(f'{len(slower)} case(s) slower than {args.threshold}x the baseline')
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+# Synthetic VWP networks in the app's upload schemas, for benchmarking
+import numpy as np
+import pandas as pd
+from scipy.signal import lfilter
+
+# set variables
+scode = 'SensorCode'
+dtime = 'DTime'
+val = 'WL'
+s_id = 'StressID'
+s_val = 'Value'
+
+
+def make_rain(start, days, rng):
+    """Daily rainfall in mm: wet days by a seasonal probability, amounts gamma distributed."""
+    t = pd.date_range(start, periods=days, freq='D')
+    p_wet = 0.3+0.2*np.cos(2*np.pi*(t.dayofyear.values-15)/365.25)
+    wet = rng.random(days) < p_wet
+    return t, np.where(wet, rng.gamma(0.8, 8.0, days), 0.0)
+
+
+def make_evap(t, rng):
+    """Daily evaporation in mm following the annual cycle."""
+    return np.clip(4+3*np.cos(2*np.pi*(t.dayofyear.values-15)/365.25)+rng.normal(0, 0.8, len(t)), 0, None)
+
+
+def stress_frame(t, rain, evap):
+    return pd.concat([pd.DataFrame({s_id: 'Rain', dtime: t, s_val: rain, 'Units': 'mm'}),
+                      pd.DataFrame({s_id: 'Evaporation', dtime: t, s_val: evap, 'Units': 'mm'})],
+                     ignore_index=True)
+
+
+def make_network(n_sensors=100, days=3*365, interval='6h', gap_frac=0.05, n_gaps=3, start='2015-01-01', seed=0):
+    """
+    A synthetic network of vibrating wire piezometers sharing one rainfall record.
+
+    Each sensor's level is its sensor level (SL) plus a pressure head made of a
+    recharge response to the rain (an exponential store with its own lag and
+    decay), an annual cycle, a linear trend and AR(1) noise. Sensors start and
+    end at different times, and each loses about gap_frac of its record to
+    n_gaps logger outages.
+
+    Returns df_ts of ['DTime', 'SensorCode', 'WL', 'SL'] in the typed upload
+    schema, df_xy of ['SensorCode', 'Lat', 'Lon'] and df_stresses.
+    """
+    rng = np.random.default_rng(seed)
+    times = pd.date_range(start, pd.Timestamp(start)+pd.Timedelta(days=days), freq=interval, inclusive='left')
+    T = len(times)
+    steps_per_day = T/days
+
+    # rain at the logging interval, spread evenly over each day
+    t_day, rain = make_rain(start, days, rng)
+    day = np.minimum((np.arange(T)/steps_per_day).astype(int), days-1)
+    rain_t = (rain-rain.mean())[day]/steps_per_day
+
+    codes = [f'VWP{i:05d}' for i in range(n_sensors)]
+    sl = rng.uniform(-80, 20, n_sensors)
+    head = rng.uniform(5, 60, n_sensors)
+    decay = np.exp(-1/(rng.uniform(5, 120, n_sensors)*steps_per_day))
+    lag = (rng.uniform(0, 90, n_sensors)*steps_per_day).astype(int)
+    gain = rng.uniform(0.002, 0.02, n_sensors)
+    amp = rng.uniform(0.05, 1.0, n_sensors)
+    phase = rng.uniform(0, 2*np.pi, n_sensors)
+    trend = rng.normal(0, 0.5, n_sensors)/365.25/steps_per_day
+    phi = rng.uniform(0.8, 0.99, n_sensors)
+    years = np.arange(T)/steps_per_day/365.25
+
+    WL = np.empty((n_sensors, T), dtype='float64')
+    for i in range(n_sensors):
+        recharge = lfilter([gain[i]], [1, -decay[i]], rain_t)
+        recharge = np.concatenate([np.zeros(lag[i]), recharge[:T-lag[i]]])
+        noise = lfilter([1], [1, -phi[i]], rng.normal(0, 0.01, T))
+        WL[i] = sl[i]+head[i]+recharge*steps_per_day+amp[i]*np.sin(2*np.pi*years+phase[i])+trend[i]*np.arange(T)+noise
+
+    # staggered installs and decommissions, then logger outages
+    keep = np.ones((n_sensors, T), dtype=bool)
+    first = (rng.uniform(0, 0.2, n_sensors)*T).astype(int)
+    last = T-(rng.uniform(0, 0.2, n_sensors)*T).astype(int)
+    cols = np.arange(T)
+    keep &= (cols[None, :] >= first[:, None]) & (cols[None, :] < last[:, None])
+    gap_len = max(1, int(gap_frac*T/max(n_gaps, 1)))
+    for _ in range(n_gaps):
+        g0 = rng.integers(0, max(T-gap_len, 1), n_sensors)
+        keep &= ~((cols[None, :] >= g0[:, None]) & (cols[None, :] < g0[:, None]+gap_len))
+
+    rows, steps = np.nonzero(keep)
+    df_ts = pd.DataFrame({dtime: times.values[steps],
+                          scode: pd.Categorical.from_codes(rows, codes),
+                          val: WL[rows, steps].astype('float32'),
+                          'SL': sl[rows].astype('float32')})
+
+    df_xy = pd.DataFrame({scode: codes,
+                          'Lat': rng.uniform(-23.5, -21.5, n_sensors),
+                          'Lon': rng.uniform(148.0, 150.0, n_sensors)})
+
+    df_stresses = stress_frame(t_day, rain, make_evap(t_day, rng))
+    return df_ts, df_xy, df_stresses
+
@@ -0,0 +1,5 @@
+# The GWLs_* modules sit at the repo root next to the pages
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+import pytest
+import GWLs_align as gwal
+
+
+def test_join_matches_merge():
+    t = pd.date_range('2020-01-05', periods=30, freq='W')
+    rng = np.random.default_rng(0)
+    df_l = pd.DataFrame({'DTime': t, 'SensorCode': pd.Categorical(['A']*30), 'WL': rng.normal(size=30)})
+    df_r = pd.DataFrame({'DTime': t[10:], 'Value': rng.normal(size=20), 'WL': rng.normal(size=20)})
+    got = gwal.join(df_l, df_r, 'DTime')
+    pd.testing.assert_frame_equal(got, pd.merge(df_l, df_r, on='DTime'))
+
+
+def test_join_on_periods_aligns_month_labels():
+    df_l = pd.DataFrame({'DTime': pd.date_range('2020-01-31', periods=6, freq='M'), 'WL': np.arange(6.)})
+    df_r = pd.DataFrame({'DTime': pd.date_range('2020-03-01', periods=6, freq='MS'), 'Value': np.arange(6.)})
+    got = gwal.join(df_l, df_r, 'DTime', freq='M')
+    assert list(got['WL']) == [2., 3., 4., 5.]
+    assert list(got['Value']) == [0., 1., 2., 3.]
+
+
+def irregular():
+    rng = np.random.default_rng(1)
+    df_l = pd.DataFrame({'DTime': pd.date_range('2020-01-05', periods=40, freq='W'), 'WL': rng.normal(size=40)})
+    # an irregular stress log with repeated times and an exact match on a left bin
+    t = pd.to_datetime(np.sort(rng.uniform(pd.Timestamp('2019-12-01').value, pd.Timestamp('2020-11-01').value, 25)))
+    t = t.append(pd.DatetimeIndex([df_l['DTime'][7], t[3]])).sort_values()
+    df_r = pd.DataFrame({'DTime': t, 'Value': rng.normal(size=len(t)), 'WL': rng.normal(size=len(t))})
+    return df_l, df_r
+
+
+@pytest.mark.parametrize('tolerance', [None, pd.Timedelta(days=3)])
+@pytest.mark.parametrize('direction', ['backward', 'forward', 'nearest'])
+def test_join_asof_matches_merge_asof(direction, tolerance):
+    df_l, df_r = irregular()
+    got = gwal.join_asof(df_l, df_r, 'DTime', tolerance, direction)
+    ref = pd.merge_asof(df_l, df_r, on='DTime', direction=direction, tolerance=tolerance)
+    pd.testing.assert_frame_equal(got, ref)
+    # an unsorted right frame is sorted first, repeated times have no order to keep so they are left out
+    df_r = df_r.drop_duplicates('DTime', keep=False)
+    got = gwal.join_asof(df_l, df_r.sample(frac=1, random_state=0), 'DTime', tolerance, direction)
+    pd.testing.assert_frame_equal(got, pd.merge_asof(df_l, df_r, on='DTime', direction=direction, tolerance=tolerance))
+
+
+def test_join_asof_empty_right():
+    df_l, df_r = irregular()
+    got = gwal.join_asof(df_l, df_r.iloc[0:0], 'DTime')
+    assert got['Value'].isna().all() and len(got) == len(df_l)
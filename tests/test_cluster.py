@@ -0,0 +1,112 @@
+import numpy as np
+import pytest
+import pandas as pd
+import GWLs_store as gws
+import GWLs_cluster as gwcl
+
+
+def naive_dtw(a, b, window):
+    """Textbook Sakoe-Chiba banded DTW with squared costs."""
+    T = len(a)
+    C = np.full((T+1, T+1), np.inf)
+    C[0, 0] = 0
+    for i in range(1, T+1):
+        for j in range(max(1, i-window), min(T, i+window)+1):
+            C[i, j] = (a[i-1]-b[j-1])**2+min(C[i-1, j-1], C[i-1, j], C[i, j-1])
+    return np.sqrt(C[T, T])
+
+
+@pytest.mark.parametrize('window', [1, 3, 10])
+def test_dtw_matrix_matches_naive(window):
+    X = np.cumsum(np.random.default_rng(1).normal(size=(6, 40)), axis=1)
+    D = gwcl.dtw_matrix(X, window, n_jobs=1)
+    for i in range(len(X)):
+        for j in range(len(X)):
+            assert D[i, j] == pytest.approx(naive_dtw(X[i], X[j], window) if i != j else 0)
+
+
+def test_dtw_matrix_pool_matches_serial():
+    X = np.cumsum(np.random.default_rng(3).normal(size=(10, 30)), axis=1)
+    np.testing.assert_allclose(gwcl.dtw_matrix(X, 3, n_jobs=2), gwcl.dtw_matrix(X, 3, n_jobs=1))
+
+
+def test_lb_keogh_is_a_lower_bound():
+    X = np.cumsum(np.random.default_rng(2).normal(size=(8, 50)), axis=1)
+    D = gwcl.dtw_matrix(X, 5, n_jobs=1)
+    assert np.all(gwcl.lb_keogh(X, 5) <= D+1e-9)
+    # the approximate matrix only ever underestimates
+    assert np.all(gwcl.dtw_matrix(X, 5, approx=0.5, n_jobs=1) <= D+1e-9)
+
+
+def test_kmedoids_finds_separated_groups():
+    rng = np.random.default_rng(4)
+    pts = np.concatenate([rng.normal(c, 0.1, size=(10, 2)) for c in [0, 5, 10]])
+    D = np.sqrt(((pts[:, None]-pts[None])**2).sum(axis=2))
+    labels, medoids, _ = gwcl.kmedoids(D, 3)
+    assert len(set(labels[:10])) == len(set(labels[10:20])) == len(set(labels[20:])) == 1
+    assert len(set(labels)) == 3
+    # each medoid minimises the summed distance within its group
+    for m in medoids:
+        members = np.flatnonzero(labels == labels[m])
+        assert D[m, members].sum() == pytest.approx(D[np.ix_(members, members)].sum(axis=1).min())
+    # warm starting from the answer stops at once
+    assert gwcl.kmedoids(D, 3, list(medoids))[2] == 1
+
+
+def make_store(n_sensors=6, days=800):
+    rng = np.random.default_rng(5)
+    t = pd.date_range('2020-01-01', periods=days, freq='D')
+    df = pd.DataFrame({'DTime': np.tile(t, n_sensors),
+                       'SensorCode': np.repeat([f'S{i}' for i in range(n_sensors)], days),
+                       'WL': np.cumsum(rng.normal(size=(n_sensors, days)), axis=1).ravel()})
+    return gws.SensorStore(df)
+
+
+def test_incremental_reuses_segments():
+    store = make_store()
+    colors = {i: '#000000' for i in range(3)}
+    gwcl._segments.clear()
+    _, _, info = gwcl.dtw_cluster_incremental(store, 'WL', 'Raw', 3, '2020-03-01', '2021-06-30', 'W', 'mean',
+                                              colors, seg_len=8, n_jobs=1)
+    assert info['SegmentsReused'] == 0
+    _, df_groups, info = gwcl.dtw_cluster_incremental(store, 'WL', 'Raw', 3, '2020-03-15', '2021-07-15', 'W', 'mean',
+                                                      colors, seg_len=8, prev_medoids=info['Medoids'], n_jobs=1)
+    # only the partial segments at the moved edges are new
+    assert info['SegmentsReused'] >= info['Segments']-3
+    assert len(df_groups) == 6 and set(df_groups['Group']) <= {1, 2, 3}
+
+
+def test_incremental_distance_is_summed_segments():
+    store = make_store()
+    (df_full, _, _), _ = gwcl.full_matrix(store, 'WL', 'W', 'mean', 'Raw')
+    X = df_full.to_numpy(dtype='float64')
+    gwcl._segments.clear()
+    segs, _ = gwcl.segments_d2(('test',), [(0, 8), (8, 16), (16, 20)], X, 0.1, n_jobs=1)
+    for d2, (a, b) in zip(segs, [(0, 8), (8, 16), (16, 20)]):
+        window = max(1, int(round(0.1*(b-a))))
+        np.testing.assert_allclose(d2, gwcl.dtw_matrix(X[:, a:b], window, n_jobs=1)**2, rtol=1e-5)
+    _, n_reused = gwcl.segments_d2(('test',), [(8, 16)], X, 0.1, n_jobs=1)
+    assert n_reused == 1
+
+
+def test_rolling_window_must_be_whole_steps():
+    assert gwcl.snap_window(52, 4) == 52
+    assert gwcl.snap_window(50, 4) % 4 == 0
+    assert gwcl.snap_window(1, 4) == 4
+    with pytest.raises(ValueError):
+        gwcl.rolling_membership(None, 'WL', 'Raw', 3, 'W', 'median', 50, 4)
+
+
+def test_align_labels_undoes_a_relabelling():
+    prev = np.array([1, 1, 2, 2, 3, 3, 0])
+    cur = np.array([3, 3, 1, 1, 2, 2, 2])
+    assert list(gwcl.align_labels(prev, cur, 3)) == [1, 1, 2, 2, 3, 3, 3]
+
+
+def test_rolling_membership_windows():
+    store = make_store()
+    df_members, df_windows = gwcl.rolling_membership(store, 'WL', 'Raw', 2, 'W', 'mean', 16, 8, n_jobs=1)
+    n_bins = gwcl.full_matrix(store, 'WL', 'W', 'mean', 'Raw')[0][0].shape[1]
+    assert len(df_windows) == n_bins//8-1
+    assert list(df_members.columns) == list(df_windows['Start'])
+    assert df_members.shape[0] == 6 and set(np.unique(df_members.values)) <= {1.0, 2.0}
@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.stats import pearsonr, spearmanr
+import GWLs_store as gws
+import GWLs_corr as gwc
+
+
+def gappy(rng, rows, T, frac=0.2):
+    X = np.cumsum(rng.normal(size=(rows, T)), axis=1)
+    X[rng.random((rows, T)) < frac] = np.nan
+    return X
+
+
+def test_masked_corr_matches_pearsonr():
+    rng = np.random.default_rng(0)
+    X, Y = gappy(rng, 5, 80), gappy(rng, 3, 80)
+    R, N = gwc.masked_corr(X, Y)
+    for i in range(len(X)):
+        for j in range(len(Y)):
+            ok = np.isfinite(X[i]) & np.isfinite(Y[j])
+            assert N[i, j] == ok.sum()
+            assert R[i, j] == pytest.approx(pearsonr(X[i][ok], Y[j][ok])[0])
+
+
+def test_masked_spearman_matches_spearmanr():
+    rng = np.random.default_rng(1)
+    X, Y = gappy(rng, 5, 80), gappy(rng, 3, 80)
+    X[0, :10] = 1.0  # ties
+    R = gwc.masked_spearman(X, Y)
+    for i in range(len(X)):
+        for j in range(len(Y)):
+            ok = np.isfinite(X[i]) & np.isfinite(Y[j])
+            assert R[i, j] == pytest.approx(spearmanr(X[i][ok], Y[j][ok])[0])
+
+
+def test_corr_matrices_match_merged_pairs():
+    rng = np.random.default_rng(2)
+    t = pd.date_range('2020-01-01', periods=500, freq='D')
+    df_stresses = pd.concat([pd.DataFrame({'StressID': s, 'DTime': t, 'Value': rng.gamma(0.5, 8.0, len(t)), 'Units': 'mm'})
+                             for s in ['Rain', 'Evap']], ignore_index=True)
+    frames = [pd.DataFrame({'DTime': t[a:b], 'SensorCode': s, 'WL': np.cumsum(rng.normal(size=b-a))})
+              for s, a, b in [('A', 0, 500), ('B', 100, 400)]]
+    store = gws.SensorStore(pd.concat(frames, ignore_index=True))
+    df_corr = gwc.corr_matrices(store, df_stresses, 'W', 'sum').set_index(['SensorCode', 'StressID'])
+    df_s = gwc.stress_matrix(df_stresses, 'W', 'sum')
+    for df in frames:
+        s = df['SensorCode'].iloc[0]
+        x = df.set_index('DTime')['WL'].resample('W').median()
+        for stress in ['Rain', 'Evap']:
+            df_m = pd.merge(x.rename('WL').reset_index(), df_s.loc[stress].rename('Value').reset_index(), on='DTime')
+            assert df_corr.loc[(s, stress), 'Pearson R'] == pytest.approx(pearsonr(df_m['WL'], df_m['Value'])[0])
+            assert df_corr.loc[(s, stress), 'Spearman R'] == pytest.approx(spearmanr(df_m['WL'], df_m['Value'])[0])
+            assert df_corr.loc[(s, stress), 'N'] == len(df_m)
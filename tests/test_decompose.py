@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+gwl = pytest.importorskip('GWLs_v01')
+import GWLs_store as gws
+import GWLs_resample as gwr
+import GWLs_decompose as gwd
+
+
+def make_store(n_sensors=3, days=4*365):
+    rng = np.random.default_rng(0)
+    t = pd.date_range('2018-01-01', periods=days, freq='D')
+    season = np.sin(2*np.pi*np.arange(days)/365.25)
+    wl = np.stack([season+0.001*np.arange(days)+rng.normal(0, 0.1, days) for _ in range(n_sensors)])
+    df = pd.DataFrame({'DTime': np.tile(t, n_sensors),
+                       'SensorCode': np.repeat([f'S{i}' for i in range(n_sensors)], days),
+                       'WL': wl.ravel()})
+    # a short sensor that can't be decomposed
+    df_short = pd.DataFrame({'DTime': t[:60], 'SensorCode': 'SHORT', 'WL': rng.normal(size=60)})
+    return gws.SensorStore(pd.concat([df, df_short], ignore_index=True))
+
+
+def reference(store, sensor, freq, method):
+    df_rs = gwr.resample_all(store.get(sensor, ['SensorCode', 'DTime', 'WL']), 'SensorCode', 'DTime', 'WL', freq, 'median')
+    df_rs['WL'] = df_rs['WL'].interpolate()
+    return gwl.seasonal_decomposition(sensor, df_rs, 'SensorCode', 'DTime', 'WL', gwd.periods[freq], method)
+
+
+def test_decompose_sensor_matches_gwl_and_caches():
+    store = make_store()
+    cache = gwd.DecompositionCache()
+    df_sd = cache.decompose_sensor(store, 'S1', 'WL', 'W', 'MA')
+    pd.testing.assert_frame_equal(df_sd, reference(store, 'S1', 'W', 'MA'))
+    df_sd['Trend'] = 0
+    again = cache.decompose_sensor(store, 'S1', 'WL', 'W', 'MA')
+    assert cache.hits == 1 and cache.misses == 1
+    pd.testing.assert_frame_equal(again, reference(store, 'S1', 'W', 'MA'))
+    cache.decompose_sensor(store, 'S1', 'WL', 'W', 'STL')
+    assert cache.misses == 2
+
+
+@pytest.mark.parametrize('n_jobs', [1, 2])
+def test_get_sd_var_matches_per_sensor(n_jobs):
+    store = make_store()
+    df_sd_var = gwd.get_sd_var(store, 'WL', 'W', 'MA', n_jobs=n_jobs).set_index('SensorCode')
+    assert set(df_sd_var.index) == set(store.sensors)
+    assert df_sd_var.loc['SHORT'].isna().all()
+    for s in ['S0', 'S1', 'S2']:
+        ref = gwd.variance_fractions(reference(store, s, 'W', 'MA'))
+        np.testing.assert_allclose(df_sd_var.loc[s].values, ref.values)
+        assert df_sd_var.loc[s].sum() == pytest.approx(1)
@@ -0,0 +1,46 @@
+import time
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import GWLs_downsample as gwds
+
+
+def make_trace(n=20000):
+    x = pd.date_range('2020-01-01', periods=n, freq='h')
+    y = np.sin(np.arange(n)/200)+np.random.default_rng(0).normal(0, 0.05, n)
+    y[5000:5400] = np.nan
+    y[12000:12001] = np.nan
+    return x, y
+
+
+def test_minmax_keeps_extremes_and_gaps():
+    x, y = make_trace()
+    xd, yd = gwds.downsample(x, y, 2000, 'MinMax')
+    assert len(xd) <= 2010
+    assert np.nanmax(yd) == np.nanmax(y) and np.nanmin(yd) == np.nanmin(y)
+    # one separator per outage, at the first missing reading
+    assert list(xd[yd.isna()]) == [x[5000], x[12000]]
+    assert xd.is_monotonic_increasing
+
+
+def test_lttb_keeps_ends_and_gaps():
+    x, y = make_trace()
+    xd, yd = gwds.downsample(x, y, 1000, 'LTTB')
+    assert xd.iloc[0] == x[0] and xd.iloc[-1] == x[-1]
+    assert yd.isna().sum() == 2
+
+
+def test_none_and_window():
+    x, y = make_trace()
+    xd, yd = gwds.downsample(x, y, 2000, 'None')
+    assert len(xd) == len(x) and yd.isna().sum() == 401
+    xd, _ = gwds.downsample(x, y, 2000, 'MinMax', x_range=(x[100], x[900]))
+    assert len(xd) == 801
+
+
+def test_payload_reports_points_and_size():
+    x, y = make_trace(1000)
+    fig = go.Figure(go.Scattergl(x=x, y=y))
+    caption = gwds.payload(fig, time.perf_counter())
+    assert caption.startswith('Points Sent: 1000, Server-side Build:') and 'Payload' not in caption
+    assert f'Payload: {len(fig.to_json())/1024:.0f} KB' in gwds.payload(fig, time.perf_counter(), size=True)
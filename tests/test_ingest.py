@@ -0,0 +1,62 @@
+import io
+import pandas as pd
+import GWLs_ingest as gwi
+
+
+def csv_upload(rows):
+    return io.BytesIO(('DTime,SensorCode,WL,SL\n'+''.join(rows)).encode())
+
+
+def test_parse_dtime_matches_to_datetime():
+    s = pd.Series(['2021-03-01 10:00:00', '2021-03-02 10:00:00', None, '2021-03-01 10:00:00'])
+    ref = pd.to_datetime(s)
+    pd.testing.assert_series_equal(gwi.parse_dtime(s), ref, check_names=False)
+
+
+def test_parse_dtime_mixed_formats():
+    # the sampled format holds for the first values only
+    s = pd.Series(['2021-03-01']*1001+['15/03/2021', '2021-03-02 12:30'])
+    got = gwi.parse_dtime(s)
+    assert got.iloc[0] == pd.Timestamp('2021-03-01')
+    assert got.iloc[1001] == pd.Timestamp('2021-03-15')
+    assert got.iloc[1002] == pd.Timestamp('2021-03-02 12:30')
+
+
+def test_read_ts_typed_schema():
+    df = gwi.read_ts(csv_upload(['01/02/2021 10:00,101,1.5,2\n', '02/02/2021 10:00,101,2.5,2\n']))
+    assert list(df.columns) == gwi.ts_fields
+    assert df['DTime'].iloc[1] == pd.Timestamp('2021-02-02 10:00')
+    assert list(df['SensorCode'].cat.categories) == [101]
+    assert df['WL'].dtype == 'float32'
+
+
+def test_spill_round_trip(tmp_path):
+    rows = [f'2021-01-0{d},{s},{d}.5,1\n' for s in ['A', 'B'] for d in range(1, 6)]
+    rows += ['2021-01-07,,3.0,1\n', 'not a date,A,3.0,1\n']
+    root = str(tmp_path/'spill')
+    summary = gwi.spill_ts(csv_upload(rows), root, chunksize=4)
+    assert summary['Rows'] == 10
+    assert summary['Dropped'] == 2
+    assert summary['Sensors'] == ['A', 'B']
+    df = gwi.load_spill(root, sensors=['B'], start='2021-01-02', end='2021-01-04')
+    assert sorted(df['DTime'].dt.day) == [2, 3, 4]
+    assert set(df['SensorCode'].astype(str)) == {'B'}
+
+
+def test_spill_replaces_earlier_parts(tmp_path):
+    root = str(tmp_path/'spill')
+    gwi.spill_ts(csv_upload(['2021-01-01,A,1,1\n', '2021-01-02,A,2,1\n']), root)
+    gwi.spill_ts(csv_upload(['2021-01-01,C,1,1\n']), root)
+    assert list(gwi.load_spill(root)['SensorCode'].astype(str)) == ['C']
+
+
+def test_spill_with_no_valid_rows(tmp_path):
+    summary = gwi.spill_ts(csv_upload(['bad,A,1,1\n']), str(tmp_path/'spill'))
+    assert summary['Rows'] == 0 and summary['DTimeMin'] is None
+
+
+def test_file_hash_is_content_based():
+    a, b = csv_upload(['2021-01-01,A,1,1\n']), csv_upload(['2021-01-01,A,1,1\n'])
+    assert gwi.file_hash(a) == gwi.file_hash(b)
+    assert a.tell() == 0
+    assert gwi.file_hash(a) != gwi.file_hash(csv_upload(['2021-01-01,A,2,1\n']))
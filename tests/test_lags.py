@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.stats import pearsonr
+import GWLs_store as gws
+import GWLs_lags as gwlag
+
+
+def gappy(rng, rows, T, frac=0.2):
+    X = np.cumsum(rng.normal(size=(rows, T)), axis=1)
+    X[rng.random((rows, T)) < frac] = np.nan
+    return X
+
+
+def test_lagged_corr_matches_pearsonr_per_lag():
+    rng = np.random.default_rng(2)
+    x, Y = gappy(rng, 1, 120)[0], gappy(rng, 4, 120)
+    lags = np.arange(0, 30, 3)
+    R, N = gwlag.lagged_corr(x, Y, lags)
+    for i in range(len(Y)):
+        for k, L in enumerate(lags):
+            a, b = x[L:], Y[i][:len(x)-L]
+            ok = np.isfinite(a) & np.isfinite(b)
+            assert N[i, k] == ok.sum()
+            assert R[i, k] == pytest.approx(pearsonr(a[ok], b[ok])[0])
+
+
+def test_batch_time_lag_finds_the_lag():
+    # R is of x[t] against each sensor at t-L, so each sensor is the stress 4 weeks on
+    rng = np.random.default_rng(6)
+    t = pd.date_range('2018-01-01', periods=1500, freq='D')
+    rain = rng.gamma(0.5, 8.0, len(t))
+    df_stresses = pd.DataFrame({'StressID': 'Rain', 'DTime': t, 'Value': rain, 'Units': 'mm'})
+    x = gwlag.stress_series(df_stresses, 'Rain', 'W')
+    frames = []
+    for s in ['A', 'B']:
+        wl = x.shift(-4).values+rng.normal(0, 1, len(x))
+        frames.append(pd.DataFrame({'DTime': x.index, 'SensorCode': s, 'WL': wl}))
+    store = gws.SensorStore(pd.concat(frames, ignore_index=True).dropna())
+    _, df_opt = gwlag.batch_time_lag(store, df_stresses, 'Rain', 'W', 12, 1)
+    assert list(df_opt['OptimalLag']) == [4, 4]
+
+
+def test_block_bootstrap_matches_resampled_pairs():
+    rng = np.random.default_rng(3)
+    a = rng.normal(size=103)
+    b = a+rng.normal(size=103)
+    n_boot, block = 50, 10
+    reps = gwlag.block_bootstrap_corr(a, b, n_boot, block, np.random.default_rng(7))
+
+    # the same blocks drawn from the same generator, joined pair by pair
+    n, k = len(a), -(-len(a)//block)
+    starts = np.random.default_rng(7).integers(0, n-block+1, size=(n_boot, k))
+    for r in range(n_boot):
+        idx = np.concatenate([np.arange(s, s+block) for s in starts[r]])[:n]
+        assert reps[r] == pytest.approx(pearsonr(a[idx], b[idx])[0])
+
+
+def test_ar_filter_whitens_an_ar_process():
+    rng = np.random.default_rng(4)
+    e = rng.normal(size=5000)
+    x = np.zeros(5000)
+    for t in range(2, 5000):
+        x[t] = 0.6*x[t-1]-0.2*x[t-2]+e[t]
+    coefs = gwlag.ar_fit(x)
+    np.testing.assert_allclose(coefs[:2], [0.6, -0.2], atol=0.05)
+    w = gwlag.ar_filter(x, coefs)
+    w = w[np.isfinite(w)]
+    assert abs(pearsonr(w[1:], w[:-1])[0]) < 0.05
+
+
+def test_prewhitened_time_lag_is_independent_of_jobs():
+    rng = np.random.default_rng(5)
+    x = np.cumsum(rng.normal(size=300))
+    df = pd.DataFrame({'x': x, 'y': np.roll(x, 3)+rng.normal(0, 0.5, 300)})
+    serial = gwlag.prewhitened_time_lag(df, 'x', 'y', 10, 1, 'W', n_boot=200, n_jobs=1)
+    pooled = gwlag.prewhitened_time_lag(df, 'x', 'y', 10, 1, 'W', n_boot=200, n_jobs=2)
+    pd.testing.assert_frame_equal(serial[0], pooled[0])
+    df_timelag = serial[0]
+    assert (df_timelag['CI_L'] <= df_timelag['R']).all() and (df_timelag['R'] <= df_timelag['CI_U']).all()
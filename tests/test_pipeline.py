@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('GWLs_v01')
+import GWLs_resample as gwr
+import GWLs_corr as gwc
+import GWLs_store as gws
+import GWLs_pipeline as gwp
+
+
+def test_pipeline_resample_and_corr_stages(tmp_path):
+    rng = np.random.default_rng(0)
+    t = pd.date_range('2020-01-01', periods=400, freq='D')
+    df_ts = pd.DataFrame({'DTime': np.tile(t, 2), 'SensorCode': np.repeat(['A', 'B'], len(t)),
+                          'WL': rng.normal(size=2*len(t)), 'SL': 0.0})
+    df_xy = pd.DataFrame({'SensorCode': ['A', 'B'], 'Lat': [-22.0, -22.1], 'Lon': [149.0, 149.1]})
+    df_stresses = pd.DataFrame({'StressID': 'Rain', 'DTime': t, 'Value': rng.gamma(0.5, 8.0, len(t)), 'Units': 'mm'})
+    for name, df in [('ts', df_ts), ('xy', df_xy), ('stresses', df_stresses)]:
+        df.to_csv(tmp_path/f'{name}.csv', index=False)
+
+    out = tmp_path/'out'
+    gwp.main([str(tmp_path/'ts.csv'), str(tmp_path/'xy.csv'), '--stresses', str(tmp_path/'stresses.csv'),
+              '--out', str(out), '--stages', 'resample', 'corr', '--stress-stat', 'sum'])
+    store = gws.SensorStore(df_ts)
+    df_rs = pd.read_csv(out/'df_ts_rs_W_median_Raw.csv', parse_dates=['DTime'])
+    ref = gwr.resample_all(store.df[['SensorCode', 'DTime', 'WL']], 'SensorCode', 'DTime', 'WL', 'W', 'median')
+    # levels are read as float32
+    np.testing.assert_allclose(df_rs['WL'], ref['WL'], rtol=1e-5)
+    df_corr = pd.read_csv(out/'df_corr_W_sum.csv')
+    ref = gwc.corr_matrices(store, df_stresses, 'W', 'sum')
+    np.testing.assert_allclose(df_corr['Pearson R'], ref['Pearson R'], rtol=1e-5)
+    assert (out/'GWLs_LeapfrogExport.csv').exists()
@@ -0,0 +1,149 @@
+import numpy as np
+import pandas as pd
+import pytest
+import GWLs_resample as gwr
+import GWLs_store as gws
+
+
+def make_ts(seed=0):
+    """Two sensors with irregular readings and a month-long gap, codes out of sorted order."""
+    rng = np.random.default_rng(seed)
+    frames = []
+    for s in ['VWP2', 'VWP1']:
+        t = pd.Timestamp('2020-01-01')+pd.to_timedelta(np.sort(rng.uniform(0, 365, 400)), unit='D')
+        t = t[(t < '2020-05-01') | (t > '2020-06-01')]
+        frames.append(pd.DataFrame({'SensorCode': s, 'DTime': t, 'WL': rng.normal(100, 2, len(t))}))
+    return pd.concat(frames, ignore_index=True)
+
+
+@pytest.mark.parametrize('stat', ['mean', 'median', 'min', 'max', 'sum', 'count'])
+@pytest.mark.parametrize('freq', ['W', 'D', 'M'])
+def test_resample_all_matches_pandas(stat, freq):
+    df = make_ts()
+    df_rs = gwr.resample_all(df, 'SensorCode', 'DTime', 'WL', freq, stat)
+    for s, df_s in df.groupby('SensorCode', sort=False):
+        ref = df_s.set_index('DTime')['WL'].resample(freq).agg(stat)
+        got = df_rs.loc[df_rs['SensorCode']==s].set_index('DTime')['WL']
+        pd.testing.assert_series_equal(got, ref, check_names=False, check_freq=False, check_dtype=False)
+
+
+def test_resample_all_keeps_first_appearance_order():
+    df = make_ts()
+    df['SensorCode'] = df['SensorCode'].astype('category')
+    df_rs = gwr.resample_all(df, 'SensorCode', 'DTime', 'WL', 'W', 'mean')
+    assert list(pd.unique(df_rs['SensorCode'])) == ['VWP2', 'VWP1']
+    assert isinstance(df_rs['SensorCode'].dtype, pd.CategoricalDtype)
+
+
+def frame(n):
+    return pd.DataFrame({'v': np.zeros(n)})
+
+
+def test_frame_cache_evicts_least_recently_used():
+    size = int(frame(100).memory_usage(index=True).sum())
+    cache = gwr.FrameCache(max_bytes=2*size)
+    cache.put('a', frame(100))
+    cache.put('b', frame(100))
+    assert cache.get('a') is not None
+    cache.put('c', frame(100))
+    # b was least recently used
+    assert cache.get('b') is None
+    assert cache.get('a') is not None and cache.get('c') is not None
+    assert cache.stats()['Hits'] == 3 and cache.stats()['Misses'] == 1
+    assert cache.n_bytes == 2*size and len(cache) == 2
+
+
+def test_frame_cache_keeps_newest_over_budget():
+    cache = gwr.FrameCache(max_bytes=1)
+    cache.put('a', frame(10))
+    cache.put('b', frame(10))
+    assert len(cache) == 1 and cache.get('b') is not None
+
+
+def test_resample_cache_hits_and_copies():
+    store = gws.SensorStore(make_ts())
+    cache = gwr.ResampleCache()
+    df1 = cache.resample(store, 'VWP1', 'WL', 'W', 'mean')
+    df1['WL'] = 0
+    df2 = cache.resample(store, 'VWP1', 'WL', 'W', 'mean')
+    assert cache.hits == 1 and cache.misses == 1
+    ref = gwr.resample_all(store.get('VWP1', ['SensorCode', 'DTime', 'WL']), 'SensorCode', 'DTime', 'WL', 'W', 'mean')
+    pd.testing.assert_frame_equal(df2, ref)
+    cache.resample(store, 'VWP1', 'WL', 'W', 'max')
+    assert cache.misses == 2
+
+
+def test_normalise_matrix_matches_per_row_min_max():
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(rng.normal(size=(5, 20)))
+    df.iloc[1, 3] = np.nan
+    ref = df.apply(lambda r: (r-r.min())/(r.max()-r.min()), axis=1)
+    pd.testing.assert_frame_equal(gwr.normalise_matrix(df), ref)
+    pd.testing.assert_frame_equal(gwr.normalise_matrix(df.T, axis=0), ref.T)
+
+
+def test_normalise_matrix_constant_and_empty_rows():
+    df = pd.DataFrame([[2.0, 2.0, 2.0], [np.nan, np.nan, np.nan], [0.0, 1.0, 2.0]])
+    got = gwr.normalise_matrix(df)
+    assert list(got.iloc[0]) == [0.0, 0.0, 0.0]
+    assert got.iloc[1].isna().all()
+    assert list(got.iloc[2]) == [0.0, 0.5, 1.0]
+
+
+def test_normalise_matrix_robust():
+    x = np.arange(101, dtype='float64')
+    x[-1] = 1000.0
+    df = pd.DataFrame([x])
+    got = gwr.normalise_matrix(df, robust=True, q=(5, 95)).iloc[0]
+    lo, hi = np.percentile(x, [5, 95])
+    np.testing.assert_allclose(got, np.clip((x-lo)/(hi-lo), 0, 1))
+    assert got.min() == 0 and got.max() == 1
+
+
+@pytest.mark.parametrize('mode', ['Raw', 'Normalised'])
+@pytest.mark.parametrize('stat', ['mean', 'median', 'sum', 'count'])
+@pytest.mark.parametrize('freq', ['W', 'D', 'M'])
+def test_patch_resample_matches_full_recompute(freq, stat, mode):
+    df = make_ts()
+    store = gws.SensorStore(df)
+    df_rs = gwr.resample_all(store.df[['SensorCode', 'DTime', 'WL']], 'SensorCode', 'DTime', 'WL', freq, stat, mode)
+
+    # a new download for one sensor after an outage, so the patch joins old and new bins across a gap
+    t = pd.date_range('2021-02-20', '2021-03-20', freq='6h')
+    df_new = pd.DataFrame({'SensorCode': 'VWP1', 'DTime': t, 'WL': np.linspace(90, 95, len(t))})
+    merged, dirty = gws.append(store, df_new)
+    assert list(dirty) == ['VWP1']
+
+    got = gwr.patch_resample(df_rs, merged, dirty, 'WL', freq, stat, mode)
+    ref = gwr.resample_all(merged.df[['SensorCode', 'DTime', 'WL']], 'SensorCode', 'DTime', 'WL', freq, stat, mode)
+    pd.testing.assert_frame_equal(got, ref)
+
+
+def test_cache_carry_patches_all_sensor_entries():
+    store = gws.SensorStore(make_ts())
+    cache = gwr.ResampleCache()
+    cache.resample(store, None, 'WL', 'W', 'sum')
+    cache.resample(store, 'VWP2', 'WL', 'W', 'sum')
+    df_new = pd.DataFrame({'SensorCode': ['VWP1'], 'DTime': [pd.Timestamp('2021-03-01')], 'WL': [1.0]})
+    merged, dirty = gws.append(store, df_new)
+    cache.carry(store.fingerprint, merged, dirty)
+    misses = cache.misses
+    got = cache.resample(merged, None, 'WL', 'W', 'sum')
+    cache.resample(merged, 'VWP2', 'WL', 'W', 'sum')
+    assert cache.misses == misses
+    ref = gwr.resample_all(merged.df[['SensorCode', 'DTime', 'WL']], 'SensorCode', 'DTime', 'WL', 'W', 'sum')
+    pd.testing.assert_frame_equal(got, ref)
+
+
+@pytest.mark.parametrize('freq', ['Raw', 'W'])
+def test_resample_cache_drops_dry_readings_first(freq):
+    df = make_ts()
+    df['SL'] = 99.0
+    store = gws.SensorStore(df)
+    cache = gwr.ResampleCache()
+    got = cache.resample(store, 'VWP1', 'WL', freq, 'median', min_head=1)
+    df_s = store.get('VWP1')
+    df_s = df_s.loc[df_s['SL']+1<df_s['WL'], ['SensorCode', 'DTime', 'WL']]
+    ref = df_s if freq == 'Raw' else gwr.resample_all(df_s, 'SensorCode', 'DTime', 'WL', freq, 'median')
+    pd.testing.assert_frame_equal(got, ref)
+    assert len(got) < len(cache.resample(store, 'VWP1', 'WL', freq, 'median'))
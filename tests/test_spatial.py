@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import GWLs_store as gws
+import GWLs_spatial as gwsp
+
+
+def make_xy(n=500):
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({'SensorCode': [f'S{i}' for i in range(n)],
+                         'Lat': rng.uniform(-23.5, -21.5, n), 'Lon': rng.uniform(148.0, 150.0, n)})
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(np.radians, [lat1, lon1, lat2, lon2])
+    h = np.sin((lat2-lat1)/2)**2+np.cos(lat1)*np.cos(lat2)*np.sin((lon2-lon1)/2)**2
+    return 2*gwsp.earth_radius*np.arcsin(np.sqrt(h))
+
+
+def test_box_matches_brute_force():
+    df_xy = make_xy()
+    index = gwsp.SensorIndex(df_xy, df_xy['SensorCode'][::2])
+    ref = df_xy.loc[::2]
+    ref = ref.loc[ref['Lat'].between(-23, -22) & ref['Lon'].between(148.5, 149.2)].index
+    assert sorted(index.box(-22, 149.2, -23, 148.5)) == sorted(ref)
+
+
+def test_polygon_matches_brute_force():
+    df_xy = make_xy()
+    index = gwsp.SensorIndex(df_xy, df_xy['SensorCode'])
+    # a triangle, inside when below the hypotenuse
+    coords = [[148.0, -23.5], [150.0, -23.5], [148.0, -21.5], [148.0, -23.5]]
+    inside = (df_xy['Lon']-148.0)+(df_xy['Lat']+23.5) < 2.0
+    assert sorted(index.polygon(coords)) == sorted(df_xy.index[inside])
+
+
+def test_circle_matches_haversine():
+    df_xy = make_xy()
+    index = gwsp.SensorIndex(df_xy, df_xy['SensorCode'])
+    d = haversine(-22.5, 149.0, df_xy['Lat'], df_xy['Lon'])
+    # the local projection is within a fraction of a percent over 30 km
+    got = set(index.circle(-22.5, 149.0, 30000))
+    assert set(df_xy.index[d < 29900]) <= got <= set(df_xy.index[d < 30100])
+
+
+def test_select_drawings_and_shared_index():
+    df_xy = make_xy()
+    store = gws.SensorStore(pd.DataFrame({'DTime': pd.Timestamp('2021-01-01'), 'SensorCode': df_xy['SensorCode'][:100],
+                                          'WL': 1.0}))
+    index = gwsp.get_index(df_xy, store)
+    assert gwsp.get_index(df_xy, store) is index and len(index) == 100
+    rect = {'geometry': {'type': 'Polygon', 'coordinates': [[[148.0, -23.5], [149.0, -23.5], [149.0, -22.5],
+                                                             [148.0, -22.5], [148.0, -23.5]]]}}
+    assert sorted(index.select(rect)) == sorted(index.box(-23.5, 148.0, -22.5, 149.0))
+    point = {'geometry': {'type': 'Point', 'coordinates': [149.0, -22.5]}, 'properties': {'radius': 20000}}
+    assert sorted(index.select(point)) == sorted(index.circle(-22.5, 149.0, 20000))
+    assert len(index.select({'geometry': {'type': 'LineString', 'coordinates': []}})) == 0
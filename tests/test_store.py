@@ -0,0 +1,99 @@
+import numpy as np
+import pandas as pd
+import GWLs_store as gws
+
+
+def make_ts():
+    t = pd.date_range('2021-01-01', periods=5, freq='D')
+    return pd.DataFrame({'DTime': np.tile(t, 3),
+                         'SensorCode': np.repeat(['B', 'A', 'C'], 5),
+                         'WL': np.arange(15, dtype='float32'),
+                         'SL': np.zeros(15, dtype='float32')})
+
+
+def test_store_blocks():
+    df = make_ts().sample(frac=1, random_state=0)
+    store = gws.SensorStore(df)
+    assert store.sensors == ['A', 'B', 'C']
+    for s in store.sensors:
+        ref = df.loc[df['SensorCode']==s].sort_values('DTime')
+        got = store.get(s)
+        np.testing.assert_array_equal(got['WL'].values, ref['WL'].values)
+        np.testing.assert_array_equal(got['DTime'].values, ref['DTime'].values)
+        assert list(got['SensorCode'].unique()) == [s]
+
+
+def test_store_drops_null_sensor_codes():
+    df = make_ts()
+    df.loc[[0, 7], 'SensorCode'] = None
+    store = gws.SensorStore(df)
+    assert store.dropped == 2
+    assert len(store) == 13
+
+
+def test_store_save_and_load(tmp_path):
+    store = gws.SensorStore(make_ts())
+    store.save(str(tmp_path))
+    loaded = gws.SensorStore.load(str(tmp_path))
+    assert loaded.sensors == store.sensors
+    assert loaded.fingerprint == store.fingerprint
+    pd.testing.assert_frame_equal(loaded.get('B'), store.get('B'))
+
+
+def test_frame_round_trip_keeps_dtypes(tmp_path):
+    df = pd.DataFrame({'StressID': ['Rain', 'Evap', 'Rain'], 'DTime': pd.date_range('2021-01-01', periods=3),
+                       'Value': [1.0, np.nan, 3.0], 'Code': pd.Categorical([2, 1, 2])})
+    gws.save_frame(df, str(tmp_path))
+    pd.testing.assert_frame_equal(gws.load_frame(str(tmp_path)), df)
+
+
+def test_publish_once_per_dataset(tmp_path, monkeypatch):
+    monkeypatch.setattr(gws, 'store_dir', str(tmp_path))
+    store = gws.SensorStore(make_ts())
+    handle = gws.publish(store)
+    assert gws.publish(gws.SensorStore(make_ts())) == handle
+    assert gws.open_store(handle) is gws.open_store(handle)
+    pd.testing.assert_frame_equal(gws.open_store(handle).df, store.df)
+
+
+def test_append_marks_only_changed_sensors():
+    store = gws.SensorStore(make_ts())
+    df_new = pd.DataFrame({'DTime': pd.to_datetime(['2021-01-03', '2021-01-06', '2021-01-02']),
+                           'SensorCode': ['A', 'A', 'B'],
+                           'WL': np.float32([7, 99, 1]),
+                           'SL': np.float32([0, 0, 0])})
+    merged, dirty = gws.append(store, df_new)
+    # A gains a new day, B's reading is unchanged
+    assert dirty == {'A': pd.Timestamp('2021-01-06')}
+    assert len(merged) == 16
+    _, dirty = gws.append(merged, df_new)
+    assert dirty == {}
+
+
+def test_append_with_duplicate_stored_readings():
+    df = make_ts()
+    df = pd.concat([df, df.iloc[[0]].assign(WL=np.float32(50))], ignore_index=True)
+    store = gws.SensorStore(df)
+    df_new = pd.DataFrame({'DTime': [df['DTime'].iloc[0]], 'SensorCode': ['B'],
+                           'WL': np.float32([50]), 'SL': np.float32([0])})
+    _, dirty = gws.append(store, df_new)
+    assert dirty == {}
+
+
+def test_store_extent():
+    df = make_ts().sample(frac=1, random_state=0)
+    df.loc[df['SensorCode']=='C', 'DTime'] += pd.Timedelta(days=30)
+    store = gws.SensorStore(df)
+    for s in store.sensors:
+        ref = df.loc[df['SensorCode']==s, 'DTime']
+        assert store.dtime_extent(s) == (ref.min(), ref.max())
+    assert store.extent == (df['DTime'].min(), df['DTime'].max())
+
+
+def test_get_many_matches_iloc():
+    store = gws.SensorStore(make_ts())
+    rows = np.r_[10:15, 0:5]
+    pd.testing.assert_frame_equal(store.get_many(['C', 'X', 'A'], ['DTime', 'SensorCode', 'WL']),
+                                  store.df[['DTime', 'SensorCode', 'WL']].iloc[rows])
+    pd.testing.assert_frame_equal(store.get_many(['C', 'A']), store.df.iloc[rows])
+    assert list(store.get_many([], ['WL']).columns) == ['WL'] and len(store.get_many([], ['WL'])) == 0
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import pytest
+import GWLs_stresses as gwst
+
+
+def make_stresses():
+    rng = np.random.default_rng(0)
+    t = pd.date_range('2020-01-01', periods=400, freq='D')
+    rain = pd.DataFrame({'StressID': 'Rain', 'DTime': t, 'Value': rng.gamma(0.5, 8.0, len(t)), 'Units': 'mm'})
+    # evaporation starts later and has an outage
+    t_evap = t[50:][(t[50:] < '2020-06-01') | (t[50:] > '2020-07-15')]
+    evap = pd.DataFrame({'StressID': 'Evap', 'DTime': t_evap, 'Value': rng.uniform(2, 6, len(t_evap)), 'Units': 'mm'})
+    return pd.concat([rain, evap], ignore_index=True)
+
+
+def reference(df_stresses, stress_id, freq, stat):
+    x = df_stresses.loc[df_stresses['StressID']==stress_id].set_index('DTime')['Value']
+    if stat in ['cumsum', 'cumdep']:
+        x = x.resample(freq).sum()
+        return x.cumsum() if stat == 'cumsum' else (x-x.mean()).cumsum()
+    return x.resample(freq).agg(stat)
+
+
+@pytest.mark.parametrize('stat', gwst.cube_stats)
+@pytest.mark.parametrize('freq', ['W', 'M', 'D', 'H'])
+def test_resample_stress_matches_pandas(stat, freq):
+    df_stresses = make_stresses()
+    for stress_id in ['Rain', 'Evap']:
+        got = gwst.resample_stress(df_stresses, stress_id, freq, stat)
+        assert list(got.columns) == ['StressID', 'DTime', 'Value']
+        ref = reference(df_stresses, stress_id, freq, stat)
+        np.testing.assert_array_equal(got['DTime'].values, ref.index.values)
+        np.testing.assert_allclose(got['Value'].values, ref.values, atol=1e-9)
+
+
+def test_cube_series_match_direct_resample(tmp_path):
+    df_stresses = make_stresses()
+    cube = gwst.StressCube(df_stresses)
+    cube.save(str(tmp_path))
+    loaded = gwst.StressCube.load(str(tmp_path))
+    assert loaded.units == {'Rain': 'mm', 'Evap': 'mm'}
+    for c in [cube, loaded]:
+        for freq in gwst.cube_freqs:
+            for stat in gwst.cube_stats:
+                for stress_id in ['Rain', 'Evap']:
+                    got = gwst.resample_stress(df_stresses, stress_id, freq, stat, c)
+                    ref = gwst.resample_stress(df_stresses, stress_id, freq, stat)
+                    np.testing.assert_array_equal(got['DTime'].values, ref['DTime'].values)
+                    np.testing.assert_allclose(got['Value'].values, ref['Value'].values, atol=1e-9)
+        # frequencies outside the cube are resampled directly
+        assert len(gwst.resample_stress(df_stresses, 'Rain', 'H', 'sum', c)) == 400*24-23